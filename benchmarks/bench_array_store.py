@@ -0,0 +1,49 @@
+"""Code size of array stores in a buffer kernel at -O0 and -O1
+
+Usage: python benchmarks/bench_array_store.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# pylint: disable=wrong-import-position
+from jackcompiler.tokeniser import Tokeniser
+from jackcompiler.compilationengine import CompilationEngine
+from jackcompiler.vmir import parse_vm
+
+KERNEL = """
+class Kernel {
+    function void scale(Array dst, Array src, int n, int k) {
+        var int i;
+        let i = 0;
+        while (i < n) {
+            let dst[i] = src[i] * k;
+            let dst[i] = dst[i] + 1;
+            let src[i] = i;
+            let i = i + 1;
+        }
+        return;
+    }
+}
+"""
+
+def main():
+    """Runs the benchmark"""
+    tok = Tokeniser()
+    tok.contents = KERNEL
+    engine = CompilationEngine()
+    engine.build_tree = False
+    for level in [0, 1]:
+        engine.pass_manager.optlevel = level
+        engine.tokens = tok.get_tokens()
+        instrs = parse_vm(engine.get_vmcode())
+        ops = [str(instr) for instr in instrs]
+        loop = ops[ops.index("label WHILE_EXP0") + 1:
+                   ops.index("label WHILE_END0")]
+        print("O{}: {:>3} instructions per iteration, {} through temp 0"
+              .format(level, len(loop), loop.count("pop temp 0")))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""ROM size and cycles of Hack assembly lowered straight from VM code,
+against the textbook VM translator
+
+Cycles come from running tests/asmcode, which brings its own minimal
+OS, on the Hack CPU simulator. The programs in tests/vmcode need the
+real OS, so only their ROM size is measured.
+
+Usage: python benchmarks/bench_asm.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# pylint: disable=wrong-import-position
+from jackcompiler.tokeniser import Tokeniser
+from jackcompiler.compilationengine import CompilationEngine
+from jackcompiler.utilities import list_files_with_ext
+from jackcompiler.asmtranslator import HALT, lower, rom_size
+from jackcompiler.hackcpu import HackCPU, assemble
+
+TESTS_DIR = os.path.join(os.path.dirname(__file__), "..", "tests")
+
+def compile_program(directory, optlevel):
+    """Returns the functions of the program in a directory"""
+    tok = Tokeniser()
+    engine = CompilationEngine()
+    engine.build_tree = False
+    engine.pass_manager.optlevel = optlevel
+    functions = []
+    for jackpath in sorted(list_files_with_ext(directory, ext=".jack")):
+        with open(jackpath) as jackfile:
+            tok.contents = jackfile.read()
+        engine.tokens = tok.get_tokens()
+        functions.extend(engine.get_ir())
+    return engine.pass_manager.run_program(functions)
+
+def cycles(lines):
+    """Returns the cycles a program takes to get back from Sys.init"""
+    program, symbols = assemble(lines)
+    return HackCPU(program).run(symbols[HALT])
+
+def main():
+    """Runs the benchmark"""
+    row = "{:<18} {:>8} {:>8} {:>10} {:>10}"
+    print(row.format("asmcode", "ROM", "naive", "cycles", "naive"))
+    for level in range(4):
+        functions = compile_program(os.path.join(TESTS_DIR, "asmcode"),
+                                    level)
+        lines = lower(functions, bootstrap=True)
+        naive = lower(functions, bootstrap=True, naive=True)
+        print(row.format("-O" + str(level), rom_size(lines), rom_size(naive),
+                         cycles(lines), cycles(naive)))
+    print()
+    vmcode_dir = os.path.join(TESTS_DIR, "vmcode")
+    for name in sorted(os.listdir(vmcode_dir)):
+        functions = compile_program(os.path.join(vmcode_dir, name), 2)
+        print(row.format(
+            name + " -O2", rom_size(lower(functions, bootstrap=True)),
+            rom_size(lower(functions, bootstrap=True, naive=True)), "", ""
+        ))
+
+if __name__ == "__main__":
+    main()
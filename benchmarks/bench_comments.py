@@ -0,0 +1,47 @@
+"""Comment removal scaling over comment density
+
+Usage: python benchmarks/bench_comments.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# pylint: disable=wrong-import-position
+from jackcompiler.glossary import COMMENT_BREAKS
+from jackcompiler.utilities import remove_comments
+
+BLOCK = "/** Returns x.\n * @param y the y\n */\nlet x = y; // trailing\n"
+
+def remove_comments_repeated(file_contents, comment_breaks):
+    """The original implementation: one search and full copy per comment"""
+    for opener, closer in comment_breaks:
+        while opener in file_contents:
+            ind_start = file_contents.index(opener)
+            keep_left = file_contents[:ind_start]
+            rest = file_contents[ind_start:]
+            keep_right = rest[rest.index(closer) + len(closer) : ]
+            file_contents = keep_left + keep_right
+    return file_contents
+
+def time_call(func, contents):
+    """Returns the seconds taken by one call"""
+    start = time.perf_counter()
+    func(contents, COMMENT_BREAKS)
+    return time.perf_counter() - start
+
+def main():
+    """Runs the benchmark"""
+    print("{:>9} {:>10} {:>10}".format("comments", "repeated", "single"))
+    for n_blocks in [500, 1000, 2000, 4000, 8000]:
+        contents = BLOCK * n_blocks
+        print("{:>9} {:>9.3f}s {:>9.3f}s".format(
+            2 * n_blocks,
+            time_call(remove_comments_repeated, contents),
+            time_call(remove_comments, contents)
+        ))
+
+if __name__ == "__main__":
+    main()
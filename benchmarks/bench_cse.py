@@ -0,0 +1,39 @@
+"""Instructions saved by common subexpression elimination at -O2
+
+Savings are for one run through each block, counting a call to
+Math.multiply or Math.divide as the instructions it executes.
+
+Usage: python benchmarks/bench_cse.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# pylint: disable=wrong-import-position
+from jackcompiler.tokeniser import Tokeniser
+from jackcompiler.compilationengine import CompilationEngine
+from jackcompiler.utilities import list_files_with_ext
+
+def main():
+    """Runs the benchmark"""
+    vmcode_dir = os.path.join(os.path.dirname(__file__), "..", "tests",
+                              "vmcode")
+    tok = Tokeniser()
+    engine = CompilationEngine()
+    engine.build_tree = False
+    engine.pass_manager.optlevel = 2
+    for jackpath in sorted(list_files_with_ext(vmcode_dir, ext=".jack")):
+        with open(jackpath) as jackfile:
+            tok.contents = jackfile.read()
+        engine.tokens = tok.get_tokens()
+        engine.get_vmcode()
+    report = engine.pass_manager.report["cse"]
+    for func, saved in sorted(report.items()):
+        print("{:<30} {:>3}".format(func, saved))
+    print("{:<30} {:>3}".format("all blocks",
+                                sum(report.values())))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""Stores to locals removed by dead store elimination on tests/vmcode
+
+Usage: python benchmarks/bench_dead_stores.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# pylint: disable=wrong-import-position
+from jackcompiler.tokeniser import Tokeniser
+from jackcompiler.compilationengine import CompilationEngine
+from jackcompiler.utilities import list_files_with_ext
+
+def main():
+    """Runs the benchmark"""
+    vmcode_dir = os.path.join(os.path.dirname(__file__), "..", "tests",
+                              "vmcode")
+    tok = Tokeniser()
+    engine = CompilationEngine()
+    engine.build_tree = False
+    engine.pass_manager.optlevel = 3
+    for name in sorted(os.listdir(vmcode_dir)):
+        functions = []
+        for jackpath in sorted(list_files_with_ext(
+                os.path.join(vmcode_dir, name), ext=".jack")):
+            with open(jackpath) as jackfile:
+                tok.contents = jackfile.read()
+            engine.tokens = tok.get_tokens()
+            functions.extend(engine.get_ir())
+        engine.pass_manager.run_program(functions)
+    report = engine.pass_manager.report["dse"]
+    for store, count in sorted(report.items()):
+        print("{:<40} {:>3}".format(store, count))
+    print("{:<40} {:>3}".format("stores removed", sum(report.values())))
+
+if __name__ == "__main__":
+    main()
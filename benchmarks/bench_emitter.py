@@ -0,0 +1,57 @@
+"""Code emission: chunk-list Emitter against repeated string concatenation
+
+Usage: python benchmarks/bench_emitter.py [statements]
+
+The concatenation baseline is quadratic: 10000 statements take minutes.
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# pylint: disable=wrong-import-position
+from jackcompiler.tokeniser import Tokeniser
+from jackcompiler.compilationengine import CompilationEngine
+from jackcompiler.emitter import Emitter
+
+class ConcatWriter:
+    """The previous behaviour: one string grown with += per write"""
+    def __init__(self):
+        self.text = ""
+
+    def write(self, text):
+        """Appends text"""
+        self.text += text
+
+def synthetic_class(n_statements):
+    """A class with one subroutine of n_statements statements"""
+    body = "".join(
+        '    let s = "item %d"; let y = y + (x * %d);\n' % (i, i % 50)
+        for i in range(n_statements // 2)
+    )
+    return (
+        "class Big {\n  function int run(int x) {\n    var int y;\n" +
+        "    var String s;\n" + body + "    return y;\n  }\n}\n"
+    )
+
+def time_compile(tokens, make_writer):
+    """Returns the seconds taken to compile into fresh writers"""
+    engine = CompilationEngine()
+    start = time.perf_counter()
+    engine.stream(tokens, make_writer(), make_writer())
+    return time.perf_counter() - start
+
+def main():
+    """Runs the benchmark"""
+    n_statements = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    tok = Tokeniser()
+    tok.contents = synthetic_class(n_statements)
+    tokens = tok.get_tokens()
+    print("{} statements, {} tokens".format(n_statements, len(tokens)))
+    for name, writer in [("Emitter", Emitter), ("concat", ConcatWriter)]:
+        print("{:8} {:8.3f} s".format(name, time_compile(tokens, writer)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""VM instructions the programs in tests/vmcode and tests/asmcode execute
+at each optimisation level, counted by the VM emulator, the deepest the
+stack goes at -O3 and how fast the emulator runs them
+
+Square is given a few key presses and then q, Average three numbers.
+
+Usage: python benchmarks/bench_emulator.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# pylint: disable=wrong-import-position
+from jackcompiler.tokeniser import Tokeniser
+from jackcompiler.compilationengine import CompilationEngine
+from jackcompiler.utilities import list_files_with_ext
+from jackcompiler.vmemulator import VMEmulator
+
+TESTS_DIR = os.path.join(os.path.dirname(__file__), "..", "tests")
+
+SCRIPTS = {
+    "Average": {"inputs": [3, 10, 20, 30]},
+    "Square": {"keys": [0] * 20 + [132] * 5 + [0] * 5 + [81]}
+}
+
+def compile_program(directory, optlevel):
+    """Returns the functions of the program in a directory"""
+    tok = Tokeniser()
+    engine = CompilationEngine()
+    engine.build_tree = False
+    engine.pass_manager.optlevel = optlevel
+    functions = []
+    for jackpath in sorted(list_files_with_ext(directory, ext=".jack")):
+        with open(jackpath) as jackfile:
+            tok.contents = jackfile.read()
+        engine.tokens = tok.get_tokens()
+        functions.extend(engine.get_ir())
+    return engine.pass_manager.run_program(functions)
+
+def main():
+    """Runs the benchmark"""
+    vmcode_dir = os.path.join(TESTS_DIR, "vmcode")
+    programs = [
+        (name, os.path.join(vmcode_dir, name))
+        for name in sorted(os.listdir(vmcode_dir))
+    ] + [("asmcode", os.path.join(TESTS_DIR, "asmcode"))]
+    row = "{:<14}" + " {:>8}" * 4 + " {:>6}"
+    print(row.format("instructions", "-O0", "-O1", "-O2", "-O3", "stack"))
+    executed = 0
+    elapsed = 0
+    for name, directory in programs:
+        counts = []
+        for level in range(4):
+            emulator = VMEmulator(compile_program(directory, level),
+                                  **SCRIPTS.get(name, {}))
+            start = time.perf_counter()
+            emulator.run()
+            elapsed += time.perf_counter() - start
+            report = emulator.get_report()
+            counts.append(report["instructions"])
+            executed += report["instructions"]
+        print(row.format(name, *counts, report["peak_stack_depth"]))
+    print("\n{:.2f}M instructions per second".format(
+        executed / elapsed / 1e6
+    ))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Expression compilation: wide (long operator chains) and deep (nesting)
+
+Usage: python benchmarks/bench_expressions.py [size]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# pylint: disable=wrong-import-position
+from jackcompiler.tokeniser import Tokeniser
+from jackcompiler.compilationengine import CompilationEngine
+
+def wrap(expression):
+    """A class whose only function returns the expression"""
+    return (
+        "class Expr {\n function int f(int x) {\n return " + expression +
+        ";\n }\n}\n"
+    )
+
+SHAPES = {
+    "wide": lambda n: wrap(" + ".join(["x"] * n)),
+    "deep parens": lambda n: wrap("(" * n + "x" + ")" * n),
+    "deep unary": lambda n: wrap("-" * n + "x"),
+    "deep calls": lambda n: wrap("Expr.f(" * n + "x" + ")" * n)
+}
+
+def main():
+    """Runs the benchmark"""
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    for name, shape in SHAPES.items():
+        tok = Tokeniser()
+        tok.contents = shape(size)
+        tokens = tok.get_tokens()
+        engine = CompilationEngine()
+        engine.build_tree = False
+        engine.tokens = tokens
+        start = time.perf_counter()
+        engine.get_vmcode()
+        secs = time.perf_counter() - start
+        print("{:12} {:>8} tokens {:7.3f} s {:>10,.0f} tokens/s".format(
+            name, len(tokens), secs, len(tokens) / secs
+        ))
+
+if __name__ == "__main__":
+    main()
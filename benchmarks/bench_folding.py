@@ -0,0 +1,46 @@
+"""Constant folding on a table-driven class
+
+Usage: python benchmarks/bench_folding.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# pylint: disable=wrong-import-position
+from jackcompiler.tokeniser import Tokeniser
+from jackcompiler.compilationengine import CompilationEngine
+from jackcompiler.vmir import parse_vm
+
+def table_class(rows, cols):
+    """A class filling a table with constant offset expressions"""
+    lets = [
+        "  let a[({} * {}) + {}] = -{} + ({} / 2);".format(
+            row, cols, col, row, col
+        )
+        for row in range(rows) for col in range(cols)
+    ]
+    return (
+        "class Table {\n function void fill(Array a) {\n" +
+        "\n".join(lets) + "\n  return;\n }\n}\n"
+    )
+
+def main():
+    """Runs the benchmark"""
+    tok = Tokeniser()
+    tok.contents = table_class(16, 16)
+    engine = CompilationEngine()
+    engine.build_tree = False
+    for level in [0, 1]:
+        engine.pass_manager.optlevel = level
+        engine.tokens = tok.get_tokens()
+        vmcode = engine.get_vmcode()
+        print("O{}: {:>6} instructions, {:>4} Math calls".format(
+            level, len(parse_vm(vmcode)), vmcode.count("call Math.")
+        ))
+    for oper, removed in engine.pass_manager.report["fold"].items():
+        print("{:<14} {:>6}".format(oper, removed))
+
+if __name__ == "__main__":
+    main()
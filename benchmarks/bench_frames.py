@@ -0,0 +1,47 @@
+"""Frame sizes before and after local slot colouring on tests/vmcode
+
+Each call pushes one zero per local, so the total is also the
+zero-initialisation work of calling every function once.
+
+Usage: python benchmarks/bench_frames.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# pylint: disable=wrong-import-position
+from jackcompiler.tokeniser import Tokeniser
+from jackcompiler.compilationengine import CompilationEngine
+from jackcompiler.utilities import list_files_with_ext
+
+def main():
+    """Runs the benchmark"""
+    vmcode_dir = os.path.join(os.path.dirname(__file__), "..", "tests",
+                              "vmcode")
+    tok = Tokeniser()
+    engine = CompilationEngine()
+    engine.build_tree = False
+    engine.pass_manager.optlevel = 3
+    after = 0
+    for name in sorted(os.listdir(vmcode_dir)):
+        functions = []
+        for jackpath in sorted(list_files_with_ext(
+                os.path.join(vmcode_dir, name), ext=".jack")):
+            with open(jackpath) as jackfile:
+                tok.contents = jackfile.read()
+            engine.tokens = tok.get_tokens()
+            functions.extend(engine.get_ir())
+        after += sum(
+            func[0].num for func in engine.pass_manager.run_program(functions)
+        )
+    report = engine.pass_manager.report["slots"]
+    for func, saved in sorted(report.items()):
+        print("{:<30} {:>3}".format(func, saved))
+    print("{:<30} {:>3} -> {}".format(
+        "locals in all frames", after + sum(report.values()), after
+    ))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Calls removed and code growth from inlining, per tests/vmcode program
+
+Usage: python benchmarks/bench_inline.py [inline_size]
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# pylint: disable=wrong-import-position
+from jackcompiler.tokeniser import Tokeniser
+from jackcompiler.compilationengine import CompilationEngine
+from jackcompiler.utilities import list_files_with_ext
+
+def compile_program(engine, tok, program_dir):
+    """Returns the functions of every class in a directory"""
+    functions = []
+    for jackpath in sorted(list_files_with_ext(program_dir, ext=".jack")):
+        with open(jackpath) as jackfile:
+            tok.contents = jackfile.read()
+        engine.tokens = tok.get_tokens()
+        functions.extend(engine.get_ir())
+    return functions
+
+def count_calls(functions):
+    """Number of call instructions"""
+    return sum(instr.op == "call" for func in functions for instr in func)
+
+def main(inline_size=16):
+    """Runs the benchmark"""
+    vmcode_dir = os.path.join(os.path.dirname(__file__), "..", "tests",
+                              "vmcode")
+    tok = Tokeniser()
+    engine = CompilationEngine()
+    engine.build_tree = False
+    engine.pass_manager.optlevel = 3
+    engine.pass_manager.inline_size = inline_size
+    print("{:<16} {:>12} {:>16}".format("program", "calls", "instructions"))
+    for name in sorted(os.listdir(vmcode_dir)):
+        functions = compile_program(engine, tok,
+                                    os.path.join(vmcode_dir, name))
+        inlined = engine.pass_manager.run_program(functions)
+        print("{:<16} {:>5} -> {:<4} {:>7} -> {:<6}".format(
+            name, count_calls(functions), count_calls(inlined),
+            sum(map(len, functions)), sum(map(len, inlined))
+        ))
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
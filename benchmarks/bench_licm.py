@@ -0,0 +1,38 @@
+"""Instructions hoisted out of loops by -O2 on tests/vmcode
+
+Each hoisted instruction is one instruction less per loop iteration.
+
+Usage: python benchmarks/bench_licm.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# pylint: disable=wrong-import-position
+from jackcompiler.tokeniser import Tokeniser
+from jackcompiler.compilationengine import CompilationEngine
+from jackcompiler.utilities import list_files_with_ext
+
+def main():
+    """Runs the benchmark"""
+    vmcode_dir = os.path.join(os.path.dirname(__file__), "..", "tests",
+                              "vmcode")
+    tok = Tokeniser()
+    engine = CompilationEngine()
+    engine.build_tree = False
+    engine.pass_manager.optlevel = 2
+    for jackpath in sorted(list_files_with_ext(vmcode_dir, ext=".jack")):
+        with open(jackpath) as jackfile:
+            tok.contents = jackfile.read()
+        engine.tokens = tok.get_tokens()
+        engine.get_vmcode()
+    report = engine.pass_manager.report["licm"]
+    for func, saved in sorted(report.items()):
+        print("{:<30} {:>3}".format(func, saved))
+    print("{:<30} {:>3}".format("per iteration, all loops",
+                                sum(report.values())))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Parse speed of the CompilationEngine in tokens per second
+
+Usage: python benchmarks/bench_parser.py [copies]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# pylint: disable=wrong-import-position
+from jackcompiler.tokeniser import Tokeniser
+from jackcompiler.compilationengine import CompilationEngine
+from jackcompiler.utilities import list_files_with_ext
+
+CORPUS = os.path.join(os.path.dirname(__file__), "..", "tests", "vmcode")
+
+def corpus_tokens():
+    """Token lists for every class in the corpus"""
+    tok = Tokeniser()
+    all_tokens = []
+    for jackpath in list_files_with_ext(CORPUS, ext=".jack"):
+        with open(jackpath) as jackfile:
+            tok.contents = jackfile.read()
+        all_tokens.append(tok.get_tokens())
+    return all_tokens
+
+def main():
+    """Runs the benchmark"""
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    all_tokens = corpus_tokens()
+    n_tokens = copies * sum(len(tokens) for tokens in all_tokens)
+    for build_tree in [True, False]:
+        engine = CompilationEngine()
+        engine.build_tree = build_tree
+        start = time.perf_counter()
+        for _ in range(copies):
+            for tokens in all_tokens:
+                engine.tokens = tokens
+                engine.get_vmcode()
+        secs = time.perf_counter() - start
+        print("tree={:5} {:>9} tokens {:7.3f} s {:>10,.0f} tokens/s".format(
+            str(build_tree), n_tokens, secs, n_tokens / secs
+        ))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""Instructions removed by each peephole rule from -O0 code of tests/vmcode
+
+Usage: python benchmarks/bench_peephole.py
+"""
+
+import os
+import sys
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# pylint: disable=wrong-import-position
+from jackcompiler.tokeniser import Tokeniser
+from jackcompiler.compilationengine import CompilationEngine
+from jackcompiler.utilities import list_files_with_ext
+from jackcompiler.vmir import parse_vm, split_functions
+from jackcompiler.peephole import optimise
+
+def main():
+    """Runs the benchmark"""
+    vmcode_dir = os.path.join(os.path.dirname(__file__), "..", "tests",
+                              "vmcode")
+    tok = Tokeniser()
+    engine = CompilationEngine()
+    engine.build_tree = False
+    report = Counter()
+    before = after = 0
+    for jackpath in list_files_with_ext(vmcode_dir, ext=".jack"):
+        with open(jackpath) as jackfile:
+            tok.contents = jackfile.read()
+        engine.tokens = tok.get_tokens()
+        for func in split_functions(parse_vm(engine.get_vmcode())):
+            before += len(func)
+            after += len(optimise(func, report))
+    for name, removed in report.items():
+        print("{:<18} {:>6}".format(name, removed))
+    print("{:<18} {:>6} -> {}".format("instructions", before, after))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Strength reduction savings on tests/vmcode
+
+Usage: python benchmarks/bench_strength.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# pylint: disable=wrong-import-position
+from jackcompiler.tokeniser import Tokeniser
+from jackcompiler.compilationengine import CompilationEngine
+from jackcompiler.utilities import list_files_with_ext
+from jackcompiler.vmir import parse_vm
+
+def main():
+    """Runs the benchmark"""
+    vmcode_dir = os.path.join(os.path.dirname(__file__), "..", "tests",
+                              "vmcode")
+    tok = Tokeniser()
+    engine = CompilationEngine()
+    engine.build_tree = False
+    sizes = {1: 0, 2: 0}
+    calls = {1: 0, 2: 0}
+    for jackpath in list_files_with_ext(vmcode_dir, ext=".jack"):
+        with open(jackpath) as jackfile:
+            tok.contents = jackfile.read()
+        for level in sizes:
+            engine.pass_manager.optlevel = level
+            engine.tokens = tok.get_tokens()
+            vmcode = engine.get_vmcode()
+            sizes[level] += len(parse_vm(vmcode))
+            calls[level] += vmcode.count("call Math.multiply") + \
+                vmcode.count("call Math.divide")
+    for level in sizes:
+        print("O{}: {:>6} instructions, {:>3} multiply/divide calls".format(
+            level, sizes[level], calls[level]
+        ))
+    for key, value in engine.pass_manager.report["strength"].items():
+        print("{:<20} {:>6}".format(key, value))
+
+if __name__ == "__main__":
+    main()
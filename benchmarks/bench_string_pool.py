@@ -0,0 +1,53 @@
+"""Allocations and instructions saved by pooling string literals
+
+Counts, for tests/vmcode, what evaluating every string literal site
+`runs` times costs with and without the pool. The String routines
+themselves are not counted.
+
+Usage: python benchmarks/bench_string_pool.py [runs]
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# pylint: disable=wrong-import-position
+from jackcompiler.tokeniser import Tokeniser
+from jackcompiler.glossary import STRING_CONST
+from jackcompiler.compilationengine import CompilationEngine
+from jackcompiler.utilities import list_files_with_ext
+
+def main(runs=100):
+    """Runs the benchmark"""
+    vmcode_dir = os.path.join(os.path.dirname(__file__), "..", "tests",
+                              "vmcode")
+    tok = Tokeniser()
+    engine = CompilationEngine()
+    engine.build_tree = False
+    engine.pass_manager.options.add("string-pool")
+    plain = {"allocations": 0, "instructions": 0}
+    pooled = {"allocations": 0, "instructions": 0}
+    for jackpath in list_files_with_ext(vmcode_dir, ext=".jack"):
+        with open(jackpath) as jackfile:
+            tok.contents = jackfile.read()
+        toks = tok.get_tokens()
+        literals = [t.value for t in toks if t.code == STRING_CONST]
+        for literal in literals:
+            plain["allocations"] += runs
+            plain["instructions"] += runs * (2 + 2 * len(literal))
+            # Checking the static every time
+            pooled["instructions"] += runs * 3
+        for literal in set(literals):
+            # Building it and storing it once
+            pooled["allocations"] += 1
+            pooled["instructions"] += 3 + 2 * len(literal)
+        engine.tokens = toks
+        engine.get_vmcode()
+    print("{:<14} {:>10} {:>10}".format("", "plain", "pooled"))
+    for key in plain:
+        print("{:<14} {:>10} {:>10}".format(key, plain[key], pooled[key]))
+    print(dict(engine.pass_manager.report["string-pool"]))
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
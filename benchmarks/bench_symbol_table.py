@@ -0,0 +1,47 @@
+"""Symbol table lookups as the number of symbols grows
+
+Usage: python benchmarks/bench_symbol_table.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# pylint: disable=wrong-import-position
+from jackcompiler.symboltable import SymbolTable, identifier
+
+def linear_lookup(scope, name):
+    """The previous lookup: a scan over a list of entries"""
+    for iden in scope:
+        if iden["name"] == name:
+            return iden["index"]
+    return "NONE"
+
+def main():
+    """Runs the benchmark"""
+    print("{:>7} {:>14} {:>14}".format("symbols", "list ns/lookup",
+                                       "dict ns/lookup"))
+    for n_symbols in [10, 100, 1000, 5000]:
+        names = ["v" + str(i) for i in range(n_symbols)]
+        symt = SymbolTable()
+        symt.subroutine_type = "function"
+        scope = []
+        for i, name in enumerate(names):
+            symt.define(name, "int", "var")
+            scope.append(identifier(name, "int", "var", i))
+        start = time.perf_counter()
+        for name in names:
+            linear_lookup(scope, name)
+        linear = time.perf_counter() - start
+        start = time.perf_counter()
+        for name in names:
+            symt.index_of(name)
+        hashed = time.perf_counter() - start
+        print("{:>7} {:>14.0f} {:>14.0f}".format(
+            n_symbols, 1e9 * linear / n_symbols, 1e9 * hashed / n_symbols
+        ))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Token list memory: per-token dicts against shared slotted Tokens
+
+Usage: python benchmarks/bench_token_memory.py [copies]
+"""
+
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# pylint: disable=wrong-import-position
+from jackcompiler.tokeniser import Tokeniser
+
+SOURCE = os.path.join(
+    os.path.dirname(__file__), "..", "tests", "vmcode", "Pong", "PongGame.jack"
+)
+
+def dict_tokens(tokens):
+    """The previous representation: a fresh dict and value per token"""
+    return [
+        {"type": tok.type, "value": (tok.value + " ")[:-1]} for tok in tokens
+    ]
+
+def measure(build):
+    """Returns (result, bytes still allocated after build())"""
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+def main():
+    """Runs the benchmark"""
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    with open(SOURCE) as jackfile:
+        contents = jackfile.read() * copies
+    tok = Tokeniser()
+    tok.contents = contents
+    tokens, after = measure(tok.get_tokens)
+    _, before = measure(lambda: dict_tokens(tokens))
+    for name, size in [("dict", before), ("Token", after)]:
+        print("{:6} {:>12,} bytes {:>7.1f} bytes/token".format(
+            name, size, size / len(tokens)
+        ))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Lexer throughput: single-pass regex engine against the character-wise one
+
+Usage: python benchmarks/bench_tokeniser.py [copies]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# pylint: disable=wrong-import-position
+from jackcompiler.tokeniser import Tokeniser
+
+SOURCE = os.path.join(
+    os.path.dirname(__file__), "..", "tests", "vmcode", "Pong", "PongGame.jack"
+)
+
+def synthetic_source(copies):
+    """Repeats a real class body to get a large input"""
+    with open(SOURCE) as jackfile:
+        contents = jackfile.read()
+    return contents * copies
+
+def time_engine(engine, contents):
+    """Returns (token count, seconds) for one tokenisation"""
+    tok = Tokeniser(engine=engine)
+    tok.contents = contents
+    start = time.perf_counter()
+    n_tokens = len(tok.get_tokens())
+    return n_tokens, time.perf_counter() - start
+
+def main():
+    """Runs the benchmark"""
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    contents = synthetic_source(copies)
+    print("{} lines".format(contents.count("\n")))
+    for engine in ["charwise", "regex"]:
+        n_tokens, secs = time_engine(engine, contents)
+        print("{:10} {:>9} tokens {:8.3f} s {:>12,.0f} tokens/s".format(
+            engine, n_tokens, secs, n_tokens / secs
+        ))
+
+if __name__ == "__main__":
+    main()
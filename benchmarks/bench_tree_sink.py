@@ -0,0 +1,51 @@
+"""Engine time on the tests/vmcode corpus with and without the xml tree
+
+Usage: python benchmarks/bench_tree_sink.py [repeats]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# pylint: disable=wrong-import-position
+from jackcompiler.tokeniser import Tokeniser
+from jackcompiler.compilationengine import CompilationEngine
+from jackcompiler.utilities import list_files_with_ext
+
+CORPUS = os.path.join(os.path.dirname(__file__), "..", "tests", "vmcode")
+
+def corpus_tokens():
+    """Token lists for every class in the corpus"""
+    tok = Tokeniser()
+    all_tokens = []
+    for jackpath in list_files_with_ext(CORPUS, ext=".jack"):
+        with open(jackpath) as jackfile:
+            tok.contents = jackfile.read()
+        all_tokens.append(tok.get_tokens())
+    return all_tokens
+
+def time_corpus(all_tokens, build_tree, repeats):
+    """Returns the seconds taken to compile the corpus repeats times"""
+    engine = CompilationEngine()
+    engine.build_tree = build_tree
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for tokens in all_tokens:
+            engine.tokens = tokens
+            engine.get_vmcode()
+    return time.perf_counter() - start
+
+def main():
+    """Runs the benchmark"""
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    all_tokens = corpus_tokens()
+    with_tree = time_corpus(all_tokens, True, repeats)
+    without_tree = time_corpus(all_tokens, False, repeats)
+    print("with tree    {:8.3f} s".format(with_tree))
+    print("without tree {:8.3f} s".format(without_tree))
+    print("speedup      {:8.2f}x".format(with_tree / without_tree))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,384 @@
+"""Lowering of VM IR (see vmir) straight to Hack assembly.
+
+NaiveAsmtranslator is the textbook VM translator, kept as the baseline
+the optimised lowering is measured against. Asmtranslator keeps the top
+of the stack in D, calls and returns through shared routines and fuses
+operators with the pushes and jumps around them.
+
+Labels are scoped to their function as "function$label", statics of a
+class are the variables "Class.index", and the names the translators
+add themselves start with "$". Comparisons subtract, so like the
+textbook translator they are wrong when the subtraction overflows.
+"""
+
+from . import vmir
+
+SEGMENT_BASES = {
+    "local": "LCL", "argument": "ARG", "this": "THIS", "that": "THAT"
+}
+POINTERS = ("THIS", "THAT")
+FIRST_TEMP = 5
+STACK_BASE = 256
+
+# Where programs end up once Sys.init returns
+HALT = "$HALT"
+CALL = "$CALL"
+RETURN = "$RETURN"
+
+# C instructions of the binary operators for x op y, with y in D
+BINARY_ON_D = {
+    "add": "D=D+M", "sub": "D=M-D", "and": "D=D&M", "or": "D=D|M",
+    "eq": "D=M-D", "gt": "D=M-D", "lt": "D=M-D"
+}
+
+# Jumps taken when x op y holds, given x - y in D, and when it does not
+CONDITIONS = {
+    "eq": ("JEQ", "JNE"), "gt": ("JGT", "JLE"), "lt": ("JLT", "JGE")
+}
+
+# Largest offset reached by stepping A instead of adding in D
+MAX_STEPS = 7
+
+# Most locals zeroed by straight code rather than a loop
+MAX_UNROLLED_LOCALS = 8
+
+class NaiveAsmtranslator:
+    """Translates VM functions to Hack assembly one instruction at a
+    time, as the textbook VM translator does
+    """
+    def __init__(self):
+        self._lines = []
+        self._function = None
+        self._count = 0
+
+    def translate(self, functions, bootstrap=False):
+        """Returns the assembly lines for a list of functions. With
+        bootstrap, the code starts by setting up the stack and calling
+        Sys.init, and halts at HALT once that returns.
+        """
+        self._lines = []
+        self._function = "$"
+        self._count = 0
+        if bootstrap:
+            self._emit("@" + str(STACK_BASE), "D=A", "@SP", "M=D")
+            self._call("Sys.init", 0, HALT)
+            self._emit("@" + HALT, "0;JMP")
+        for func in functions:
+            self._function = func[0].arg
+            self._translate_function(func)
+        self._finish()
+        return self._lines
+
+    def _translate_function(self, func):
+        """Appends the code of one function"""
+        for instr in func:
+            self._translate(instr)
+
+    def _finish(self):
+        """Appends code shared by all the functions"""
+
+    def _emit(self, *lines):
+        self._lines.extend(lines)
+
+    def _new_label(self, kind):
+        """Returns a label no other instruction uses"""
+        self._count += 1
+        return "{}${}.{}".format(self._function, kind, self._count)
+
+    def _label(self, name):
+        """Returns the assembly name of a VM label"""
+        return self._function + "$" + name
+
+    def _register(self, instr):
+        """Returns the symbol of a static, temp or pointer variable"""
+        if instr.arg == "static":
+            return self._function.split(".", 1)[0] + "." + str(instr.num)
+        if instr.arg == "temp":
+            return "R" + str(FIRST_TEMP + instr.num)
+        return POINTERS[instr.num]
+
+    def _push_d(self):
+        self._emit("@SP", "A=M", "M=D", "@SP", "M=M+1")
+
+    def _pop_d(self):
+        self._emit("@SP", "AM=M-1", "D=M")
+
+    def _translate(self, instr):
+        """Appends the code of one instruction"""
+        if instr.op == "push":
+            if instr.arg == "constant":
+                self._emit("@" + str(instr.num), "D=A")
+            elif instr.arg in SEGMENT_BASES:
+                self._emit("@" + str(instr.num), "D=A",
+                           "@" + SEGMENT_BASES[instr.arg], "A=D+M", "D=M")
+            else:
+                self._emit("@" + self._register(instr), "D=M")
+            self._push_d()
+        elif instr.op == "pop":
+            if instr.arg in SEGMENT_BASES:
+                self._emit("@" + str(instr.num), "D=A",
+                           "@" + SEGMENT_BASES[instr.arg], "D=D+M",
+                           "@R13", "M=D")
+                self._pop_d()
+                self._emit("@R13", "A=M", "M=D")
+            else:
+                self._pop_d()
+                self._emit("@" + self._register(instr), "M=D")
+        elif instr.op in ("neg", "not"):
+            self._emit("@SP", "A=M-1",
+                       "M=-M" if instr.op == "neg" else "M=!M")
+        elif instr.op in vmir.COMPARISONS:
+            true, end = self._new_label("true"), self._new_label("end")
+            self._pop_d()
+            self._emit("A=A-1", "D=M-D", "@" + true,
+                       "D;" + CONDITIONS[instr.op][0], "@SP", "A=M-1",
+                       "M=0", "@" + end, "0;JMP", "(" + true + ")", "@SP",
+                       "A=M-1", "M=-1", "(" + end + ")")
+        elif instr.op in vmir.BINARY:
+            self._pop_d()
+            self._emit("A=A-1",
+                       BINARY_ON_D[instr.op].replace("D=", "M=", 1))
+        elif instr.op == "label":
+            self._emit("(" + self._label(instr.arg) + ")")
+        elif instr.op == "goto":
+            self._emit("@" + self._label(instr.arg), "0;JMP")
+        elif instr.op == "if-goto":
+            self._pop_d()
+            self._emit("@" + self._label(instr.arg), "D;JNE")
+        elif instr.op == "function":
+            self._emit("(" + instr.arg + ")")
+            for _ in range(instr.num):
+                self._emit("D=0")
+                self._push_d()
+        elif instr.op == "call":
+            self._call(instr.arg, instr.num, self._new_label("ret"))
+        elif instr.op == "return":
+            self._return()
+
+    def _call(self, name, argc, ret):
+        """Appends a call to name with argc arguments returning to ret"""
+        self._emit("@" + ret, "D=A")
+        self._push_d()
+        for pointer in ("LCL", "ARG", "THIS", "THAT"):
+            self._emit("@" + pointer, "D=M")
+            self._push_d()
+        self._emit("@SP", "D=M", "@" + str(argc + 5), "D=D-A", "@ARG", "M=D",
+                   "@SP", "D=M", "@LCL", "M=D", "@" + name, "0;JMP",
+                   "(" + ret + ")")
+
+    def _return(self):
+        self._emit("@LCL", "D=M", "@R13", "M=D", "@5", "A=D-A", "D=M",
+                   "@R14", "M=D")
+        self._pop_d()
+        self._emit("@ARG", "A=M", "M=D", "@ARG", "D=M+1", "@SP", "M=D")
+        for pointer in ("THAT", "THIS", "ARG", "LCL"):
+            self._emit("@R13", "AM=M-1", "D=M", "@" + pointer, "M=D")
+        self._emit("@R14", "A=M", "0;JMP")
+
+class Asmtranslator(NaiveAsmtranslator):
+    """Translates VM functions to Hack assembly, keeping the top of the
+    stack in D.
+
+    Between instructions the top of the stack is either in memory like
+    the rest of it or only in D ("cached"), with SP pointing where it
+    belongs. Labels, jumps and calls need it in memory; a return value
+    comes back cached. Calls and returns share one routine each, which
+    take the return address and the return value in D and the argument
+    count and callee in R13 and R14.
+    """
+    def __init__(self):
+        super().__init__()
+        self._cached = False
+
+    def _translate_function(self, func):
+        self._cached = False
+        i = 0
+        while i < len(func):
+            i += self._translate_at(func, i)
+
+    def _flush(self):
+        """Moves a cached top of the stack to memory"""
+        if self._cached:
+            self._emit("@SP", "AM=M+1", "A=A-1", "M=D")
+            self._cached = False
+
+    def _load(self):
+        """Makes sure the top of the stack is in D, off the stack"""
+        if not self._cached:
+            self._pop_d()
+            self._cached = True
+
+    def _address(self, instr):
+        """Returns the lines putting the address of a variable in A
+        without changing D, or None if that takes D
+        """
+        if instr.arg not in SEGMENT_BASES:
+            return ["@" + self._register(instr)]
+        if instr.num > MAX_STEPS:
+            return None
+        base = "@" + SEGMENT_BASES[instr.arg]
+        if instr.num == 0:
+            return [base, "A=M"]
+        return [base, "A=M+1"] + ["A=A+1"] * (instr.num - 1)
+
+    def _value(self, instr):
+        """Returns the lines putting the value a push reads in D"""
+        if instr.arg == "constant":
+            if instr.num in (0, 1):
+                return ["D=" + str(instr.num)]
+            return ["@" + str(instr.num), "D=A"]
+        address = self._address(instr) if instr.num <= 2 or \
+            instr.arg not in SEGMENT_BASES else None
+        if address is None:
+            return ["@" + str(instr.num), "D=A",
+                    "@" + SEGMENT_BASES[instr.arg], "A=D+M", "D=M"]
+        return address + ["D=M"]
+
+    def _translate_at(self, func, i):
+        """Appends the code of func[i] and maybe of the instructions
+        after it. Returns how many instructions it translated.
+        """
+        instr = func[i]
+        after = func[i + 1:i + 3]
+        if instr.op == "push":
+            if after and after[0].op in vmir.BINARY:
+                fused = self._operand(instr, after[0].op)
+                if fused is not None:
+                    self._load()
+                    self._emit(*fused)
+                    if after[0].op in vmir.COMPARISONS:
+                        return 2 + self._compare(after[0].op,
+                                                 func[i + 2:i + 4])
+                    return 2
+            self._flush()
+            self._emit(*self._value(instr))
+            self._cached = True
+        elif instr.op == "pop":
+            self._load()
+            address = self._address(instr)
+            if address is None:
+                self._emit("@R13", "M=D", "@" + str(instr.num), "D=A",
+                           "@" + SEGMENT_BASES[instr.arg], "D=D+M", "@R14",
+                           "M=D", "@R13", "D=M", "@R14", "A=M")
+            else:
+                self._emit(*address)
+            self._emit("M=D")
+            self._cached = False
+        elif instr.op in vmir.UNARY:
+            self._load()
+            self._emit("D=-D" if instr.op == "neg" else "D=!D")
+        elif instr.op in vmir.BINARY:
+            self._load()
+            self._emit("@SP", "AM=M-1", BINARY_ON_D[instr.op])
+            if instr.op in vmir.COMPARISONS:
+                return 1 + self._compare(instr.op, after)
+        elif instr.op == "label":
+            self._flush()
+            self._emit("(" + self._label(instr.arg) + ")")
+        elif instr.op == "goto":
+            self._flush()
+            self._emit("@" + self._label(instr.arg), "0;JMP")
+        elif instr.op == "if-goto":
+            self._load()
+            self._emit("@" + self._label(instr.arg), "D;JNE")
+            self._cached = False
+        elif instr.op == "function":
+            self._emit("(" + instr.arg + ")")
+            self._zero_locals(instr.num)
+            self._cached = False
+        elif instr.op == "call":
+            self._flush()
+            self._call(instr.arg, instr.num, self._new_label("ret"))
+            self._cached = True
+        elif instr.op == "return":
+            self._load()
+            self._emit("@" + RETURN, "0;JMP")
+            self._cached = False
+        return 1
+
+    def _operand(self, instr, oper):
+        """Returns the lines applying oper to the cached top of the stack
+        and the value instr pushes, or None if that is not shorter
+        """
+        if instr.arg == "constant" and oper in ("add", "sub") and \
+                instr.num in (0, 1):
+            return ["D=D+1" if oper == "add" else "D=D-1"] \
+                if instr.num else []
+        if instr.arg == "constant":
+            register = "A"
+            address = ["@" + str(instr.num)]
+        else:
+            register = "M"
+            address = self._address(instr)
+            if address is None:
+                return None
+        comp = {"add": "D=D+X", "sub": "D=D-X", "and": "D=D&X",
+                "or": "D=D|X"}.get(oper, "D=D-X")
+        return address + [comp.replace("X", register)]
+
+    def _compare(self, oper, after):
+        """Turns x - y in D into the result of comparison oper, jumping
+        straight away if the instructions after it are an if-goto, or
+        not and if-goto. Returns how many of those it translated.
+        """
+        true, false = CONDITIONS[oper]
+        if after and after[0].op == "if-goto":
+            self._emit("@" + self._label(after[0].arg), "D;" + true)
+            self._cached = False
+            return 1
+        if len(after) == 2 and after[0].op == "not" and \
+                after[1].op == "if-goto":
+            self._emit("@" + self._label(after[1].arg), "D;" + false)
+            self._cached = False
+            return 2
+        label, end = self._new_label("true"), self._new_label("end")
+        self._emit("@" + label, "D;" + true, "D=0", "@" + end, "0;JMP",
+                   "(" + label + ")", "D=-1", "(" + end + ")")
+        self._cached = True
+        return 0
+
+    def _zero_locals(self, count):
+        """Pushes count zeros at the start of a function"""
+        if count == 0:
+            return
+        if count <= MAX_UNROLLED_LOCALS:
+            self._emit("@SP", "A=M", "M=0")
+            self._emit(*["A=A+1", "M=0"] * (count - 1))
+            self._emit("D=A+1", "@SP", "M=D")
+            return
+        loop = self._new_label("zero")
+        self._emit("@" + str(count), "D=A", "(" + loop + ")", "@SP",
+                   "AM=M+1", "A=A-1", "M=0", "D=D-1", "@" + loop, "D;JGT")
+
+    def _call(self, name, argc, ret):
+        self._emit(*(["D=" + str(argc)] if argc <= 1
+                     else ["@" + str(argc), "D=A"]))
+        self._emit("@R13", "M=D", "@" + name, "D=A", "@R14", "M=D",
+                   "@" + ret, "D=A", "@" + CALL, "0;JMP", "(" + ret + ")")
+
+    def _finish(self):
+        self._emit("(" + CALL + ")", "@SP", "A=M", "M=D")
+        for pointer in ("LCL", "ARG", "THIS", "THAT"):
+            self._emit("@" + pointer, "D=M", "@SP", "AM=M+1", "M=D")
+        self._emit("@SP", "MD=M+1", "@LCL", "M=D", "@R13", "D=D-M", "@5",
+                   "D=D-A", "@ARG", "M=D", "@R14", "A=M", "0;JMP")
+        # The return value stays in D; the caller's SP is the callee's ARG
+        self._emit("(" + RETURN + ")", "@R13", "M=D", "@ARG", "D=M", "@R14",
+                   "M=D", "@5", "D=A", "@LCL", "A=M-D", "D=M", "@R15", "M=D")
+        for pointer in ("THAT", "THIS", "ARG", "LCL"):
+            self._emit("@LCL", "AM=M-1", "D=M", "@" + pointer, "M=D")
+        self._emit("@R14", "D=M", "@SP", "M=D", "@R13", "D=M", "@R15", "A=M",
+                   "0;JMP")
+
+def lower(functions, bootstrap=False, naive=False):
+    """Returns the assembly lines for a list of functions"""
+    translator = NaiveAsmtranslator() if naive else Asmtranslator()
+    return translator.translate(functions, bootstrap)
+
+def rom_size(lines):
+    """Returns the number of instructions in assembly lines"""
+    return sum(1 for line in lines if not line.startswith("("))
+
+def print_asm(lines):
+    """Returns assembly lines as text"""
+    return "".join(line + "\n" for line in lines)
@@ -0,0 +1,116 @@
+"""Call graph of a whole program and dead subroutine elimination.
+
+Every call in VM code names its target, so the graph built from the
+"call" instructions of all the functions of a program is exact.
+"""
+
+from collections import deque
+
+# The roots every program has
+DEFAULT_ROOTS = ("Sys.init", "Main.main")
+
+# The platform's OS may call any function of these classes, so the ones a
+# program defines itself are always kept
+OS_CLASSES = frozenset([
+    "Array", "Keyboard", "Math", "Memory", "Output", "Screen", "String",
+    "Sys"
+])
+
+def class_of(name):
+    """Returns the class part of a function name"""
+    return name.split(".", 1)[0]
+
+def build_call_graph(functions):
+    """Returns {function name: list of the names it calls}, in order of
+    first call, for functions given as lists of instructions
+    """
+    graph = {}
+    for func in functions:
+        targets = graph.setdefault(func[0].arg, [])
+        for instr in func:
+            if instr.op == "call" and instr.arg not in targets:
+                targets.append(instr.arg)
+    return graph
+
+def find_roots(graph, entry_points=()):
+    """Returns the defined functions to start from"""
+    roots = [
+        name for name in list(DEFAULT_ROOTS) + list(entry_points)
+        if name in graph
+    ]
+    roots.extend(
+        name for name in graph
+        if class_of(name) in OS_CLASSES and name not in roots
+    )
+    return roots
+
+def reachable(graph, roots):
+    """Returns {function name: name of the function it was first reached
+    from, or None for roots} for everything the roots can call,
+    including functions the program does not define
+    """
+    reached = {root: None for root in roots}
+    queue = deque(roots)
+    while queue:
+        name = queue.popleft()
+        for target in graph.get(name, ()):
+            if target not in reached:
+                reached[target] = name
+                queue.append(target)
+    return reached
+
+class Reachability:
+    """Which functions of a program are live.
+
+    Arguments:
+        functions -- every function of the program, as lists of
+            instructions
+        entry_points -- names of functions that are called from outside
+            the program besides DEFAULT_ROOTS
+    If none of the roots is defined (a library, say), everything is live.
+    """
+    def __init__(self, functions, entry_points=()):
+        self.graph = build_call_graph(functions)
+        self.sizes = {func[0].arg: len(func) for func in functions}
+        self.entry_points = list(entry_points)
+        self.roots = find_roots(self.graph, entry_points)
+        if any(class_of(root) not in OS_CLASSES for root in self.roots):
+            self.reached = reachable(self.graph, self.roots)
+        else:
+            self.reached = reachable(self.graph, list(self.graph))
+
+    def is_live(self, name):
+        """Whether the function can be called"""
+        return name in self.reached
+
+    def prune(self, functions):
+        """Returns the live functions out of a list of functions"""
+        return [func for func in functions if self.is_live(func[0].arg)]
+
+    def get_report(self):
+        """Returns a text report of what is kept and why"""
+        live = [name for name in self.graph if self.is_live(name)]
+        dead = [name for name in self.graph if not self.is_live(name)]
+        external = sorted(
+            name for name in self.reached if name not in self.graph
+        )
+        lines = ["Roots: " + ", ".join(self.roots)]
+        missing = [
+            name for name in self.entry_points if name not in self.graph
+        ]
+        if missing:
+            lines.append("Entry points not defined: " + ", ".join(missing))
+        lines.append("")
+        lines.append("Kept {} of {} functions ({} of {} instructions)".format(
+            len(live), len(self.graph),
+            sum(self.sizes[name] for name in live), sum(self.sizes.values())
+        ))
+        for name in live:
+            caller = self.reached[name]
+            lines.append("  " + name + (
+                " <- " + caller if caller is not None else " (root)"
+            ))
+        lines.append("Removed {} functions".format(len(dead)))
+        lines.extend("  " + name for name in dead)
+        lines.append("Called outside the program: " + ", ".join(external))
+        return "\n".join(lines) + "\n"
@@ -25,6 +25,16 @@ def run_cmd(system_arguments):
         -tok: Output tokens
         -tree: Output xml tree
         -novm: Do not output vm code
+        -asm: Output Hack assembly, one .asm per class, or one for the
+            whole program with -wholeprogram or -O3
+        -stream: Compile with bounded memory (lazy reading, direct output)
+        -O0, -O1, -O2, -O3: VM optimisation level (highest given wins,
+            default 0). -O3 inlines small subroutines across all the files.
+        -poolstr: Build each string literal once into a hidden static
+        -wholeprogram: Compile all the files as one program, leaving out
+            subroutines nothing calls, and write reachability.txt
+        -profile: Compile all the files as one program, run it in the VM
+            emulator and write the instructions executed to profile.json
         -h: Show help
     """
 
@@ -34,6 +44,15 @@ def run_cmd(system_arguments):
         "-tok": Cmdent("outtokens", "bool"),
         "-tree": Cmdent("outtree", "bool"),
         "-novm": Cmdent("novm", "bool"),
+        "-asm": Cmdent("asm", "bool"),
+        "-stream": Cmdent("stream", "bool"),
+        "-O0": Cmdent("O0", "bool"),
+        "-O1": Cmdent("O1", "bool"),
+        "-O2": Cmdent("O2", "bool"),
+        "-O3": Cmdent("O3", "bool"),
+        "-poolstr": Cmdent("poolstr", "bool"),
+        "-wholeprogram": Cmdent("wholeprogram", "bool"),
+        "-profile": Cmdent("profile", "bool"),
         "-h": Cmdent("help", "bool")
     }
 
@@ -55,6 +74,16 @@ def run_cmd(system_arguments):
     comp.outtokens = opts["outtokens"]
     comp.outtree = opts["outtree"]
     comp.outvm = not opts["novm"]
+    comp.outasm = opts["asm"]
+    comp.stream = opts["stream"]
+    comp.optlevel = max(
+        [level for level in range(4) if opts["O" + str(level)]] + [0]
+    )
+    comp.pool_strings = opts["poolstr"]
+    comp.profile = opts["profile"]
+    if opts["wholeprogram"] or comp.optlevel == 3 or comp.profile:
+        comp.run_program(paths, prune=opts["wholeprogram"])
+        return
     for path in paths:
         comp.jackpath = path
         comp.run()
@@ -73,5 +102,15 @@ def print_options():
         -tok: Output tokens\n
         -tree: Output xml tree\n
         -novm: Do not output vm code\n
+        -asm: Output Hack assembly, one .asm per class, or one for the
+            whole program with -wholeprogram or -O3\n
+        -stream: Compile with bounded memory (lazy reading, direct output)\n
+        -O0, -O1, -O2, -O3: VM optimisation level (default 0).
+            -O3 inlines small subroutines across all the files\n
+        -poolstr: Build each string literal once into a hidden static\n
+        -wholeprogram: Compile all the files as one program, leaving out
+            subroutines nothing calls, and write reachability.txt\n
+        -profile: Compile all the files as one program, run it in the VM
+            emulator and write the instructions executed to profile.json\n
         -h: Show this message\n"""
     )
@@ -3,21 +3,83 @@ Does not have a huge amount of error checking, will likely only work with
 correctly written .jack classes.
 """
 
+from collections import Counter
+from collections.abc import Iterable
 from .utilities import build_terminal
-from .glossary import is_term, is_op, KEYWORD_CONSTANTS, UNARY_OP, OPER, SEGMENT
+from .tokeniser import LookaheadBuffer
+from .emitter import Emitter
+from .glossary import (
+    is_term, is_op, KEYWORD_CONSTANTS, UNARY_OP, OPER, SEGMENT,
+    CLASS_VAR_FIRST, SUBROUTINE_FIRST, TERM_FOLLOW_NESTED, TYPE_TOKEN_TYPES,
+    INT_CONST, STRING_CONST, IDENTIFIER
+)
 from .symboltable import SymbolTable
+from .passmanager import PassManager
+from . import vmir
+from .vmir import print_vm, parse_vm, COMPARISONS
+
+_KEYWORD_CONSTANTS_IR = {
+    key: parse_vm(code) for key, code in KEYWORD_CONSTANTS.items()
+}
+_UNARY_OP_IR = {oper: parse_vm(code) for oper, code in UNARY_OP.items()}
+_OPER_IR = {oper: parse_vm(code) for oper, code in OPER.items()}
+
+_SET_THAT = vmir.pop("pointer", 1)
+# Segments a call cannot change
+_LOCAL_SEGMENTS = frozenset(["constant", "local", "argument"])
+
+def _is_pure(instr, has_calls):
+    """Whether instr gives the same result wherever it runs in a statement
+    (with calls in between if has_calls)
+    """
+    if instr.op == "push":
+        if has_calls:
+            return instr.arg in _LOCAL_SEGMENTS
+        return instr.arg in _LOCAL_SEGMENTS or instr.arg in ("static", "this")
+    return instr.op in vmir.ARITHMETIC
 
 class UnexpectedToken(Exception):
     """Exception raised for unexpected tokens in input"""
     def __init__(self, tok):
-        super().__init__("unexpected token: " + tok["value"])
+        super().__init__("unexpected token: " + tok.value)
+
+def drive(steps):
+    """Runs a generator of compilation steps without recursing.
+
+    A step generator yields the generator of each nested construct; that
+    one is run to completion first and its return value is sent back in.
+    """
+    stack = [steps]
+    value = None
+    while stack:
+        try:
+            nested = stack[-1].send(value)
+        except StopIteration as stop:
+            stack.pop()
+            value = stop.value
+            continue
+        stack.append(nested)
+        value = None
 
 class Vmtranslator():
-    """Creates VM code"""
-    def __init__(self):
+    """Creates VM code.
+
+    Code is built as vmir instructions, one list per function. Finished
+    functions go through the pass manager and are printed, either into
+    get_vmcode() or, when self.out is an open file, straight to it.
+    Without passes to run, code is written out after every statement.
+    """
+    def __init__(self, pass_manager=None):
         self._class_name = None
-        self._vmcode = None
+        self._functions = []
+        self._code = None
         self._loop_counts = None
+        self._vmcode = None
+        self._strings = None
+        self.static_count = 0
+        self.out = None
+        self.pass_manager = PassManager() if pass_manager is None \
+            else pass_manager
 
     @property
     def class_name(self):
@@ -29,63 +91,150 @@ class Vmtranslator():
         if not isinstance(nme, str):
             raise TypeError("class_name should be a string")
         self._class_name = nme
-        self._vmcode = ""
-        self._loop_counts = {"while": 0, "if": 0}
+        self._functions = []
+        self._code = None
+        self._vmcode = None
+        self._strings = {}
+        self.static_count = 0
+        self._loop_counts = {"while": 0, "if": 0, "string": 0}
+
+    def get_ir(self):
+        """Returns the optimised instructions, one list per function"""
+        if self._vmcode is None:
+            self._functions = [
+                self.pass_manager.run(func) for func in self._functions
+            ]
+            self._vmcode = Emitter()
+            for func in self._functions:
+                self._vmcode.write(print_vm(func))
+        return self._functions
 
     def get_vmcode(self):
         """Returns the VM code"""
-        return self._vmcode
+        self.get_ir()
+        return self._vmcode.getvalue()
 
     def get_loop_counts(self):
         """Returns the loop indeces"""
         return self._loop_counts
 
+    def close_class(self):
+        """Finishes the class"""
+        self._flush()
+
+    def _flush(self):
+        """Writes finished functions to self.out, if set"""
+        if self.out is None:
+            return
+        for func in self._functions:
+            self.out.write(print_vm(self.pass_manager.run(func)))
+        self._functions = []
+
+    def end_statement(self):
+        """Writes the code so far to self.out if no pass needs it"""
+        if self.out is None or self.pass_manager.has_passes():
+            return
+        self.out.write(print_vm(self._code))
+        self._code.clear()
+
     def start_subroutine(self, subname, varcount, subtype, fieldcount):
         """Resets for a new subroutine"""
+        self._flush()
         self._loop_counts["while"] = 0
         self._loop_counts["if"] = 0
-        self._vmcode += "function " + self._class_name + "." + subname + \
-            " " + str(varcount) + "\n"
+        self._loop_counts["string"] = 0
+        self._code = [vmir.function(self._class_name + "." + subname,
+                                    varcount)]
+        self._functions.append(self._code)
         if subtype == "constructor":
-            self._vmcode += "push constant " + str(fieldcount) + "\n" + \
-                "call Memory.alloc 1\npop pointer 0\n"
+            self._code.extend([
+                vmir.push("constant", fieldcount),
+                vmir.call("Memory.alloc", 1),
+                vmir.pop("pointer", 0)
+            ])
         elif subtype == "method":
-            self._vmcode += "push argument 0\npop pointer 0\n"
+            self._code.extend([
+                vmir.push("argument", 0), vmir.pop("pointer", 0)
+            ])
 
     def ignore_void_return(self):
         """Writes the void return"""
-        self._vmcode += "pop temp 0\n"
+        self._code.append(vmir.pop("temp", 0))
 
     def return_statement(self, void):
         """Writes the void return"""
         if void:
-            self._vmcode += "push constant 0\n"
-        self._vmcode += "return\n"
+            self._code.append(vmir.push("constant", 0))
+        self._code.append(vmir.RETURN)
 
-    def let_statement(self, is_array_entry, seg, var_ind):
-        """Writes code for a let statement"""
+    def mark(self):
+        """Returns the position of the next instruction in the function"""
+        return len(self._code)
+
+    def let_statement(self, is_array_entry, seg, var_ind, marks=None):
+        """Writes code for a let statement.
+        marks: for an array entry, where the code of its address and of
+            the value start (see mark())
+        """
         if is_array_entry:
+            if marks is not None and \
+                    self.pass_manager.uses("array-stores") and \
+                    self._store_array_entry(*marks):
+                return
             # Store return, store address of entry, push return and store
-            self._vmcode += "pop temp 0\npop pointer 1\n" + \
-                "push temp 0\npop that 0\n"
+            self._code.extend([
+                vmir.pop("temp", 0), vmir.pop("pointer", 1),
+                vmir.push("temp", 0), vmir.pop("that", 0)
+            ])
         else:
-            self._vmcode += "pop " + seg + " " + str(var_ind) + "\n"
+            self._code.append(vmir.pop(seg, var_ind))
+
+    def _store_array_entry(self, address, value):
+        """Sets pointer 1 before computing the value when the value does
+        not move it, or only reads the entry being stored to.
+        Returns whether it wrote the store.
+        """
+        addr = self._code[address:value]
+        rhs = self._code[value:]
+        loads = [i for i, instr in enumerate(rhs) if instr == _SET_THAT]
+        if loads:
+            has_calls = any(instr.op == "call" for instr in rhs)
+            if not all(_is_pure(instr, has_calls) for instr in addr):
+                return False
+            reused = []
+            start = 0
+            for i in loads:
+                if i - len(addr) < start or rhs[i - len(addr):i] != addr:
+                    return False
+                reused.extend(rhs[start:i - len(addr)])
+                start = i + 1
+            rhs = reused + rhs[start:]
+        # Calls leave pointer 1 alone: the callee's THAT is restored
+        self._code[value:] = [_SET_THAT] + rhs + [vmir.pop("that", 0)]
+        return True
 
     def open_while(self):
         """Writes code for a while statement"""
         this_ind = self._loop_counts["while"]
-        self._vmcode += "label WHILE_EXP" + str(this_ind) + "\n"
+        self._code.append(vmir.label("WHILE_EXP" + str(this_ind)))
         self._loop_counts["while"] += 1
         return this_ind
 
     def check_while(self, ind):
         """Code to check the while condition"""
-        self._vmcode += "not\nif-goto WHILE_END" + str(ind) + "\n"
+        if self.pass_manager.uses("direct-branches"):
+            self._branch_unless("WHILE_END" + str(ind), loop=True)
+            return
+        self._code.extend([
+            vmir.arith("not"), vmir.if_goto("WHILE_END" + str(ind))
+        ])
 
     def close_while(self, ind):
         """Closes the while statement"""
-        self._vmcode += "goto WHILE_EXP" + str(ind) + \
-            "\nlabel WHILE_END" + str(ind) + "\n"
+        self._code.extend([
+            vmir.goto("WHILE_EXP" + str(ind)),
+            vmir.label("WHILE_END" + str(ind))
+        ])
 
     def open_if(self):
         """Opens the if statement"""
@@ -95,65 +244,149 @@ class Vmtranslator():
 
     def if_flow(self, ind):
         """If statement flow control"""
-        self._vmcode += "if-goto IF_TRUE" + str(ind) + "\n" + \
-            "goto IF_FALSE" + str(ind) + "\n" + \
-            "label IF_TRUE" + str(ind) + "\n"
-
-    def if_close(self, ind, else_present):
+        if self.pass_manager.uses("direct-branches"):
+            self._branch_unless("IF_FALSE" + str(ind))
+            return
+        self._code.extend([
+            vmir.if_goto("IF_TRUE" + str(ind)),
+            vmir.goto("IF_FALSE" + str(ind)),
+            vmir.label("IF_TRUE" + str(ind))
+        ])
+
+    def if_close(self, ind, else_present, end_needed=True):
         """Closes the if statement"""
         if else_present:
-            self._vmcode += "label IF_END" + str(ind) + "\n"
+            if end_needed:
+                self._code.append(vmir.label("IF_END" + str(ind)))
         else:
-            self._vmcode += "label IF_FALSE" + str(ind) + "\n"
+            self._code.append(vmir.label("IF_FALSE" + str(ind)))
 
     def else_clause(self, ind):
-        """Writes the else clause"""
-        self._vmcode += "goto IF_END" + str(ind) + \
-            "\nlabel IF_FALSE" + str(ind) + "\n"
+        """Writes the else clause.
+        Returns whether the true branch jumps to IF_END.
+        """
+        end_needed = not (self.pass_manager.uses("direct-branches") and
+                          self._code and self._code[-1] == vmir.RETURN)
+        if end_needed:
+            self._code.append(vmir.goto("IF_END" + str(ind)))
+        self._code.append(vmir.label("IF_FALSE" + str(ind)))
+        return end_needed
+
+    def _is_boolean(self, end):
+        """Whether the code before end leaves 0 or -1 on the stack"""
+        while end > 0 and self._code[end - 1].op == "not":
+            end -= 1
+        if end == 0:
+            return False
+        last = self._code[end - 1]
+        return last.op in COMPARISONS or last == vmir.push("constant", 0)
+
+    def _branch_unless(self, lbl, loop=False):
+        """Jumps to lbl if the condition just computed is false.
+        Negations and comparisons are turned around so that this takes
+        one if-goto and at most one more instruction. An if takes any
+        non-zero condition as true, a loop only -1, as at -O0.
+        """
+        last = self._code[-1]
+        if last.op == "not" and self._is_boolean(len(self._code) - 1):
+            # ~c is false exactly when c is true
+            self._code.pop()
+        elif last.op == "eq":
+            # x = y is false exactly when x - y is not zero
+            self._code[-1] = vmir.arith("sub")
+        elif loop or self._is_boolean(len(self._code)):
+            self._code.append(vmir.arith("not"))
+        else:
+            self._code.extend([vmir.push("constant", 0), vmir.arith("eq")])
+        self._code.append(vmir.if_goto(lbl))
 
     def operator(self, oper, unary):
         """Writes code appropriate for the operator"""
         if unary:
-            self._vmcode += UNARY_OP[oper]
+            self._code.extend(_UNARY_OP_IR[oper])
         else:
-            self._vmcode += OPER[oper]
+            self._code.extend(_OPER_IR[oper])
 
     def write_term(self, term, knd):
         """Writes a term"""
         if knd == "string":
-            self._vmcode += "push constant " + str(len(term)) + \
-            "\ncall String.new 1\n"
-            for char in term:
-                self._vmcode += "push constant " + str(ord(char)) + \
-                    "\ncall String.appendChar 2\n"
+            if self.pass_manager.uses("string-pool"):
+                self._pooled_string(term)
+            else:
+                self._new_string(term)
         elif knd == "int":
-            self._vmcode += "push constant " + term + "\n"
+            self._code.append(vmir.push("constant", int(term)))
         elif knd == "key":
-            self._vmcode += KEYWORD_CONSTANTS[term]
+            self._code.extend(_KEYWORD_CONSTANTS_IR[term])
+
+    def _new_string(self, term):
+        """Builds a string on the heap"""
+        self._code.extend([
+            vmir.push("constant", len(term)), vmir.call("String.new", 1)
+        ])
+        for char in term:
+            self._code.extend([
+                vmir.push("constant", ord(char)),
+                vmir.call("String.appendChar", 2)
+            ])
+
+    def _pooled_string(self, term):
+        """Pushes a string kept in a hidden static after the class's own,
+        building it the first time the code runs. Pooled strings are
+        shared, so they should not be changed or disposed of.
+        """
+        report = self.pass_manager.report.setdefault("string-pool", Counter())
+        ind = self._strings.get(term)
+        if ind is None:
+            ind = self.static_count + len(self._strings)
+            self._strings[term] = ind
+            report["literals"] += 1
+        report["uses"] += 1
+        ready = "STRING_READY" + str(self._loop_counts["string"])
+        self._loop_counts["string"] += 1
+        self._code.extend([vmir.push("static", ind), vmir.if_goto(ready)])
+        self._new_string(term)
+        self._code.extend([
+            vmir.pop("static", ind), vmir.label(ready),
+            vmir.push("static", ind)
+        ])
 
     def array_entry(self):
         """Writes code for array entry"""
-        self._vmcode += "add\npop pointer 1\npush that 0\n"
+        self._code.extend([
+            vmir.arith("add"), vmir.pop("pointer", 1), vmir.push("that", 0)
+        ])
 
     def push_statement(self, seg, ind):
         """Writes a push statement"""
-        self._vmcode += "push " + seg + " " + str(ind) + "\n"
+        self._code.append(vmir.push(seg, ind))
 
     def call(self, call_name, exp_n):
         """Writes a call"""
-        self._vmcode += "call " + call_name + " " + str(exp_n) + "\n"
+        self._code.append(vmir.call(call_name, exp_n))
 
     def add(self):
         """Writes the add command"""
-        self._vmcode += "add\n"
-
+        self._code.append(vmir.arith("add"))
 
 class Xmltranslator():
     """Creates the xml tree"""
     def __init__(self):
-        self._xml_tree = ""
+        self._xml_tree = Emitter()
         self._tab_char = "  "
         self._tab_level = 0
+        self._out = None
+        self._emit = self._xml_tree.write
+
+    @property
+    def out(self):
+        """Open file the tree goes to, None to keep it in memory"""
+        return self._out
+
+    @out.setter
+    def out(self, out):
+        self._out = out
+        self._emit = self._xml_tree.write if out is None else out.write
 
     @property
     def tab_char(self):
@@ -168,39 +401,85 @@ class Xmltranslator():
 
     def get_xml_tree(self):
         """Returns the xml tree"""
-        return self._xml_tree
+        return self._xml_tree.getvalue()
 
     def open_section(self, secname):
         """Opens a section"""
-        self._xml_tree += self._tab_level * self.tab_char + \
-            "<" + secname + ">\n"
+        self._emit(self._tab_level * self.tab_char +
+            "<" + secname + ">\n")
         self._tab_level += 1
 
     def close_section(self, secname):
         """Closes a section"""
         self._tab_level -= 1
-        self._xml_tree += self._tab_level * self.tab_char + \
-            "</" + secname + ">\n"
+        self._emit(self._tab_level * self.tab_char +
+            "</" + secname + ">\n")
 
     def append_terminal(self, tok):
         """Creates a string for xml writing"""
-        self._xml_tree += self._tab_level * self.tab_char + build_terminal(tok)
+        self._emit(self._tab_level * self.tab_char + build_terminal(tok))
+
+class NullXmltranslator():
+    """Stands in for Xmltranslator when no xml tree is wanted"""
+    def __init__(self):
+        self.out = None
+
+    def get_xml_tree(self):
+        """There is no tree to return"""
+        raise ValueError("xml tree was not built, set build_tree")
+
+    def open_section(self, secname):
+        """Does nothing"""
+
+    def close_section(self, secname):
+        """Does nothing"""
+
+    def append_terminal(self, tok):
+        """Does nothing"""
 
 class CompilationEngine():
     """Controls compilation
 
     Arguments:
-        self.tokens -- list of tokens (TokenInfo class).
-            Should represent one class.
-        out_file_path -- path to the file to write translation to
+        self.tokens -- list or iterator of tokens (tokeniser.Token).
+            Should represent one class. Only one token of lookahead is
+            ever held, so a generator can be streamed through.
+        self.build_tree -- whether to build the xml tree at all.
+        self.pass_manager.optlevel -- VM optimisation level.
     """
     def __init__(self):
         self._tokens = None
-        self._cur_ind = None
+        self._tokbuf = None
         self._compiled = None
         self._symbol_table = SymbolTable()
         self._xmltranslator = Xmltranslator()
         self._vmtranslator = Vmtranslator()
+        # Statement dispatch: the keys are the FIRST set of a statement
+        self._statement_handlers = {
+            "let": self._compile_let,
+            "if": self._compile_if,
+            "while": self._compile_while,
+            "do": self._compile_do,
+            "return": self._compile_return
+        }
+
+    @property
+    def pass_manager(self):
+        """PassManager run over every compiled function"""
+        return self._vmtranslator.pass_manager
+
+    @property
+    def build_tree(self):
+        """Whether the xml tree is built alongside the VM code"""
+        return isinstance(self._xmltranslator, Xmltranslator)
+
+    @build_tree.setter
+    def build_tree(self, build):
+        if not isinstance(build, bool):
+            raise TypeError("build_tree should be boolean")
+        if build != self.build_tree:
+            self._xmltranslator = Xmltranslator() if build \
+                else NullXmltranslator()
 
     @property
     def tokens(self):
@@ -209,14 +488,14 @@ class CompilationEngine():
 
     @tokens.setter
     def tokens(self, toks):
-        if not isinstance(toks, list):
-            raise TypeError("tokens should be a list")
+        if not isinstance(toks, Iterable):
+            raise TypeError("tokens should be a list or an iterator")
         self._tokens = toks
-        self._cur_ind = 0
+        self._tokbuf = LookaheadBuffer(toks)
         self._compiled = False
         self._symbol_table.__init__()
         self._xmltranslator.__init__()
-        self._vmtranslator.__init__()
+        self._vmtranslator.__init__(self._vmtranslator.pass_manager)
 
     def get_xml_tree(self):
         """Returns the xml tree"""
@@ -230,24 +509,40 @@ class CompilationEngine():
             self.compile()
         return self._vmtranslator.get_vmcode()
 
-    def _append_xml_terminal(self):
-        """Appends a terminal"""
-        self._xmltranslator.append_terminal(self.tokens[self._cur_ind])
-        self._cur_ind += 1
+    def get_ir(self):
+        """Returns the VM code as vmir instructions, one list per function"""
+        if not self._compiled:
+            self.compile()
+        return self._vmtranslator.get_ir()
 
     def _process_token(self, check=None, ideal=None):
-        """Checks that the token is appropriate and appends it"""
-        if (check is not None) and (ideal is not None):
-            if not isinstance(ideal, list):
-                ideal = [ideal]
-            if self.tokens[self._cur_ind][check] not in ideal:
-                raise UnexpectedToken(self.tokens[self._cur_ind])
-        self._append_xml_terminal()
+        """Checks that the token is appropriate and appends it.
+        ideal is either the one value or type allowed or a frozenset of them.
+        """
+        tok = self._tokbuf.current
+        if check is not None:
+            got = tok.value if check == "value" else tok.type
+            if isinstance(ideal, frozenset):
+                if got not in ideal:
+                    raise UnexpectedToken(tok)
+            elif got != ideal:
+                raise UnexpectedToken(tok)
+        self._xmltranslator.append_terminal(tok)
+        self._tokbuf.advance()
 
     def compile(self):
         """Runs the compilations process"""
         self._compile_class()
 
+    def stream(self, toks, vm_out=None, tree_out=None):
+        """Compiles a token iterator, writing VM code and the xml tree
+        straight to the given open files as they are produced.
+        """
+        self.tokens = toks
+        self._vmtranslator.out = vm_out
+        self._xmltranslator.out = tree_out
+        self.compile()
+
     def _compile_class(self):
         """Compiles the entire class"""
 
@@ -255,23 +550,27 @@ class CompilationEngine():
 
         # The first three tokens
         self._process_token("value", "class")
-        self._vmtranslator.class_name = self.tokens[self._cur_ind]["value"]
+        self._vmtranslator.class_name = self._tokbuf.current.value
         self._process_token("type", "identifier")
         self._process_token("value", "{")
 
         # Class variables
-        while self.tokens[self._cur_ind]["value"] in ["static", "field"]:
+        while self._tokbuf.current.value in CLASS_VAR_FIRST:
             self._compile_class_var_dec()
+        self._vmtranslator.static_count = \
+            self._symbol_table.var_count("static")
+        self.pass_manager.statics[self._vmtranslator.class_name] = \
+            self._symbol_table.names_of("static")
 
         # Subroutines
-        while self.tokens[self._cur_ind]["value"] in \
-            ["constructor", "function", "method"]:
+        while self._tokbuf.current.value in SUBROUTINE_FIRST:
             self._compile_subroutine()
 
         # Closing '}'
         self._process_token("value", "}")
 
         # Finish up the class
+        self._vmtranslator.close_class()
         self._xmltranslator.close_section("class")
         self._compiled = True
 
@@ -282,19 +581,19 @@ class CompilationEngine():
         # All of these should be in the symbol table
 
         # Variable kind (static or field)
-        knd = self.tokens[self._cur_ind]["value"]
-        self._process_token("value", ["static", "field"])
+        knd = self._tokbuf.current.value
+        self._process_token("value", CLASS_VAR_FIRST)
 
         # Variable type
-        tpe = self.tokens[self._cur_ind]["value"]
-        self._process_token("type", ["keyword", "identifier"])
+        tpe = self._tokbuf.current.value
+        self._process_token("type", TYPE_TOKEN_TYPES)
 
         # Variable name(s)
-        while self.tokens[self._cur_ind]["value"] != ";":
-            nme = self.tokens[self._cur_ind]["value"]
+        while self._tokbuf.current.value != ";":
+            nme = self._tokbuf.current.value
             self._process_token("type", "identifier")
             self._symbol_table.define(nme, tpe, knd)
-            if self.tokens[self._cur_ind]["value"] == ",":
+            if self._tokbuf.current.value == ",":
                 self._process_token()
 
         self._process_token("value", ";")
@@ -306,15 +605,15 @@ class CompilationEngine():
         self._xmltranslator.open_section("subroutineDec")
 
         # Subroutine type
-        subroutine_type = self.tokens[self._cur_ind]["value"]
+        subroutine_type = self._tokbuf.current.value
         self._symbol_table.subroutine_type = subroutine_type
-        self._process_token("value", ["constructor", "function", "method"])
+        self._process_token("value", SUBROUTINE_FIRST)
 
         # Next is the return type
-        self._process_token("type", ["keyword", "identifier"])
+        self._process_token("type", TYPE_TOKEN_TYPES)
 
         # Then is the name, not placing this in the symbol table.
-        subroutine_name = self.tokens[self._cur_ind]["value"]
+        subroutine_name = self._tokbuf.current.value
         self._process_token("type", "identifier")
 
         # Then is the parameter list.
@@ -325,7 +624,7 @@ class CompilationEngine():
         self._process_token("value", "{")
 
         # Then all the variables. All of these will go into the symbol table.
-        while self.tokens[self._cur_ind]["value"] == "var":
+        while self._tokbuf.current.value == "var":
             self._compile_var_dec()
 
         # Start VM translation
@@ -348,13 +647,13 @@ class CompilationEngine():
         self._xmltranslator.open_section("parameterList")
 
         # Then come the parameters
-        while self.tokens[self._cur_ind]["value"] != ")":
-            tpe = self.tokens[self._cur_ind]["value"]
-            self._process_token("type", ["keyword", "identifier"])
-            nme = self.tokens[self._cur_ind]["value"]
+        while self._tokbuf.current.value != ")":
+            tpe = self._tokbuf.current.value
+            self._process_token("type", TYPE_TOKEN_TYPES)
+            nme = self._tokbuf.current.value
             self._process_token("type", "identifier")
             self._symbol_table.define(nme, tpe, "arg")
-            if self.tokens[self._cur_ind]["value"] == ",":
+            if self._tokbuf.current.value == ",":
                 self._process_token()
 
         self._xmltranslator.close_section("parameterList")
@@ -368,15 +667,15 @@ class CompilationEngine():
         self._xmltranslator.open_section("varDec")
         self._process_token("value", "var")
 
-        tpe = self.tokens[self._cur_ind]["value"]
-        self._process_token("type", ["keyword", "identifier"])
+        tpe = self._tokbuf.current.value
+        self._process_token("type", TYPE_TOKEN_TYPES)
 
         # Var name(s)
-        while self.tokens[self._cur_ind]["value"] != ";":
-            nme = self.tokens[self._cur_ind]["value"]
+        while self._tokbuf.current.value != ";":
+            nme = self._tokbuf.current.value
             self._process_token("type", "identifier")
             self._symbol_table.define(nme, tpe, "var")
-            if self.tokens[self._cur_ind]["value"] == ",":
+            if self._tokbuf.current.value == ",":
                 self._process_token()
 
         self._process_token("value", ";")
@@ -389,19 +688,13 @@ class CompilationEngine():
 
         self._xmltranslator.open_section("statements")
 
+        handlers = self._statement_handlers
         while True:
-            if self.tokens[self._cur_ind]["value"] == "let":
-                self._compile_let()
-            elif self.tokens[self._cur_ind]["value"] == "if":
-                self._compile_if()
-            elif self.tokens[self._cur_ind]["value"] == "while":
-                self._compile_while()
-            elif self.tokens[self._cur_ind]["value"] == "do":
-                self._compile_do()
-            elif self.tokens[self._cur_ind]["value"] == "return":
-                self._compile_return()
-            else:
+            handler = handlers.get(self._tokbuf.current.value)
+            if handler is None:
                 break
+            handler()
+            self._vmtranslator.end_statement()
 
         # Close down
         self._xmltranslator.close_section("statements")
@@ -425,30 +718,32 @@ class CompilationEngine():
         self._xmltranslator.open_section("letStatement")
         self._process_token("value", "let")
 
-        var_name = self.tokens[self._cur_ind]["value"]
-        self._process_token("type", ["keyword", "identifier"])
+        var_name = self._tokbuf.current.value
+        self._process_token("type", TYPE_TOKEN_TYPES)
 
         is_array_entry = False
-        if self.tokens[self._cur_ind]["value"] == "[":
+        marks = None
+        if self._tokbuf.current.value == "[":
             is_array_entry = True
+            address = self._vmtranslator.mark()
             self._process_token("value", "[")
-            while is_term(self.tokens[self._cur_ind]):
+            while is_term(self._tokbuf.current):
                 self._compile_expression()
             self._process_token("value", "]")
             self._push_variable(var_name)
             self._vmtranslator.add()
+            marks = (address, self._vmtranslator.mark())
 
         self._process_token("value", "=")
 
-        while is_term(self.tokens[self._cur_ind]):
+        while is_term(self._tokbuf.current):
             self._compile_expression()
 
         self._process_token("value", ";")
 
-        seg = SEGMENT[self._symbol_table.kind_of(var_name)]
-        var_ind = self._symbol_table.index_of(var_name)
+        seg, var_ind = self._variable_location(var_name)
 
-        self._vmtranslator.let_statement(is_array_entry, seg, var_ind)
+        self._vmtranslator.let_statement(is_array_entry, seg, var_ind, marks)
 
         self._xmltranslator.close_section("letStatement")
 
@@ -460,7 +755,7 @@ class CompilationEngine():
         this_ind = self._vmtranslator.open_while()
         self._process_token("value", "while")
         self._process_token("value", "(")
-        while is_term(self.tokens[self._cur_ind]):
+        while is_term(self._tokbuf.current):
             self._compile_expression()
         self._process_token("value", ")")
         self._vmtranslator.check_while(this_ind)
@@ -477,7 +772,7 @@ class CompilationEngine():
         self._xmltranslator.open_section("returnStatement")
         self._process_token("value", "return")
         is_void = True
-        while is_term(self.tokens[self._cur_ind]):
+        while is_term(self._tokbuf.current):
             is_void = False
             self._compile_expression()
         self._vmtranslator.return_statement(is_void)
@@ -495,7 +790,7 @@ class CompilationEngine():
         self._process_token("value", "if")
 
         self._process_token("value", "(")
-        while is_term(self.tokens[self._cur_ind]):
+        while is_term(self._tokbuf.current):
             self._compile_expression()
         self._process_token("value", ")")
 
@@ -506,79 +801,106 @@ class CompilationEngine():
         self._process_token("value", "}")
 
         else_present = False
-        if self.tokens[self._cur_ind]["value"] == "else":
+        end_needed = True
+        if self._tokbuf.current.value == "else":
             else_present = True
-            self._vmtranslator.else_clause(this_ind)
+            end_needed = self._vmtranslator.else_clause(this_ind)
             self._process_token("value", "else")
             self._process_token("value", "{")
             self._compile_statements()
             self._process_token("value", "}")
-        self._vmtranslator.if_close(this_ind, else_present)
+        self._vmtranslator.if_close(this_ind, else_present, end_needed)
         self._xmltranslator.close_section("ifStatement")
 
     def _compile_expression(self):
-        """Compiles an expression.
-        term (op term)*
-        """
+        """Compiles an expression (see _expression_steps)"""
+        drive(self._expression_steps())
+
+    def _compile_subroutine_call(self):
+        """Compiles a subroutine call (see _subroutine_call_steps)"""
+        drive(self._subroutine_call_steps())
+
+    # The expression grammar is written as generators that yield the
+    # generator of each nested expression or term instead of calling it.
+    # drive() runs them on an explicit stack, so nesting depth is not
+    # limited by Python's recursion limit.
+
+    def _expression_steps(self):
+        """Steps to compile term (op term)*"""
         self._xmltranslator.open_section("expression")
-        self._compile_term()
-        while is_op(self.tokens[self._cur_ind]):
-            oper = self.tokens[self._cur_ind]["value"]
+        if not self._compile_simple_term():
+            yield self._term_steps()
+        while is_op(self._tokbuf.current):
+            oper = self._tokbuf.current.value
             self._process_token()
-            self._compile_term()
+            if not self._compile_simple_term():
+                yield self._term_steps()
             self._vmtranslator.operator(oper, unary=False)
         self._xmltranslator.close_section("expression")
 
-    def _compile_term(self):
-        """Compiles a term"""
-
+    def _compile_simple_term(self):
+        """Compiles the current term if it needs no nested steps
+        (a constant or a plain variable). Returns whether it did.
+        """
+        tok = self._tokbuf.current
+        code = tok.code
+        if code == STRING_CONST:
+            knd = "string"
+        elif code == INT_CONST:
+            knd = "int"
+        elif tok.value in KEYWORD_CONSTANTS:
+            knd = "key"
+        elif code == IDENTIFIER and \
+                self._tokbuf.peek().value not in TERM_FOLLOW_NESTED:
+            knd = None
+        else:
+            return False
         self._xmltranslator.open_section("term")
+        if knd is None:
+            self._push_variable()
+        else:
+            self._vmtranslator.write_term(tok.value, knd)
+            self._process_token()
+        self._xmltranslator.close_section("term")
+        return True
 
-        toktype = self.tokens[self._cur_ind]["type"]
-        tokval = self.tokens[self._cur_ind]["value"]
+    def _term_steps(self):
+        """Steps to compile a term"""
 
-        # String
-        if toktype == "stringConstant":
-            self._vmtranslator.write_term(tokval, "string")
-            self._process_token()
+        if self._compile_simple_term():
+            return
 
-        # Integer
-        elif toktype == "integerConstant":
-            self._vmtranslator.write_term(tokval, "int")
-            self._process_token()
+        self._xmltranslator.open_section("term")
 
-        # Keyword
-        elif tokval in KEYWORD_CONSTANTS.keys():
-            self._vmtranslator.write_term(tokval, "key")
-            self._process_token()
+        tokval = self._tokbuf.current.value
 
         # Experssion in brackets
-        elif tokval == "(":
+        if tokval == "(":
             self._process_token()
-            while is_term(self.tokens[self._cur_ind]):
-                self._compile_expression()
+            while is_term(self._tokbuf.current):
+                yield self._expression_steps()
             self._process_token("value", ")")
 
         # Unary operator
-        elif tokval in UNARY_OP.keys():
+        elif tokval in UNARY_OP:
             self._process_token() # For the unary operator
-            self._compile_term()
+            yield self._term_steps()
             self._vmtranslator.operator(tokval, unary=True)
 
         # This has to be an identifier
         else:
-            if toktype != "identifier":
-                raise UnexpectedToken(self.tokens[self._cur_ind])
+            if self._tokbuf.current.code != IDENTIFIER:
+                raise UnexpectedToken(self._tokbuf.current)
 
             # Array entry
-            if self.tokens[self._cur_ind + 1]["value"] == "[":
+            if self._tokbuf.peek().value == "[":
 
                 # Array name
                 self._process_token()
 
                 self._process_token("value", "[")
-                while is_term(self.tokens[self._cur_ind]):
-                    self._compile_expression()
+                while is_term(self._tokbuf.current):
+                    yield self._expression_steps()
                 self._process_token("value", "]")
 
                 # Get to the segment's content
@@ -586,39 +908,37 @@ class CompilationEngine():
                 self._vmtranslator.array_entry()
 
             # Subroutine call
-            elif self.tokens[self._cur_ind + 1]["value"] in ["(", "."]:
-                self._compile_subroutine_call()
-
-            # Presumably we found a variable identifier
             else:
-                self._push_variable()
+                yield self._subroutine_call_steps()
 
         # Close down
         self._xmltranslator.close_section("term")
 
-    def _compile_expression_list(self):
-        """Compiles a possibly empty comma-separated list of expressions"""
+    def _expression_list_steps(self):
+        """Steps to compile a possibly empty comma-separated list of
+        expressions. Returns the number of expressions.
+        """
         self._xmltranslator.open_section("expressionList")
         exp_count = 0
-        while is_term(self.tokens[self._cur_ind]):
+        while is_term(self._tokbuf.current):
             exp_count += 1
-            self._compile_expression()
-            if self.tokens[self._cur_ind]["value"] == ",":
+            yield self._expression_steps()
+            if self._tokbuf.current.value == ",":
                 self._process_token()
         self._xmltranslator.close_section("expressionList")
         return exp_count
 
-    def _compile_subroutine_call(self):
-        """"Compiles a call like
+    def _subroutine_call_steps(self):
+        """"Steps to compile a call like
         ClassName.subName(exprList) or
         subName(exprList) or
         varname.subname(exprlist)
         """
 
-        nme = self.tokens[self._cur_ind]["value"]
+        nme = self._tokbuf.current.value
         self._process_token("type", "identifier")
 
-        if self.tokens[self._cur_ind]["value"] == "(":
+        if self._tokbuf.current.value == "(":
             self._process_token()
             class_name = self._vmtranslator.class_name
             sub_name = nme
@@ -626,21 +946,23 @@ class CompilationEngine():
             add_arg = 1
         else:
             self._process_token("value", ".")
-            sub_name = self.tokens[self._cur_ind]["value"]
+            sub_name = self._tokbuf.current.value
             self._process_token("type", "identifier")
             self._process_token("value", "(")
-            class_name = self._symbol_table.resolve_symbol(nme)
-            if class_name == nme:
+            iden = self._symbol_table.entry_of(nme)
+            if iden is None:
+                class_name = nme
                 add_arg = 0
             else:
-                seg = SEGMENT[self._symbol_table.kind_of(nme)]
-                ind = self._symbol_table.index_of(nme)
-                self._vmtranslator.push_statement(seg, ind)
+                class_name = iden["type"]
+                self._vmtranslator.push_statement(
+                    SEGMENT[iden["kind"]], iden["index"]
+                )
                 add_arg = 1
 
         call_name = class_name + "." + sub_name
 
-        exp_n = self._compile_expression_list() + add_arg
+        exp_n = (yield self._expression_list_steps()) + add_arg
         self._process_token("value", ")")
 
         # Write the VM code
@@ -650,10 +972,16 @@ class CompilationEngine():
         """Pushes the variable identiefied onto the stack"""
         advance = False
         if var_name is None:
-            var_name = self.tokens[self._cur_ind]["value"]
+            var_name = self._tokbuf.current.value
             advance = True
-        seg = SEGMENT[self._symbol_table.kind_of(var_name)]
-        var_ind = self._symbol_table.index_of(var_name)
+        seg, var_ind = self._variable_location(var_name)
         self._vmtranslator.push_statement(seg, var_ind)
         if advance:
             self._process_token()
+
+    def _variable_location(self, var_name):
+        """Returns the segment and index of the named variable"""
+        iden = self._symbol_table.entry_of(var_name)
+        if iden is None:
+            raise KeyError("undefined variable: " + var_name)
+        return SEGMENT[iden["kind"]], iden["index"]
@@ -1,9 +1,16 @@
 """Top-level compiler control"""
 
 import os
+import mmap
+import contextlib
+from collections import Counter
 from .utilities import COLOR, build_terminal
-from .tokeniser import Tokeniser
+from .tokeniser import Tokeniser, lex_bytes
 from .compilationengine import CompilationEngine
+from .callgraph import Reachability
+from .vmir import print_vm
+from .asmtranslator import lower, print_asm, rom_size
+from .vmemulator import VMEmulator
 
 class JackCompiler:
     """Top-level control class.
@@ -12,13 +19,32 @@ class JackCompiler:
         jackpath = path to a single .jack file
         maxdepth = maximum recursion depth for looking for .jack files
         verbosity = verbosity of output.
+        stream = compile with bounded memory: the source is memory-mapped,
+            tokens are generated lazily and output goes straight to file.
+        optlevel = VM optimisation level (0 to 3). Level 3 inlines small
+            subroutines across the files given to run_program().
+        inline_size = largest subroutine, in VM instructions, to inline.
+        pool_strings = build each string literal once per class into a
+            hidden static instead of on every evaluation.
+        entry_points = functions called from outside the program besides
+            Sys.init and Main.main, kept by run_program().
+    With outasm, Hack assembly is written next to the VM code: one .asm
+    per class from run(), or one for the whole program, set up to start
+    at Sys.init, from run_program().
+    With profile, run_program() also runs the program in the VM emulator,
+    with no keyboard input, and writes what it executed to profile.json.
     """
     def __init__(self):
         self._jackpath = None
         self._contents = None
         self._outdic = None
         self._verbosity = "minimal"
-        self._output = {"tokens": False, "tree": False, "vm": True}
+        self._stream = False
+        self._entry_points = []
+        self._profile = False
+        self._output = {
+            "tokens": False, "tree": False, "vm": True, "asm": False
+        }
         self._tokeniser = Tokeniser()
         self._compilationengine = CompilationEngine()
 
@@ -32,12 +58,12 @@ class JackCompiler:
         if not os.path.isfile(path):
             raise FileNotFoundError(".jack file not found")
         self._jackpath = path
-        with open(path) as jackfile:
-            self._contents = jackfile.read()
+        self._contents = None
         self._outdic = {
             "tokens": path.replace(".jack", "") + "T.xml",
             "tree": path.replace(".jack", ".xml"),
-            "vm": path.replace(".jack", ".vm")
+            "vm": path.replace(".jack", ".vm"),
+            "asm": path.replace(".jack", ".asm")
         }
 
     @property
@@ -51,6 +77,80 @@ class JackCompiler:
             raise ValueError("verbosity should be 'full' or 'minimal'")
         self._verbosity = opt
 
+    @property
+    def optlevel(self):
+        """VM optimisation level"""
+        return self._compilationengine.pass_manager.optlevel
+
+    @optlevel.setter
+    def optlevel(self, level):
+        self._compilationengine.pass_manager.optlevel = level
+
+    @property
+    def inline_size(self):
+        """Largest function, in VM instructions, inlined at -O3"""
+        return self._compilationengine.pass_manager.inline_size
+
+    @inline_size.setter
+    def inline_size(self, size):
+        self._compilationengine.pass_manager.inline_size = size
+
+    @property
+    def pool_strings(self):
+        """Whether string literals are pooled in hidden statics"""
+        return "string-pool" in self._compilationengine.pass_manager.options
+
+    @pool_strings.setter
+    def pool_strings(self, pool):
+        if not isinstance(pool, bool):
+            raise ValueError("pool_strings option should be boolean")
+        options = self._compilationengine.pass_manager.options
+        if pool:
+            options.add("string-pool")
+        else:
+            options.discard("string-pool")
+
+    def get_pass_report(self):
+        """Returns the statistics of the optimisation passes run so far,
+        a dictionary of Counters keyed by pass name
+        """
+        return self._compilationengine.pass_manager.report
+
+    @property
+    def entry_points(self):
+        """Names of extra functions run_program() starts from"""
+        return self._entry_points
+
+    @entry_points.setter
+    def entry_points(self, names):
+        if not all(isinstance(name, str) and "." in name for name in names):
+            raise ValueError(
+                "entry points should be function names like Class.name"
+            )
+        self._entry_points = list(names)
+
+    @property
+    def stream(self):
+        """Whether to compile in bounded-memory streaming mode"""
+        return self._stream
+
+    @stream.setter
+    def stream(self, stream):
+        if not isinstance(stream, bool):
+            raise ValueError("stream option should be boolean")
+        self._stream = stream
+
+    @property
+    def profile(self):
+        """Whether run_program() profiles the program in the VM emulator"""
+        return self._profile
+
+    @profile.setter
+    def profile(self, profile):
+        if not isinstance(profile, bool):
+            raise ValueError("profile option should be boolean")
+        self._profile = profile
+
     def _out_set(self, seg, towhat):
         """Generic to set output"""
         if not isinstance(towhat, bool):
@@ -84,19 +184,120 @@ class JackCompiler:
     def outvm(self, outvm):
         self._out_set("vm", outvm)
 
+    @property
+    def outasm(self):
+        """Whether to output Hack assembly"""
+        return self._output["asm"]
+
+    @outasm.setter
+    def outasm(self, outasm):
+        self._out_set("asm", outasm)
+
     def get_outdic(self):
         """Returns the output file dictionary"""
         return self._outdic
 
     def run(self):
         """Compiles one .jack file"""
+        if not self._check_file():
+            return
+        if self.stream and self.outasm:
+            raise ValueError("assembly is lowered from whole functions, "
+                             "so it cannot be streamed")
+        if self.stream:
+            self._run_stream()
+            print(COLOR["yellow"] + "Finished")
+            return
+        self._compile()
+        if self.outvm:
+            self._write_string("vm", self._compilationengine.get_vmcode())
+            self._print_conditional(
+                "Wrote vm to " + self._outdic["vm"], "yellow"
+            )
+        if self.outasm:
+            self._write_asm(self._compilationengine.get_ir(),
+                            self._outdic["asm"], bootstrap=False)
+        print(COLOR["yellow"] + "Finished")
+
+    def run_program(self, paths, prune=True):
+        """Compiles .jack files as one program, in memory even if
+        self.stream is set, and runs the program passes of the
+        optimisation level over all their functions. With prune,
+        functions that cannot be reached from Sys.init, Main.main or
+        self.entry_points are left out and a reachability report is
+        written to the files' common directory. The assembly for the
+        program goes to that directory too, named after it, and so does
+        profile.json with self.profile.
+        Returns the Reachability of the program.
+        """
+        program = []
+        for path in paths:
+            self.jackpath = path
+            if not self._check_file():
+                continue
+            self._compile()
+            program.append(
+                (self._outdic, list(self._compilationengine.get_ir()))
+            )
+        functions = self._compilationengine.pass_manager.run_program(
+            [func for _, file_functions in program for func in file_functions]
+        )
+        reachability = Reachability(functions, self.entry_points)
+        if self.outvm:
+            start = 0
+            for outdic, file_functions in program:
+                end = start + len(file_functions)
+                kept = functions[start:end]
+                if prune:
+                    kept = reachability.prune(kept)
+                start = end
+                with open(outdic["vm"], "w+") as vmfile:
+                    vmfile.write(print_vm(
+                        [instr for func in kept for instr in func]
+                    ))
+        program_dir = os.path.commonpath(
+            [os.path.dirname(os.path.abspath(outdic["vm"]))
+             for outdic, _ in program]
+        ) if program else None
+        if self.outasm and program:
+            self._write_asm(
+                reachability.prune(functions) if prune else functions,
+                os.path.join(program_dir,
+                             os.path.basename(program_dir) + ".asm"),
+                bootstrap=True
+            )
+        if self.profile and program:
+            self._write_profile(
+                reachability.prune(functions) if prune else functions,
+                os.path.join(program_dir, "profile.json")
+            )
+        if prune and program:
+            report_path = os.path.join(program_dir, "reachability.txt")
+            with open(report_path, "w+") as reportfile:
+                reportfile.write(reachability.get_report())
+            self._print_conditional(
+                "Wrote reachability report to " + report_path, "yellow"
+            )
+        print(COLOR["yellow"] + "Finished")
+        return reachability
+
+    def _check_file(self):
+        """Returns whether there is a file to compile"""
         if self.jackpath is None:
             print(COLOR["red"] + "Nothing to compile")
-            return
-        if self._contents == "":
+            return False
+        if os.path.getsize(self.jackpath) == 0:
             print(COLOR["red"] + "empty file")
-            return
+            return False
         print(COLOR["yellow"] + "Compiling %s" % self.jackpath)
+        return True
+
+    def _compile(self):
+        """Compiles the current file in memory, writing the tokens and
+        the tree if asked to
+        """
+        with open(self.jackpath) as jackfile:
+            self._contents = jackfile.read()
         self._tokeniser.contents = self._contents
         toks = self._tokeniser.get_tokens()
         self._print_conditional("Tokenised successfully", "green")
@@ -105,8 +306,9 @@ class JackCompiler:
             self._print_conditional(
                 "Wrote tokens to " + self._outdic["tokens"], "yellow"
             )
+        self._compilationengine.build_tree = self.outtree
         self._compilationengine.tokens = toks
-        vmcode = self._compilationengine.get_vmcode()
+        self._compilationengine.get_ir()
         self._print_conditional("Compiled to VM successfully", "green")
         if self.outtree:
             xmltree = self._compilationengine.get_xml_tree()
@@ -114,12 +316,40 @@ class JackCompiler:
             self._print_conditional(
                 "Wrote tree to " + self._outdic["tree"], "yellow"
             )
-        if self.outvm:
-            self._write_string("vm", vmcode)
-            self._print_conditional(
-                "Wrote vm to " + self._outdic["vm"], "yellow"
+
+    def _run_stream(self):
+        """Compiles the current file without holding it in memory"""
+        with contextlib.ExitStack() as stack:
+            jackfile = stack.enter_context(open(self.jackpath, "rb"))
+            source = stack.enter_context(
+                mmap.mmap(jackfile.fileno(), 0, access=mmap.ACCESS_READ)
             )
-        print(COLOR["yellow"] + "Finished")
+            toks = lex_bytes(source)
+            if self.outtokens:
+                tokfile = stack.enter_context(
+                    open(self._outdic["tokens"], "w+")
+                )
+                toks = self._tee_tokens(toks, tokfile)
+            vmfile = stack.enter_context(
+                open(self._outdic["vm"] if self.outvm else os.devnull, "w+")
+            )
+            treefile = None
+            if self.outtree:
+                treefile = stack.enter_context(
+                    open(self._outdic["tree"], "w+")
+                )
+            self._compilationengine.build_tree = self.outtree
+            self._compilationengine.stream(toks, vmfile, treefile)
+        self._print_conditional("Compiled successfully", "green")
+
+    @staticmethod
+    def _tee_tokens(toks, tokfile):
+        """Writes the tokens to tokfile as they pass through"""
+        tokfile.write("<tokens>\n")
+        for tok in toks:
+            tokfile.write(build_terminal(tok))
+            yield tok
+        tokfile.write("</tokens>\n")
 
     def _write_tokens(self, toks):
         """Writes the tokens"""
@@ -134,6 +364,35 @@ class JackCompiler:
         with open(self._outdic[seg], "w+") as vmfile:
             vmfile.write(string)
 
+    def _write_asm(self, functions, path, bootstrap):
+        """Writes the Hack assembly for functions, adding its size and
+        that of the textbook translation to the "asm" pass report
+        """
+        lines = lower(functions, bootstrap)
+        report = self.get_pass_report().setdefault("asm", Counter())
+        report["ROM"] += rom_size(lines)
+        report["naive ROM"] += rom_size(lower(functions, bootstrap,
+                                              naive=True))
+        with open(path, "w+") as asmfile:
+            asmfile.write(print_asm(lines))
+        self._print_conditional(
+            "Wrote asm to {} ({} instructions)".format(path, rom_size(lines)),
+            "yellow"
+        )
+
+    def _write_profile(self, functions, path):
+        """Runs functions in the VM emulator and writes its report"""
+        emulator = VMEmulator(functions)
+        emulator.run()
+        with open(path, "w+") as profilefile:
+            profilefile.write(emulator.get_json())
+        self._print_conditional(
+            "Wrote profile to {} ({} instructions)".format(
+                path, emulator.get_report()["instructions"]
+            ),
+            "yellow"
+        )
+
     def _print_conditional(self, string, col):
         """Prints messages dependent on verbosity"""
         if self.verbosity == "minimal":
@@ -0,0 +1,133 @@
+"""Common subexpression elimination within basic blocks.
+
+A basic block ends at a label, a jump or a return. An expression made of
+pushes and pure operators that a block computes again, with its operands
+unchanged, is kept in a new local: the first computation is followed by
+a store and a reload, and the others become the reload.
+
+What changes operands:
+- a pop to a local or argument changes only that variable
+- a pop to static, this or that may change any static, field or array
+  entry, and so may any call that is not pure (see licm)
+- a pop to pointer 0 or 1 changes what this or that read
+Reads of temp and pointer are never shared.
+"""
+
+from . import vmir
+from .licm import is_pure_call
+from .strength import CALL_COST
+
+BLOCK_ENDS = frozenset(["label", "goto", "if-goto", "return", "function"])
+
+SHARED_SEGMENTS = frozenset([
+    "constant", "local", "argument", "static", "this", "that"
+])
+
+MEMORY = frozenset(["static", "this", "that"])
+
+# Longest expression looked at, which keeps deep expressions cheap
+MAX_LENGTH = 32
+
+def changed_by(instr, code, ind):
+    """Returns (segments, variables) that instr, found at code[ind], may
+    change: whole segments and (segment, index) pairs
+    """
+    if instr.op == "pop":
+        if instr.arg in ("local", "argument"):
+            return frozenset(), {(instr.arg, instr.num)}
+        if instr.arg in MEMORY:
+            return MEMORY, set()
+        if instr.arg == "pointer":
+            return frozenset(["this" if instr.num == 0 else "that"]), set()
+    elif instr.op == "call" and not is_pure_call(instr, code, ind):
+        return MEMORY, set()
+    return frozenset(), set()
+
+def cost(expression):
+    """Rough number of VM instructions computing expression runs"""
+    return sum(
+        CALL_COST.get(instr.arg, 1) if instr.op == "call" else 1
+        for instr in expression
+    )
+
+def repeated_expressions(instrs):
+    """Returns a list of (start, end) of the places computing the same
+    value, for every expression computed more than once in a block
+    """
+    groups = []
+    current = {}
+    stack = []
+    for i, instr in enumerate(instrs):
+        if instr.op in BLOCK_ENDS:
+            groups.extend(places for _, places in current.values())
+            current = {}
+            stack = []
+            continue
+        segments, variables = changed_by(instr, instrs, i)
+        if segments or variables:
+            for expression, (reads, places) in list(current.items()):
+                if any(read[0] in segments or read in variables
+                       for read in reads):
+                    groups.append(places)
+                    del current[expression]
+        if instr.op == "push":
+            stack.append((i, instr.arg in SHARED_SEGMENTS))
+            continue
+        if instr.op in vmir.UNARY and stack:
+            pass
+        elif (instr.op in vmir.BINARY or is_pure_call(instr, instrs, i)) \
+                and len(stack) >= 2:
+            second = stack.pop()
+            stack[-1] = (stack[-1][0], stack[-1][1] and second[1])
+        else:
+            # Anything else may use or change the stack in other ways
+            stack = []
+            continue
+        start, shared = stack[-1]
+        if shared and i - start < MAX_LENGTH:
+            expression = tuple(instrs[start:i + 1])
+            if expression not in current:
+                current[expression] = ({
+                    (other.arg, other.num) for other in expression
+                    if other.op == "push" and other.arg != "constant"
+                }, [])
+            current[expression][1].append((start, i))
+    groups.extend(places for _, places in current.values())
+    return [places for places in groups if len(places) > 1]
+
+def share(instrs, places, slot):
+    """Returns instrs with the expression at places kept in local slot"""
+    out = [vmir.function(instrs[0].arg, slot + 1)]
+    first = places[0][1] + 1
+    out.extend(instrs[1:first])
+    out.extend([vmir.pop("local", slot), vmir.push("local", slot)])
+    done = first
+    for start, end in places[1:]:
+        out.extend(instrs[done:start])
+        out.append(vmir.push("local", slot))
+        done = end + 1
+    out.extend(instrs[done:])
+    return out
+
+def eliminate_common_subexpressions(instrs, report):
+    """Shares repeated expressions in the blocks of one function, most
+    expensive first. report counts, per function, the VM instructions
+    saved on one run through the blocks, with calls to Math routines
+    counted as strength.CALL_COST.
+    """
+    while True:
+        best = None
+        best_saving = 0
+        for places in repeated_expressions(instrs):
+            start, end = places[0]
+            # Each reuse saves the expression but the reload; the first
+            # computation gains a store and a reload
+            saving = (len(places) - 1) * \
+                (cost(instrs[start:end + 1]) - 1) - 2
+            if saving > best_saving:
+                best = places
+                best_saving = saving
+        if best is None:
+            return instrs
+        instrs = share(instrs, best, instrs[0].num)
+        report[instrs[0].arg] += best_saving
@@ -0,0 +1,18 @@
+"""Output buffers for the translators"""
+
+class Emitter:
+    """Append-only text buffer.
+
+    Anything with a write(text) method (e.g. an open file) can stand in
+    for an Emitter wherever output is only written.
+    """
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, text):
+        """Appends text"""
+        self._chunks.append(text)
+
+    def getvalue(self):
+        """Returns everything written so far"""
+        return "".join(self._chunks)
@@ -0,0 +1,109 @@
+"""Constant folding of VM code.
+
+The expression compiler emits operands left to right followed by their
+operator, so a constant subexpression shows up as constant pushes
+directly followed by an operator. fold_constants() evaluates those with
+the 16 bit two's complement arithmetic of the Hack platform and pushes
+the result instead.
+"""
+
+from . import vmir
+
+# Largest value "push constant" accepts
+MAX_CONSTANT = 32767
+
+def wrap(value):
+    """Wraps an integer to a signed 16 bit value"""
+    value &= 0xFFFF
+    return value - 0x10000 if value & 0x8000 else value
+
+def _divide(first, second):
+    """Math.divide, which truncates towards zero"""
+    if second == 0 or -32768 in (first, second):
+        return None
+    quotient = abs(first) // abs(second)
+    return quotient if (first < 0) == (second < 0) else -quotient
+
+UNARY = {
+    "neg": lambda value: wrap(-value),
+    "not": lambda value: wrap(~value)
+}
+
+BINARY = {
+    "add": lambda first, second: wrap(first + second),
+    "sub": lambda first, second: wrap(first - second),
+    "and": lambda first, second: first & second,
+    "or": lambda first, second: first | second,
+    "eq": lambda first, second: -1 if first == second else 0,
+    "gt": lambda first, second: -1 if first > second else 0,
+    "lt": lambda first, second: -1 if first < second else 0,
+    "Math.multiply": lambda first, second: wrap(first * second),
+    "Math.divide": _divide
+}
+
+def push_constant(value):
+    """Returns the instructions that push a signed 16 bit value"""
+    if value >= 0:
+        return [vmir.push("constant", value)]
+    if value in (-1, -MAX_CONSTANT - 1):
+        # Same as "true" for -1; -32768 has no positive counterpart
+        return [vmir.push("constant", -value - 1), vmir.arith("not")]
+    return [vmir.push("constant", -value), vmir.arith("neg")]
+
+def constant_at(instrs, end):
+    """Returns (value, length) of the constant pushed by the instructions
+    just before end, or None if they do not push a constant.
+    """
+    if end >= 1 and instrs[end - 1].op == "push" and \
+            instrs[end - 1].arg == "constant":
+        return instrs[end - 1].num, 1
+    if end >= 2 and instrs[end - 1].op in UNARY and \
+            instrs[end - 2].op == "push" and instrs[end - 2].arg == "constant":
+        return UNARY[instrs[end - 1].op](instrs[end - 2].num), 2
+    return None
+
+def _operator(instr):
+    """Returns the key of instr in UNARY/BINARY or None"""
+    if instr.op == "call":
+        if instr.num == 2 and instr.arg in BINARY:
+            return instr.arg
+        return None
+    if instr.op in UNARY or instr.op in BINARY:
+        return instr.op
+    return None
+
+def fold_constants(instrs, report):
+    """Folds constant expressions in one function.
+    report counts the instructions removed for each operator.
+    """
+    out = []
+    for instr in instrs:
+        oper = _operator(instr)
+        if oper is None:
+            out.append(instr)
+            continue
+        second = constant_at(out, len(out))
+        if oper in UNARY:
+            if second is None:
+                out.append(instr)
+                continue
+            value = UNARY[oper](second[0])
+            used = second[1]
+        else:
+            first = None
+            if second is not None:
+                first = constant_at(out, len(out) - second[1])
+            if first is None:
+                out.append(instr)
+                continue
+            value = BINARY[oper](first[0], second[0])
+            if value is None:
+                out.append(instr)
+                continue
+            used = first[1] + second[1]
+        new = push_constant(value)
+        del out[len(out) - used:]
+        out.extend(new)
+        if used + 1 > len(new):
+            report[oper] += used + 1 - len(new)
+    return out
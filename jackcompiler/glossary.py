@@ -27,7 +27,19 @@ SYMBOLS = [
     "~"
 ]
 
+# Token type names, indexed by the small integer codes stored on tokens
+TOKEN_TYPES = [
+    "keyword", "symbol", "integerConstant", "stringConstant", "identifier"
+]
+KEYWORD, SYMBOL, INT_CONST, STRING_CONST, IDENTIFIER = range(len(TOKEN_TYPES))
+
 SYMBOL_ALIASES = {"<": "&lt;", "&": "&amp;", ">": "&gt;", '"': "&quot;"}
+
+COMMENT_BREAKS = [["//", "\n"], ["/*", "*/"]]
+
+# Constant-time membership lookups for the lexer
+KEYWORD_SET = frozenset(KEYWORDS)
+SYMBOL_SET = frozenset(SYMBOLS)
 KEYWORD_CONSTANTS = {
     "true" : "push constant 0\nnot\n",
     "false" : "push constant 0\n",
@@ -44,21 +56,23 @@ SEGMENT = {
     "var": "local", "arg": "argument", "static": "static", "field": "this"
 }
 
+# FIRST sets for the parser. A term starts either with a token whose
+# type code is in TERM_FIRST or with one whose value is.
+TERM_FIRST = frozenset(
+    [INT_CONST, STRING_CONST, IDENTIFIER, "("] +
+    list(UNARY_OP) + list(KEYWORD_CONSTANTS)
+)
+OP_FIRST = frozenset(OPER)
+CLASS_VAR_FIRST = frozenset(["static", "field"])
+SUBROUTINE_FIRST = frozenset(["constructor", "function", "method"])
+# After an identifier these make a term an array entry or a call
+TERM_FOLLOW_NESTED = frozenset(["[", "(", "."])
+TYPE_TOKEN_TYPES = frozenset(["keyword", "identifier"])
+
 def is_op(tok):
     """Determines if the token is a an operator"""
-    if tok["value"] in OPER.keys():
-        return True
-    return False
+    return tok.value in OP_FIRST
 
 def is_term(tok):
     """Determines if the token represents a term"""
-    if tok["value"] in KEYWORD_CONSTANTS.keys():
-        return True
-    some_term_types = ["integerConstant", "stringConstant", "identifier"]
-    if tok["type"] in some_term_types:
-        return True
-    if tok["value"] == "(":
-        return True
-    if tok["value"] in UNARY_OP.keys():
-        return True
-    return False
+    return tok.code in TERM_FIRST or tok.value in TERM_FIRST
@@ -0,0 +1,147 @@
+"""Assembler and cycle-counting simulator for the Hack computer.
+
+Used to check and measure the code asmtranslator produces. The
+simulator runs until the program counter reaches a halt address, one
+cycle per instruction as on the real CPU.
+"""
+
+ADDRESS_MASK = 0x7FFF
+RAM_SIZE = ADDRESS_MASK + 1
+
+PREDEFINED = dict(
+    [("R" + str(i), i) for i in range(16)] +
+    [("SP", 0), ("LCL", 1), ("ARG", 2), ("THIS", 3), ("THAT", 4),
+     ("SCREEN", 16384), ("KBD", 24576)]
+)
+
+# First RAM address given to variables
+FIRST_VARIABLE = 16
+
+# Computations by mnemonic, as functions of A (or M) and D
+COMP = {
+    "0": lambda x, d: 0,
+    "1": lambda x, d: 1,
+    "-1": lambda x, d: -1,
+    "D": lambda x, d: d,
+    "X": lambda x, d: x,
+    "!D": lambda x, d: ~d,
+    "!X": lambda x, d: ~x,
+    "-D": lambda x, d: -d,
+    "-X": lambda x, d: -x,
+    "D+1": lambda x, d: d + 1,
+    "X+1": lambda x, d: x + 1,
+    "D-1": lambda x, d: d - 1,
+    "X-1": lambda x, d: x - 1,
+    "D+X": lambda x, d: d + x,
+    "D-X": lambda x, d: d - x,
+    "X-D": lambda x, d: x - d,
+    "D&X": lambda x, d: d & x,
+    "D|X": lambda x, d: d | x
+}
+
+JUMP = {
+    "": lambda value: False,
+    "JGT": lambda value: value > 0,
+    "JEQ": lambda value: value == 0,
+    "JGE": lambda value: value >= 0,
+    "JLT": lambda value: value < 0,
+    "JNE": lambda value: value != 0,
+    "JLE": lambda value: value <= 0,
+    "JMP": lambda value: True
+}
+
+def wrap(value):
+    """Returns value as a signed 16 bit number"""
+    return (value + 0x8000 & 0xFFFF) - 0x8000
+
+def decode(instr):
+    """Returns a C instruction as (comp function, reads M, dest A,
+    dest D, dest M, jump function)
+    """
+    dest, _, rest = instr.rpartition("=")
+    comp, _, jump = rest.partition(";")
+    uses_m = "M" in comp
+    key = comp.replace("M", "X").replace("A", "X")
+    if key not in COMP:
+        # Commutative forms like M+D
+        key = key[::-1]
+    if key not in COMP or jump not in JUMP or \
+            any(reg not in "AMD" for reg in dest):
+        raise ValueError("not a Hack instruction: " + instr)
+    return (COMP[key], uses_m, "A" in dest, "D" in dest, "M" in dest,
+            JUMP[jump])
+
+def assemble(lines):
+    """Returns (program, symbols) for assembly lines. Instructions in
+    the program are ints for A instructions and decode() tuples for C
+    instructions.
+    """
+    symbols = dict(PREDEFINED)
+    address = 0
+    for line in lines:
+        if line.startswith("("):
+            symbols[line[1:-1]] = address
+        elif line:
+            address += 1
+    program = []
+    variable = FIRST_VARIABLE
+    for line in lines:
+        if not line or line.startswith("("):
+            continue
+        if line.startswith("@"):
+            name = line[1:]
+            if name.isdigit():
+                program.append(int(name))
+                continue
+            if name not in symbols:
+                symbols[name] = variable
+                variable += 1
+            program.append(symbols[name])
+        else:
+            program.append(decode(line))
+    return program, symbols
+
+class HackCPU:
+    """Hack CPU running one program.
+
+    Arguments:
+        program -- instructions as returned by assemble()
+    """
+    def __init__(self, program):
+        self.program = program
+        self.ram = [0] * RAM_SIZE
+        self.a = 0
+        self.d = 0
+        self.pc = 0
+        self.cycles = 0
+
+    def run(self, halt, max_cycles=10**7):
+        """Runs until the program counter is halt. Returns the cycles
+        taken so far.
+        """
+        program = self.program
+        ram = self.ram
+        a, d, pc, cycles = self.a, self.d, self.pc, self.cycles
+        while pc != halt:
+            if cycles >= max_cycles:
+                raise RuntimeError("no halt after {} cycles".format(cycles))
+            cycles += 1
+            instr = program[pc]
+            if isinstance(instr, int):
+                a = instr
+                pc += 1
+                continue
+            comp, uses_m, to_a, to_d, to_m, jump = instr
+            value = wrap(comp(ram[a & ADDRESS_MASK] if uses_m else a, d))
+            if to_m:
+                ram[a & ADDRESS_MASK] = value
+            if jump(value):
+                pc = a
+            else:
+                pc += 1
+            if to_a:
+                a = value
+            if to_d:
+                d = value
+        self.a, self.d, self.pc, self.cycles = a, d, pc, cycles
+        return cycles
@@ -0,0 +1,177 @@
+"""Inlining of small subroutines across a whole program.
+
+A call to a small function that makes no calls itself is replaced by
+the function's body. Its arguments and locals become new locals of the
+caller, a method's "this" is reached through "that" instead, and its
+labels get a prefix that keeps them unique. Since inlined functions call
+nothing, recursion is never inlined; callers that lose all their calls
+can be inlined in turn on a later round.
+"""
+
+import itertools
+from . import vmir
+from .callgraph import class_of
+
+# Largest callee, in instructions after its "function" line
+MAX_CALLEE_SIZE = 16
+
+# A caller may grow to this many times its size, plus one callee
+MAX_GROWTH = 2
+
+# Rounds of inlining, each one inlining the leaves of the one before
+MAX_ROUNDS = 3
+
+METHOD_PROLOGUE = [vmir.push("argument", 0), vmir.pop("pointer", 0)]
+SET_THAT = vmir.pop("pointer", 1)
+
+class Callee:
+    """What the inliner needs to know about a function it may inline"""
+    def __init__(self, func):
+        self.name = func[0].arg
+        self.n_locals = func[0].num
+        self.is_method = func[1:3] == METHOD_PROLOGUE
+        self.body = func[3:] if self.is_method else func[1:]
+        self.uses_static = any(instr.arg == "static" for instr in func)
+        self.sets_that = SET_THAT in self.body
+
+def inlinable(func, max_size):
+    """Returns a Callee for func if it can be inlined, else None"""
+    if len(func) - 1 > max_size or func[-1] != vmir.RETURN:
+        return None
+    callee = Callee(func)
+    for instr in callee.body:
+        if instr.op in ("call", "function"):
+            return None
+        if instr.arg == "pointer" and (instr.num == 0 or callee.is_method):
+            # Functions have no this, and a method's this becomes that,
+            # so a method may only read its this
+            if instr != vmir.push("pointer", 0) or not callee.is_method:
+                return None
+        if instr.arg == "this" and not callee.is_method:
+            return None
+        if instr.arg == "that" and callee.is_method:
+            return None
+    return callee
+
+def that_needed_after(code, start):
+    """Whether some path from code[start] may read pointer 1 before
+    setting it. Calls leave pointer 1 as it was.
+    """
+    labels = {
+        instr.arg: i for i, instr in enumerate(code) if instr.op == "label"
+    }
+    seen = set()
+    todo = [start]
+    while todo:
+        i = todo.pop()
+        while i < len(code) and i not in seen:
+            seen.add(i)
+            instr = code[i]
+            if instr == SET_THAT or instr.op == "return":
+                break
+            if instr.arg == "that" or \
+                    (instr.arg == "pointer" and instr.num == 1):
+                return True
+            if instr.op == "goto":
+                i = labels[instr.arg]
+                continue
+            if instr.op == "if-goto":
+                todo.append(labels[instr.arg])
+            i += 1
+    return False
+
+def inline_body(callee, argc, first_slot, prefix, save_that):
+    """Returns the instructions replacing a call to callee with argc
+    arguments on the stack, using locals from first_slot on
+    """
+    args = list(range(first_slot, first_slot + argc))
+    local_slots = list(range(first_slot + argc,
+                             first_slot + argc + callee.n_locals))
+    saved = first_slot + argc + callee.n_locals
+    seq = []
+    if save_that:
+        seq.extend([vmir.push("pointer", 1), vmir.pop("local", saved)])
+    seq.extend(vmir.pop("local", slot) for slot in reversed(args))
+    for slot in local_slots:
+        # The VM zeroes locals on every call
+        seq.extend([vmir.push("constant", 0), vmir.pop("local", slot)])
+    if callee.is_method:
+        seq.extend([vmir.push("local", args[0]), SET_THAT])
+    end = prefix + "END"
+    returns = sum(instr.op == "return" for instr in callee.body)
+    for i, instr in enumerate(callee.body):
+        if instr.op == "return":
+            if i < len(callee.body) - 1:
+                seq.append(vmir.goto(end))
+            continue
+        if instr.op in ("label", "goto", "if-goto"):
+            instr = vmir.Instr(instr.op, prefix + instr.arg, None)
+        elif instr.arg == "argument":
+            instr = vmir.Instr(instr.op, "local", args[instr.num])
+        elif instr.arg == "local":
+            instr = vmir.Instr(instr.op, "local", local_slots[instr.num])
+        elif instr.arg == "this":
+            instr = vmir.Instr(instr.op, "that", instr.num)
+        elif instr == vmir.push("pointer", 0):
+            instr = vmir.push("local", args[0])
+        seq.append(instr)
+    if returns > 1:
+        seq.append(vmir.label(end))
+    if save_that:
+        seq.extend([vmir.push("local", saved), SET_THAT])
+    return seq, argc + callee.n_locals + int(save_that)
+
+def inline_function(caller, callees, report, max_size, counter):
+    """Returns caller with the calls to callees inlined (caller itself if
+    nothing was). counter numbers the inlined bodies for their labels.
+    """
+    limit = MAX_GROWTH * len(caller) + max_size
+    n_locals = caller[0].num
+    out = [caller[0]]
+    changed = False
+    for i in range(1, len(caller)):
+        instr = caller[i]
+        callee = callees.get(instr.arg) if instr.op == "call" else None
+        if callee is None or callee.name == caller[0].arg or \
+                len(out) + len(caller) - i + len(callee.body) > limit or \
+                (callee.uses_static and
+                 class_of(callee.name) != class_of(caller[0].arg)):
+            out.append(instr)
+            continue
+        save_that = callee.sets_that or callee.is_method
+        save_that = save_that and that_needed_after(caller, i + 1)
+        prefix = "{}.{}.".format(callee.name, next(counter))
+        seq, slots = inline_body(callee, instr.num, n_locals, prefix,
+                                 save_that)
+        out.extend(seq)
+        n_locals += slots
+        report[callee.name] += 1
+        changed = True
+    if not changed:
+        return caller
+    out[0] = vmir.function(caller[0].arg, n_locals)
+    return out
+
+def inline_calls(functions, report, manager):
+    """Program pass inlining calls to functions of at most
+    manager.inline_size instructions. report counts the call sites
+    inlined for each callee.
+    """
+    max_size = manager.inline_size
+    counter = itertools.count()
+    for _ in range(MAX_ROUNDS):
+        callees = {}
+        for func in functions:
+            callee = inlinable(func, max_size)
+            if callee is not None:
+                callees[callee.name] = callee
+        if not callees:
+            break
+        new = [
+            inline_function(func, callees, report, max_size, counter)
+            for func in functions
+        ]
+        if all(old is func for old, func in zip(functions, new)):
+            break
+        functions = new
+    return functions
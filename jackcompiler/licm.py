@@ -0,0 +1,153 @@
+"""Loop-invariant code motion.
+
+A loop is a backward "goto L" together with everything from "label L"
+up to it, as generated for while statements. Pure expressions in a loop
+whose operands the loop never changes are computed once before the
+label into a new local, and the loop reads that local instead.
+
+The side-effect model is conservative. Arguments and locals change only
+through pop. Statics and fields may also change through calls and
+through "that" or "pointer" writes, so they only count as unchanged in
+loops with none of those. Array reads ("that") are never hoisted.
+Math.multiply is the only pure call; Math.divide is pure only for a
+non-zero constant divisor.
+"""
+
+from . import vmir
+
+class Operand:
+    """What the expression analysis knows about one stack entry"""
+    __slots__ = ("start", "invariant", "has_op")
+
+    def __init__(self, start, invariant, has_op=False):
+        self.start = start
+        self.invariant = invariant
+        self.has_op = has_op
+
+def find_loops(instrs):
+    """Returns (start, end) for every loop that can be given a preheader:
+    instrs[start] is its label, instrs[end] the backward goto, nothing
+    outside jumps into it, and code falls through into its label
+    """
+    labels = {
+        instr.arg: i for i, instr in enumerate(instrs) if instr.op == "label"
+    }
+    loops = []
+    for end, instr in enumerate(instrs):
+        if instr.op != "goto" or labels[instr.arg] > end:
+            continue
+        start = labels[instr.arg]
+        if instrs[start - 1].op in ("goto", "return"):
+            continue
+        entered = any(
+            other.op in vmir.JUMPS and start <= labels[other.arg] <= end
+            for i, other in enumerate(instrs) if i < start or i > end
+        )
+        if not entered:
+            loops.append((start, end))
+    return sorted(loops, key=lambda loop: loop[1] - loop[0])
+
+def changed_in(body):
+    """Returns a predicate telling whether a push reads something the
+    loop body may change
+    """
+    written = {(instr.arg, instr.num) for instr in body if instr.op == "pop"}
+    opaque = any(
+        instr.op == "call" or (instr.op == "pop" and
+                               instr.arg in ("that", "pointer"))
+        for instr in body
+    )
+    def changed(instr):
+        if instr.arg == "constant":
+            return False
+        if instr.arg in ("local", "argument"):
+            return (instr.arg, instr.num) in written
+        if instr.arg in ("static", "this"):
+            return opaque or (instr.arg, instr.num) in written
+        return True
+    return changed
+
+def invariant_expressions(body, changed):
+    """Returns the (start, end) slices of body computing invariant
+    values with at least one operator, outermost ones only
+    """
+    found = []
+    stack = []
+    for i, instr in enumerate(body):
+        if instr.op == "push":
+            stack.append(Operand(i, not changed(instr)))
+            continue
+        if instr.op in vmir.UNARY and stack:
+            operand = stack[-1]
+            stack[-1] = Operand(operand.start, operand.invariant, True)
+        elif (instr.op in vmir.BINARY or is_pure_call(instr, body, i)) and \
+                len(stack) >= 2:
+            second = stack.pop()
+            first = stack.pop()
+            stack.append(Operand(first.start,
+                                 first.invariant and second.invariant, True))
+        else:
+            # Anything else may use or change the stack in other ways
+            stack = []
+            continue
+        if stack[-1].invariant:
+            start = stack[-1].start
+            while found and found[-1][0] >= start:
+                found.pop()
+            found.append((start, i))
+    return found
+
+def is_pure_call(instr, code, ind):
+    """Whether instr, found at code[ind], is a call without side effects"""
+    if instr.op != "call" or instr.num != 2:
+        return False
+    if instr.arg == "Math.multiply":
+        return True
+    divisor = code[ind - 1]
+    return instr.arg == "Math.divide" and divisor.op == "push" and \
+        divisor.arg == "constant" and divisor.num != 0
+
+def hoist(instrs, start, end, report):
+    """Hoists the invariant expressions of one loop. Returns the new
+    instructions, or None if there was nothing to hoist.
+    """
+    body = instrs[start + 1:end]
+    found = invariant_expressions(body, changed_in(body))
+    if not found:
+        return None
+    n_locals = instrs[0].num
+    temps = {}
+    preheader = []
+    new_body = []
+    done = 0
+    for first, last in found:
+        expression = tuple(body[first:last + 1])
+        if expression not in temps:
+            temps[expression] = n_locals + len(temps)
+            preheader.extend(expression)
+            preheader.append(vmir.pop("local", temps[expression]))
+        new_body.extend(body[done:first])
+        new_body.append(vmir.push("local", temps[expression]))
+        done = last + 1
+        report[instrs[0].arg] += len(expression) - 1
+    new_body.extend(body[done:])
+    return [vmir.function(instrs[0].arg, n_locals + len(temps))] + \
+        instrs[1:start] + preheader + [instrs[start]] + new_body + \
+        instrs[end:]
+
+def hoist_invariants(instrs, report):
+    """Hoists loop-invariant expressions out of the loops of one function,
+    inner loops first. report counts, per function, the instructions
+    taken out of loop bodies.
+    Every hoist takes operators out of a loop, so this ends.
+    """
+    hoisted = True
+    while hoisted:
+        hoisted = False
+        for start, end in find_loops(instrs):
+            new = hoist(instrs, start, end, report)
+            if new is not None:
+                instrs = new
+                hoisted = True
+                break
+    return instrs
@@ -0,0 +1,106 @@
+"""Liveness of locals and dead store elimination.
+
+Liveness is worked out per instruction over a function's control flow
+(labels, goto, if-goto and return). Sets of locals are ints with bit k
+standing for local k.
+"""
+
+from . import vmir
+
+# Where unused values are dropped. temp 0 to 2 are used by the compiler
+# and the strength pass.
+DROP = vmir.pop("temp", 7)
+
+def successors(instrs):
+    """Returns the indices each instruction can continue at"""
+    labels = {
+        instr.arg: i for i, instr in enumerate(instrs) if instr.op == "label"
+    }
+    succ = []
+    for i, instr in enumerate(instrs):
+        if instr.op == "goto":
+            succ.append((labels[instr.arg],))
+        elif instr.op == "if-goto":
+            succ.append((i + 1, labels[instr.arg]))
+        elif instr.op == "return" or i + 1 == len(instrs):
+            succ.append(())
+        else:
+            succ.append((i + 1,))
+    return succ
+
+def live_locals(instrs):
+    """Returns (live_in, live_out): for each instruction, the locals that
+    may be read later, before and after it runs
+    """
+    succ = successors(instrs)
+    live_in = [0] * len(instrs)
+    live_out = [0] * len(instrs)
+    changed = True
+    while changed:
+        changed = False
+        for i in reversed(range(len(instrs))):
+            out = 0
+            for j in succ[i]:
+                out |= live_in[j]
+            instr = instrs[i]
+            inn = out
+            if instr.arg == "local":
+                if instr.op == "pop":
+                    inn &= ~(1 << instr.num)
+                else:
+                    inn |= 1 << instr.num
+            if out != live_out[i] or inn != live_in[i]:
+                live_out[i] = out
+                live_in[i] = inn
+                changed = True
+    return live_in, live_out
+
+def pure_value_start(instrs):
+    """Returns where the code computing the last value pushed by instrs
+    starts, if that code has no side effects, else None
+    """
+    needed = 1
+    for i in reversed(range(len(instrs))):
+        instr = instrs[i]
+        if instr.op == "push":
+            needed -= 1
+        elif instr.op in vmir.BINARY:
+            needed += 1
+        elif instr.op not in vmir.UNARY:
+            return None
+        if needed == 0:
+            return i
+    return None
+
+def eliminate_dead_stores(instrs, report):
+    """Removes stores to locals that are never read in one function.
+    A dead store of a value with side effects becomes a drop into temp 7.
+    A store directly followed by the last read of the same local is
+    removed with the read. report counts the stores removed, keyed by
+    "function local k".
+    """
+    name = instrs[0].arg
+    changed = True
+    while changed:
+        changed = False
+        live_out = live_locals(instrs)[1]
+        out = []
+        for i, instr in enumerate(instrs):
+            if instr.arg == "local" and not live_out[i] >> instr.num & 1:
+                if instr.op == "pop":
+                    start = pure_value_start(out)
+                    if start is None:
+                        out.append(DROP)
+                    else:
+                        del out[start:]
+                elif out and out[-1] == vmir.pop("local", instr.num):
+                    out.pop()
+                else:
+                    out.append(instr)
+                    continue
+                report[name + " local " + str(instr.num)] += 1
+                changed = True
+                continue
+            out.append(instr)
+        instrs = out
+    return instrs
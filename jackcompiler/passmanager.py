@@ -0,0 +1,143 @@
+"""Runs optimisation passes over VM IR (see vmir)"""
+
+from collections import Counter
+from . import (
+    cse, folding, inliner, licm, liveness, peephole, slots, statics,
+    strength
+)
+
+# Registered passes by name. A pass takes the instructions of one
+# function and a Counter to report statistics into, and returns the new
+# instructions.
+PASSES = {
+    "cse": cse.eliminate_common_subexpressions,
+    "dse": liveness.eliminate_dead_stores,
+    "fold": folding.fold_constants,
+    "licm": licm.hoist_invariants,
+    "peephole": peephole.optimise,
+    "slots": slots.colour_locals,
+    "strength": strength.reduce_strength
+}
+
+# Names of the passes run at each optimisation level, in order
+OPT_LEVELS = {
+    0: [],
+    1: ["fold", "peephole"],
+    2: ["fold", "strength", "cse", "licm", "dse", "slots", "peephole"],
+    3: ["fold", "strength", "cse", "licm", "dse", "slots", "peephole"]
+}
+
+# Passes over all the functions of a program, taking the list of
+# functions, a Counter and the PassManager, and returning the new list.
+# A pass returns a function it did not change as the same list.
+PROGRAM_PASSES = {
+    "inline": inliner.inline_calls,
+    "statics": statics.propagate_statics
+}
+
+# Names of the program passes run at each optimisation level, in order.
+# OPT_LEVELS passes run again over the functions they change.
+PROGRAM_LEVELS = {
+    0: [],
+    1: [],
+    2: [],
+    3: ["statics", "inline"]
+}
+
+# Code generation choices made by the compilation engine at each level.
+# Others, like "string-pool", are only used when added to
+# PassManager.options.
+CODEGEN_OPTIONS = {
+    0: frozenset(),
+    1: frozenset(["direct-branches", "array-stores"]),
+    2: frozenset(["direct-branches", "array-stores"]),
+    3: frozenset(["direct-branches", "array-stores"])
+}
+
+def register_pass(name, func, levels=()):
+    """Registers a pass and adds it to the given optimisation levels"""
+    if not callable(func):
+        raise TypeError("pass should be callable")
+    PASSES[name] = func
+    for level in levels:
+        OPT_LEVELS[level].append(name)
+
+class PassManager:
+    """Runs the passes of an optimisation level over functions.
+
+    Arguments:
+        optlevel: one of the keys of OPT_LEVELS
+        options: extra code generation options to use at any level
+        inline_size: largest function the "inline" pass inlines
+    Statistics from every pass accumulate in self.report, a dictionary
+    of Counters keyed by pass name. self.statics maps the name of every
+    class compiled to the names of its statics, in order of index.
+    """
+    def __init__(self, optlevel=0, options=(),
+                 inline_size=inliner.MAX_CALLEE_SIZE):
+        self._optlevel = None
+        self._inline_size = None
+        self.report = {}
+        self.statics = {}
+        self.optlevel = optlevel
+        self.options = set(options)
+        self.inline_size = inline_size
+
+    @property
+    def optlevel(self):
+        """Optimisation level"""
+        return self._optlevel
+
+    @optlevel.setter
+    def optlevel(self, level):
+        if level not in OPT_LEVELS:
+            raise ValueError("optlevel should be one of " + str(
+                sorted(OPT_LEVELS)
+            ))
+        self._optlevel = level
+
+    @property
+    def inline_size(self):
+        """Largest function, in instructions, that may be inlined"""
+        return self._inline_size
+
+    @inline_size.setter
+    def inline_size(self, size):
+        if not isinstance(size, int) or size < 0:
+            raise ValueError("inline_size should be a non-negative integer")
+        self._inline_size = size
+
+    def get_passes(self):
+        """Returns the names of the passes that will run"""
+        return list(OPT_LEVELS[self._optlevel])
+
+    def uses(self, option):
+        """Returns whether a code generation option is enabled"""
+        return option in self.options or \
+            option in CODEGEN_OPTIONS[self._optlevel]
+
+    def has_passes(self):
+        """Returns whether run() changes anything"""
+        return bool(OPT_LEVELS[self._optlevel])
+
+    def run(self, instrs):
+        """Runs every pass of the level over one function"""
+        for name in OPT_LEVELS[self._optlevel]:
+            instrs = PASSES[name](instrs, self.report.setdefault(
+                name, Counter()
+            ))
+        return instrs
+
+    def run_program(self, functions):
+        """Runs the program passes of the level over a list of functions
+        already run through run(), and run() again over those changed
+        """
+        new = functions
+        for name in PROGRAM_LEVELS[self._optlevel]:
+            new = PROGRAM_PASSES[name](new, self.report.setdefault(
+                name, Counter()
+            ), self)
+        return [
+            func if func is old else self.run(func)
+            for old, func in zip(functions, new)
+        ]
@@ -0,0 +1,162 @@
+"""Peephole optimisation of VM code.
+
+A rule looks at a window of consecutive instructions and either returns
+a replacement for them or None. optimise() slides the windows over a
+function until no rule applies and counts the instructions each rule
+removed. Rules are added with the @rule decorator.
+"""
+
+from . import vmir
+from .vmir import JUMPS, COMPARISONS
+
+# Reading these segments depends on state that the code between a push
+# and a later use may change (pointer 1 and temp 0 in particular)
+UNSTABLE_SEGMENTS = frozenset(["that", "pointer", "temp"])
+
+TRUE = [vmir.push("constant", 0), vmir.arith("not")]
+ARRAY_STORE = [
+    vmir.pop("temp", 0), vmir.pop("pointer", 1),
+    vmir.push("temp", 0), vmir.pop("that", 0)
+]
+
+class Rule:
+    """A named rewrite over a window of `size` instructions.
+
+    rewrite(window, targets) gets the window as a list and the set of
+    labels some jump in the function refers to, and returns the
+    replacement instructions or None.
+    """
+    def __init__(self, name, size, rewrite):
+        self.name = name
+        self.size = size
+        self.rewrite = rewrite
+
+RULES = []
+
+def rule(name, size):
+    """Decorator adding a rewrite function to RULES"""
+    def add(rewrite):
+        RULES.append(Rule(name, size, rewrite))
+        return rewrite
+    return add
+
+def jump_targets(instrs):
+    """Returns the labels that goto/if-goto instructions refer to"""
+    return {instr.arg for instr in instrs if instr.op in JUMPS}
+
+def optimise(instrs, report):
+    """Applies RULES to one function until nothing changes.
+    report counts the instructions removed by each rule.
+    """
+    changed = True
+    while changed:
+        changed = False
+        targets = jump_targets(instrs)
+        out = []
+        for instr in instrs:
+            out.append(instr)
+            # Keep rewriting the tail, so that rewrites can cascade
+            matched = True
+            while matched:
+                matched = False
+                for peep in RULES:
+                    if len(out) < peep.size:
+                        continue
+                    new = peep.rewrite(out[-peep.size:], targets)
+                    if new is None:
+                        continue
+                    del out[-peep.size:]
+                    out.extend(new)
+                    report[peep.name] += peep.size - len(new)
+                    changed = matched = True
+                    break
+        instrs = out
+    return instrs
+
+@rule("push-pop", 2)
+def _push_pop(window, targets):
+    """push X / pop X does nothing"""
+    first, second = window
+    if first.op == "push" and second.op == "pop" and \
+            first.arg == second.arg and first.num == second.num:
+        return []
+    return None
+
+@rule("double-negation", 2)
+def _double_negation(window, targets):
+    """not / not and neg / neg cancel out"""
+    first, second = window
+    if first.op == second.op and first.op in ("not", "neg"):
+        return []
+    return None
+
+@rule("constant-branch", 2)
+def _constant_branch(window, targets):
+    """A branch on 'false' never jumps"""
+    if window[0] == vmir.push("constant", 0) and window[1].op == "if-goto":
+        return []
+    return None
+
+@rule("true-branch", 3)
+def _true_branch(window, targets):
+    """A branch on 'true' always jumps"""
+    if window[:2] == TRUE and window[2].op == "if-goto":
+        return [vmir.goto(window[2].arg)]
+    return None
+
+@rule("if-flow", 5)
+def _if_flow(window, targets):
+    """comparison / not / if-goto A / goto B / label A
+    becomes comparison / if-goto B / label A.
+    Only valid when the condition is a true boolean (0 or -1).
+    """
+    cmp, negation, branch, jump, lbl = window
+    if cmp.op in COMPARISONS and negation.op == "not" and \
+            branch.op == "if-goto" and jump.op == "goto" and \
+            lbl == vmir.label(branch.arg):
+        return [cmp, vmir.if_goto(jump.arg), lbl]
+    return None
+
+@rule("if-flow-inverted", 4)
+def _if_flow_inverted(window, targets):
+    """comparison / if-goto A / goto B / label A
+    becomes comparison / not / if-goto B / label A
+    """
+    cmp, branch, jump, lbl = window
+    if cmp.op in COMPARISONS and branch.op == "if-goto" and \
+            jump.op == "goto" and lbl == vmir.label(branch.arg):
+        return [cmp, vmir.arith("not"), vmir.if_goto(jump.arg), lbl]
+    return None
+
+@rule("array-store", 5)
+def _array_store(window, targets):
+    """push X / pop temp 0 / pop pointer 1 / push temp 0 / pop that 0
+    becomes pop pointer 1 / push X / pop that 0
+    """
+    value = window[0]
+    if value.op == "push" and value.arg not in UNSTABLE_SEGMENTS and \
+            window[1:] == ARRAY_STORE:
+        return [vmir.pop("pointer", 1), value, vmir.pop("that", 0)]
+    return None
+
+@rule("jump-to-next", 2)
+def _jump_to_next(window, targets):
+    """goto L / label L"""
+    if window[0].op == "goto" and window[1] == vmir.label(window[0].arg):
+        return [window[1]]
+    return None
+
+@rule("unreachable", 2)
+def _unreachable(window, targets):
+    """Nothing after goto or return runs until the next label"""
+    if window[0].op in ("goto", "return") and \
+            window[1].op not in ("label", "function"):
+        return [window[0]]
+    return None
+
+@rule("unused-label", 1)
+def _unused_label(window, targets):
+    """Labels no jump refers to"""
+    if window[0].op == "label" and window[0].arg not in targets:
+        return []
+    return None
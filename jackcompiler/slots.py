@@ -0,0 +1,62 @@
+"""Sharing of local slots between locals that are never live together.
+
+Two locals interfere when one is stored to while the other may still be
+read. Locals are coloured greedily in order of first use so that
+interfering ones get different slots; the "function" line then only
+needs as many locals as there are colours.
+"""
+
+from . import vmir
+from .liveness import live_locals
+
+def bits(mask):
+    """Yields the indices of the set bits of mask"""
+    ind = 0
+    while mask:
+        if mask & 1:
+            yield ind
+        mask >>= 1
+        ind += 1
+
+def interference(instrs):
+    """Returns {local: bitset of the locals it interferes with} for the
+    locals instrs use
+    """
+    live_out = live_locals(instrs)[1]
+    graph = {}
+    for i, instr in enumerate(instrs):
+        if instr.arg != "local":
+            continue
+        graph.setdefault(instr.num, 0)
+        if instr.op == "pop":
+            others = live_out[i] & ~(1 << instr.num)
+            graph[instr.num] |= others
+            for other in bits(others):
+                graph[other] = graph.get(other, 0) | 1 << instr.num
+    return graph
+
+def colour_locals(instrs, report):
+    """Renumbers the locals of one function so that locals that do not
+    interfere share a slot. report counts the slots saved per function.
+    """
+    graph = interference(instrs)
+    colours = {}
+    for local in graph:
+        taken = {colours[other] for other in bits(graph[local])
+                 if other in colours}
+        colour = 0
+        while colour in taken:
+            colour += 1
+        colours[local] = colour
+    n_slots = max(colours.values()) + 1 if colours else 0
+    if n_slots == instrs[0].num and \
+            all(local == colour for local, colour in colours.items()):
+        return instrs
+    if n_slots < instrs[0].num:
+        report[instrs[0].arg] += instrs[0].num - n_slots
+    out = [vmir.function(instrs[0].arg, n_slots)]
+    for instr in instrs[1:]:
+        if instr.arg == "local":
+            instr = vmir.Instr(instr.op, "local", colours[instr.num])
+        out.append(instr)
+    return out
@@ -0,0 +1,148 @@
+"""Constant propagation of write-once statics across a whole program.
+
+A static declared in a class, stored to exactly once in the program and
+with a constant, holds that constant once the store has run. If no read
+of it can run before that, its reads become the constant and the store
+is dropped, so that folding and strength reduction see a literal.
+
+Order is worked out from the start of the program: the instructions of
+the root function are followed, going into the functions it calls, up
+to the first label, jump or return of each. Anything after that point
+may run at any time, so the statics it reads must already be stored.
+"""
+
+from . import folding
+from .callgraph import (
+    DEFAULT_ROOTS, OS_CLASSES, build_call_graph, class_of, reachable
+)
+
+class StoreOrder:
+    """Which write-once statics are certainly stored before being read.
+
+    Arguments:
+        functions -- every function of the program
+        candidates -- (class name, index) of the statics stored once,
+            with a constant
+    After follow(root), self.stored holds the candidates stored on the
+    straight-line start of the program and self.read_first those that
+    may be read before their store.
+    """
+    def __init__(self, functions, candidates):
+        self.bodies = {func[0].arg: func for func in functions}
+        self.graph = build_call_graph(functions)
+        self.candidates = candidates
+        self.stored = set()
+        self.read_first = set()
+        self._followed = set()
+        self._swept = set()
+
+    def read(self, key):
+        """Records a read of a static"""
+        if key not in self.stored:
+            self.read_first.add(key)
+
+    def sweep(self, names):
+        """Records every read of the named functions and of all they call"""
+        for name in reachable(self.graph, list(names)):
+            if name in self._swept or name not in self.bodies:
+                continue
+            self._swept.add(name)
+            cls = class_of(name)
+            for instr in self.bodies[name]:
+                if instr.op == "push" and instr.arg == "static":
+                    self.read((cls, instr.num))
+
+    def follow(self, name, active=()):
+        """Follows a function from its start up to its first label, jump
+        or return, and sweeps the rest
+        """
+        if name in self._followed or name not in self.bodies:
+            return
+        self._followed.add(name)
+        active = active + (name,)
+        func = self.bodies[name]
+        cls = class_of(name)
+        for i in range(1, len(func)):
+            instr = func[i]
+            if instr.op in ("label", "goto", "if-goto", "return"):
+                self.sweep(
+                    other.arg for other in func[i:] if other.op == "call"
+                )
+                for other in func[i:]:
+                    if other.op == "push" and other.arg == "static":
+                        self.read((cls, other.num))
+                return
+            if instr.arg == "static":
+                key = (cls, instr.num)
+                if instr.op == "pop" and key in self.candidates:
+                    self.stored.add(key)
+                elif instr.op == "push":
+                    self.read(key)
+            elif instr.op == "call":
+                if instr.arg in active:
+                    self.sweep([instr.arg])
+                else:
+                    self.follow(instr.arg, active)
+
+def find_candidates(functions, manager):
+    """Returns {(class name, index): value} for the declared statics
+    stored exactly once in the program, with a constant
+    """
+    stores = {}
+    for func in functions:
+        cls = class_of(func[0].arg)
+        for i, instr in enumerate(func):
+            if instr.op == "pop" and instr.arg == "static":
+                stores.setdefault((cls, instr.num), []).append(
+                    folding.constant_at(func, i)
+                )
+    return {
+        key: found[0][0] for key, found in stores.items()
+        if len(found) == 1 and found[0] is not None and
+        key[1] < len(manager.statics.get(key[0], ()))
+    }
+
+def propagate_statics(functions, report, manager):
+    """Program pass replacing the reads of write-once statics with their
+    constant. report counts the reads replaced per static, by name.
+    """
+    graph = build_call_graph(functions)
+    # The first root the program defines is where it starts
+    roots = [name for name in DEFAULT_ROOTS if name in graph]
+    if not roots:
+        return functions
+    candidates = find_candidates(functions, manager)
+    order = StoreOrder(functions, candidates)
+    # The OS may call functions of its own classes that the program
+    # defines, before the root or at any time after
+    order.sweep(
+        func[0].arg for func in functions
+        if class_of(func[0].arg) in OS_CLASSES and func[0].arg != roots[0]
+    )
+    order.follow(roots[0])
+    constants = {
+        key: value for key, value in candidates.items()
+        if key in order.stored and key not in order.read_first
+    }
+    if not constants:
+        return functions
+    out = []
+    for func in functions:
+        cls = class_of(func[0].arg)
+        if not any(instr.arg == "static" and (cls, instr.num) in constants
+                   for instr in func):
+            out.append(func)
+            continue
+        new = []
+        for instr in func:
+            key = (cls, instr.num)
+            if instr.arg != "static" or key not in constants:
+                new.append(instr)
+            elif instr.op == "pop":
+                # The store is dead now
+                del new[len(new) - folding.constant_at(new, len(new))[1]:]
+            else:
+                new.extend(folding.push_constant(constants[key]))
+                report[cls + "." + manager.statics[cls][instr.num]] += 1
+        out.append(new)
+    return out
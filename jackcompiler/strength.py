@@ -0,0 +1,117 @@
+"""Strength reduction of multiplication and division by constants.
+
+Math.multiply and Math.divide are software loops in the Hack OS. When
+one operand is a constant, reduce_strength() replaces the call with a
+straight sequence of additions if that sequence is short enough. The
+pass uses temp 1 and temp 2 as scratch; the compiler only uses temp 0.
+"""
+
+from . import vmir
+from .folding import constant_at
+
+# Rough number of VM instructions the OS routines execute per call
+CALL_COST = {"Math.multiply": 400, "Math.divide": 600}
+
+# Longest sequence that may replace a call. Longer ones are not worth
+# the code size.
+MAX_SEQUENCE = 30
+
+SCRATCH = [vmir.pop("temp", 1), vmir.push("temp", 1)]
+ADD = vmir.arith("add")
+NEG = vmir.arith("neg")
+DOUBLE = [
+    vmir.pop("temp", 2), vmir.push("temp", 2), vmir.push("temp", 2), ADD
+]
+
+def multiply_sequence(const, load=None):
+    """Returns instructions that multiply the top of the stack by const.
+
+    load: instructions pushing the same value as the top of the stack,
+        None to save it in temp 1 first
+    """
+    if const == 0:
+        return [vmir.pop("temp", 1), vmir.push("constant", 0)]
+    bits = bin(abs(const))[3:]
+    seq = []
+    if bits and load is None:
+        seq.extend(SCRATCH)
+        load = [vmir.push("temp", 1)]
+    for i, bit in enumerate(bits):
+        if i == 0:
+            seq.extend(load + [ADD])
+        else:
+            seq.extend(DOUBLE)
+        if bit == "1":
+            seq.extend(load + [ADD])
+    if const < 0:
+        seq.append(NEG)
+    return seq
+
+def divide_sequence(const):
+    """Returns instructions that divide the top of the stack by const,
+    or None if there are none cheaper than Math.divide.
+    Dividing by a power of two needs a right shift, which VM code lacks.
+    """
+    if const == 1:
+        return []
+    if const == -1:
+        return [NEG]
+    return None
+
+def _reloadable(instr):
+    """Whether pushing instr again gives the same value within a sequence"""
+    return instr.op == "push" and not (
+        instr.arg == "temp" and instr.num in (1, 2)
+    )
+
+def _reduce(out, target):
+    """Returns (instructions to remove from out, sequence) or None"""
+    const = constant_at(out, len(out))
+    if const is not None:
+        value, used = const
+        operand = out[-used - 1] if len(out) > used else None
+        load = [operand] if operand is not None and _reloadable(operand) \
+            else None
+        prefix = []
+    elif target == "Math.multiply" and out and _reloadable(out[-1]):
+        # const * x with x a single push: multiplication commutes
+        const = constant_at(out, len(out) - 1)
+        if const is None:
+            return None
+        value, used = const
+        used += 1
+        load = [out[-1]]
+        prefix = load
+    else:
+        return None
+    if target == "Math.multiply":
+        seq = multiply_sequence(value, load)
+    else:
+        seq = divide_sequence(value)
+    if seq is None or len(seq) > MAX_SEQUENCE or \
+            len(seq) >= CALL_COST[target]:
+        return None
+    return used, prefix + seq
+
+def reduce_strength(instrs, report):
+    """Replaces multiplications and divisions by constants in one function.
+    report counts the calls replaced and an estimate of the instructions
+    no longer executed.
+    """
+    out = []
+    for instr in instrs:
+        if instr.op != "call" or instr.num != 2 or \
+                instr.arg not in CALL_COST:
+            out.append(instr)
+            continue
+        reduced = _reduce(out, instr.arg)
+        if reduced is None:
+            out.append(instr)
+            continue
+        used, seq = reduced
+        del out[len(out) - used:]
+        out.extend(seq)
+        report[instr.arg] += 1
+        report["instructions saved"] += \
+            CALL_COST[instr.arg] + used + 1 - len(seq)
+    return out
@@ -8,15 +8,20 @@ def identifier(iden_name, iden_type, iden_kind, iden_index):
     }
     return entry
 
+CLASS_KINDS = ("static", "field")
+SUBROUTINE_KINDS = ("arg", "var")
+
 class SymbolTable:
-    """Symbol table"""
+    """Symbol table.
+
+    Each scope is a dictionary keyed by identifier name, and running
+    counters per kind give indices and counts without scanning.
+    """
     def __init__(self):
-        self._class_scope = []
-        self._class_static_ind = 0
-        self._class_field_ind = 0
-        self._subroutine_scope = None
-        self._subroutine_arg_ind = None
-        self._subroutine_var_ind = None
+        self._class_scope = {}
+        self._subroutine_scope = {}
+        self._next_index = dict.fromkeys(CLASS_KINDS + SUBROUTINE_KINDS, 0)
+        self._count = dict.fromkeys(CLASS_KINDS + SUBROUTINE_KINDS, 0)
         self._subroutine_type = None
 
     @property
@@ -29,58 +34,59 @@ class SymbolTable:
         if not isinstance(newtype, str):
             raise TypeError("newtype should be a string")
         self._subroutine_type = newtype
-        self._subroutine_scope = []
-        self._subroutine_arg_ind = 0
-        self._subroutine_var_ind = 0
+        self._subroutine_scope = {}
+        for kind in SUBROUTINE_KINDS:
+            self._next_index[kind] = 0
+            self._count[kind] = 0
         if newtype == "method":
-            self._subroutine_arg_ind += 1
+            self._next_index["arg"] += 1
 
     def define(self, iden_name, iden_type, iden_kind):
         """Defines a new identifier of a given name, type and kind.
         Assigns it a running index.
         """
-        if iden_kind == "static":
-            iden = identifier(
-                iden_name, iden_type, iden_kind, self._class_static_ind
-            )
-            self._class_scope.append(iden)
-            self._class_static_ind += 1
-        elif iden_kind == "field":
-            iden = identifier(
-                iden_name, iden_type, iden_kind, self._class_field_ind
-            )
-            self._class_scope.append(iden)
-            self._class_field_ind += 1
-        elif iden_kind == "arg":
-            iden = identifier(
-                iden_name, iden_type, iden_kind, self._subroutine_arg_ind
-            )
-            self._subroutine_scope.append(iden)
-            self._subroutine_arg_ind += 1
-        elif iden_kind == "var":
-            iden = identifier(
-                iden_name, iden_type, iden_kind, self._subroutine_var_ind
-            )
-            self._subroutine_scope.append(iden)
-            self._subroutine_var_ind += 1
+        if iden_kind in CLASS_KINDS:
+            scope = self._class_scope
+        elif iden_kind in SUBROUTINE_KINDS:
+            scope = self._subroutine_scope
         else:
-            raise Exception("unexpected identifier kind: " + iden.kind)
+            raise Exception("unexpected identifier kind: " + iden_kind)
+        scope[iden_name] = identifier(
+            iden_name, iden_type, iden_kind, self._next_index[iden_kind]
+        )
+        self._next_index[iden_kind] += 1
+        self._count[iden_kind] += 1
 
     def var_count(self, iden_kind):
         """Returns the number of variables of the given kind
         already defined in the current scope.
         """
-        if iden_kind in ["static", "field"]:
-            dic = self._class_scope
-        elif iden_kind in ["arg", "var"]:
-            dic = self._subroutine_scope
-        else:
+        if iden_kind not in self._count:
             raise Exception("unexpected identifier kind: " + iden_kind)
-        cnt = 0
-        for ent in dic:
-            if ent["kind"] == iden_kind:
-                cnt += 1
-        return cnt
+        return self._count[iden_kind]
+
+    def names_of(self, iden_kind):
+        """Returns the names of the identifiers of the given kind in the
+        current scope, in order of index
+        """
+        if iden_kind not in self._count:
+            raise Exception("unexpected identifier kind: " + iden_kind)
+        scope = self._class_scope if iden_kind in CLASS_KINDS \
+            else self._subroutine_scope
+        entries = sorted(
+            (iden for iden in scope.values() if iden["kind"] == iden_kind),
+            key=lambda iden: iden["index"]
+        )
+        return [iden["name"] for iden in entries]
+
+    def entry_of(self, iden_name):
+        """Returns the symbol table entry of the named identifier in the
+        current scope, or None if there is none
+        """
+        iden = self._subroutine_scope.get(iden_name)
+        if iden is None:
+            iden = self._class_scope.get(iden_name)
+        return iden
 
     def kind_of(self, iden_name):
         """Returns the kind of the named identifier in the current scope"""
@@ -96,13 +102,10 @@ class SymbolTable:
 
     def _prop_of(self, iden_name, prop):
         """Generic function for *_of"""
-        for iden in self._subroutine_scope:
-            if iden["name"] == iden_name:
-                return iden[prop]
-        for iden in self._class_scope:
-            if iden["name"] == iden_name:
-                return iden[prop]
-        return "NONE"
+        iden = self.entry_of(iden_name)
+        if iden is None:
+            return "NONE"
+        return iden[prop]
 
     def print(self, cla=True, sub=True):
         """Prints the table"""
@@ -122,7 +125,7 @@ class SymbolTable:
             dic = self._subroutine_scope
         else:
             raise ValueError("scope should be 'class' or 'subroutine'")
-        for iden in dic:
+        for iden in dic.values():
             row = template.format(
                 iden["name"], iden["type"], iden["kind"], iden["index"]
             )
@@ -130,10 +133,7 @@ class SymbolTable:
 
     def resolve_symbol(self, smth_name):
         """Resolves a symbol (eg. replaces variable name with class name)"""
-        for iden in self._subroutine_scope:
-            if iden["name"] == smth_name:
-                return iden["type"]
-        for iden in self._class_scope:
-            if iden["name"] == smth_name:
-                return iden["type"]
-        return smth_name
+        iden = self.entry_of(smth_name)
+        if iden is None:
+            return smth_name
+        return iden["type"]
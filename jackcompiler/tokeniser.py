@@ -1,16 +1,163 @@
 """Tokenises the contents of a file"""
 
-from .glossary import SYMBOL_ALIASES, SYMBOLS, KEYWORDS
+import re
+import sys
+from .glossary import (
+    SYMBOL_ALIASES, SYMBOLS, KEYWORDS, SYMBOL_SET, KEYWORD_SET,
+    COMMENT_BREAKS, TOKEN_TYPES, KEYWORD, SYMBOL, INT_CONST, STRING_CONST,
+    IDENTIFIER
+)
 from .utilities import print_red, remove_comments
 
+ENGINES = ["regex", "charwise"]
+
+_SYMBOL_CHARS = re.escape("".join(SYMBOLS))
+
+# A token is either a single symbol or a maximal run of characters that are
+# neither whitespace nor symbols. Quoted sections may contain anything,
+# so string literals stay in one piece.
+TOKEN_RE = re.compile(
+    r'([' + _SYMBOL_CHARS + r'])|((?:[^\s"' + _SYMBOL_CHARS +
+    r']|"[^"]*"?)+)'
+)
+
+# The same grammar over bytes, also skipping comments, so that a raw
+# (e.g. memory-mapped) source can be lexed without a stripping pass.
+_SYMBOL_BYTES = _SYMBOL_CHARS.encode()
+STREAM_TOKEN_RE = re.compile(
+    rb'//[^\n]*|/\*.*?(?:\*/|\Z)|([' + _SYMBOL_BYTES +
+    rb'])|((?:[^\s"' + _SYMBOL_BYTES + rb']|"[^"]*"?)+)',
+    re.DOTALL
+)
+
+class Token:
+    """A single token: a small-integer type code and its value.
+
+    Tokens are treated as immutable, so equal tokens may be shared.
+    """
+    __slots__ = ("code", "value")
+
+    def __init__(self, code, value):
+        self.code = code
+        self.value = value
+
+    @property
+    def type(self):
+        """Token type name as used in the xml output"""
+        return TOKEN_TYPES[self.code]
+
+    def __eq__(self, other):
+        if not isinstance(other, Token):
+            return NotImplemented
+        return self.code == other.code and self.value == other.value
+
+    def __hash__(self):
+        return hash((self.code, self.value))
+
+    def __repr__(self):
+        return "Token(" + self.type + ", " + repr(self.value) + ")"
+
+SYMBOL_TOKENS = {
+    sym: Token(SYMBOL, SYMBOL_ALIASES.get(sym, sym)) for sym in SYMBOL_SET
+}
+KEYWORD_TOKENS = {kw: Token(KEYWORD, kw) for kw in KEYWORD_SET}
+
+def lex(contents):
+    """Yields the tokens of a comment-free string in a single pass.
+    Every distinct word becomes one shared token object.
+    """
+    words = dict(KEYWORD_TOKENS)
+    for sym, word in TOKEN_RE.findall(contents):
+        if sym:
+            yield SYMBOL_TOKENS[sym]
+            continue
+        tok = words.get(word)
+        if tok is None:
+            tok = classify_word(word)
+            words[word] = tok
+        yield tok
+
+def lex_bytes(source):
+    """Lazily yields the tokens of a raw bytes-like source (comments
+    included), holding only one match at a time.
+    """
+    symbols = {
+        sym.encode(): tok for sym, tok in SYMBOL_TOKENS.items()
+    }
+    words = {kw.encode(): tok for kw, tok in KEYWORD_TOKENS.items()}
+    for match in STREAM_TOKEN_RE.finditer(source):
+        sym, word = match.groups()
+        if sym is not None:
+            yield symbols[sym]
+        elif word is not None:
+            tok = words.get(word)
+            if tok is None:
+                tok = classify_word(word.decode())
+                words[word] = tok
+            yield tok
+
+def classify_word(word):
+    """Returns the token for a run of non-symbol characters"""
+    if word in KEYWORD_SET:
+        return KEYWORD_TOKENS[word]
+    if word.isdigit():
+        return Token(INT_CONST, sys.intern(word))
+    if '"' in word:
+        return Token(STRING_CONST, word.replace('"', ""))
+    return Token(IDENTIFIER, sys.intern(word))
+
+END = Token(SYMBOL, "")
+
+class LookaheadBuffer:
+    """One-token lookahead over any iterable of tokens.
+    Yields END once the tokens run out.
+    """
+    def __init__(self, tokens):
+        self._tokens = iter(tokens)
+        self._ahead = []
+        self.current = next(self._tokens, END)
+
+    def peek(self):
+        """Returns the token after the current one"""
+        if not self._ahead:
+            self._ahead.append(next(self._tokens, END))
+        return self._ahead[0]
+
+    def advance(self):
+        """Moves on to the next token"""
+        if self._ahead:
+            self.current = self._ahead.pop()
+        else:
+            self.current = next(self._tokens, END)
+
 class Tokeniser:
-    """Creates a token list given a single string of file contents"""
-    def __init__(self):
+    """Creates a token list given a single string of file contents
+
+    Arguments:
+        engine: "regex" (single pass, default) or "charwise"
+            (the original character-by-character reader)
+    """
+    def __init__(self, engine="regex"):
         self._contents = None
         self._tokenised = None
         self._tokens = None
+        self._engine = None
+        self.engine = engine
         self._token_reader = TokenReader()
 
+    @property
+    def engine(self):
+        """Lexer engine"""
+        return self._engine
+
+    @engine.setter
+    def engine(self, engine):
+        if engine not in ENGINES:
+            raise ValueError("engine should be one of " + str(ENGINES))
+        self._engine = engine
+        self._tokenised = False
+        self._tokens = []
+
     @property
     def contents(self):
         """Single string of .jack file contents"""
@@ -20,9 +167,7 @@ class Tokeniser:
     def contents(self, contents):
         if not isinstance(contents, str):
             raise ValueError("file contents should be read as a string")
-        self._contents = remove_comments(
-            contents, [["//", "\n"], ["/**", "*/\n"], ["/*", "*/\n"]]
-        )
+        self._contents = remove_comments(contents, COMMENT_BREAKS)
         self._tokenised = False
         self._tokens = []
 
@@ -41,6 +186,14 @@ class Tokeniser:
 
     def tokenise(self):
         """Creates the token list"""
+        if self.engine == "regex":
+            self._tokens = list(lex(self.contents))
+            self._tokenised = True
+        else:
+            self._tokenise_charwise()
+
+    def _tokenise_charwise(self):
+        """Creates the token list one character at a time"""
         inside_string = False
         tok = ""
         for char in self.contents:
@@ -96,11 +249,11 @@ class TokenReader():
         self._tokval = self._get_tokval()
 
     def get_full_info(self):
-        """Returns the dictionary of token type and value"""
+        """Returns the Token of type and value"""
         if self.token is None:
             print_red("No token")
             return None
-        return {"type": self._toktype, "value": self._tokval}
+        return Token(TOKEN_TYPES.index(self._toktype), self._tokval)
 
     def _get_toktype(self):
         """Returns token type"""
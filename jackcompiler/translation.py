@@ -3,29 +3,10 @@
 
 from .printingutilities import print_padded
 from .glossary import get_comment_breaks, get_verbosity_indicators
-from .utilities import build_terminal
+from .utilities import build_terminal, remove_comments
 from .compilationengine import CompilationEngine
 from .tokeniser import Tokeniser
 
-def remove_comments(file_contents, comment_breaks):
-    """Removes all of the comments from a string"""
-
-    for com_set in comment_breaks:
-        opener = com_set[0]
-        closer = com_set[1]
-
-        while opener in file_contents:
-            ind_start = file_contents.index(opener)
-
-            keep_left = file_contents[:ind_start]
-            rest = file_contents[ind_start:]
-            if closer == "\n":
-                keep_right = rest[rest.index(closer) : ]
-            else: keep_right = rest[rest.index(closer) + len(closer) : ]
-            file_contents = keep_left + keep_right
-
-    return file_contents
-
 def add_whitespaces(file_contents, symbols):
     """Adds whitespaces around symbols"""
     for symbol in symbols:
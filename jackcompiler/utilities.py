@@ -2,6 +2,8 @@
 """
 
 import os
+import re
+import functools
 import colorama
 
 colorama.init(autoreset=True)
@@ -12,6 +14,8 @@ COLOR = {
     "yellow": colorama.Fore.YELLOW
 }
 
+STRING_LITERAL = r'("[^"\n]*")'
+
 def list_files_with_ext(*paths, ext, maxdepth=-1):
     """Creates a list of files with the specified extention"""
     needed_files = []
@@ -39,17 +43,33 @@ def list_files_with_ext(*paths, ext, maxdepth=-1):
     return needed_files
 
 def remove_comments(file_contents, comment_breaks):
-    """Removes all of the comments from a string"""
-    for com_set in comment_breaks:
-        opener = com_set[0]
-        closer = com_set[1]
-        while opener in file_contents:
-            ind_start = file_contents.index(opener)
-            keep_left = file_contents[:ind_start]
-            rest = file_contents[ind_start:]
-            keep_right = rest[rest.index(closer) + len(closer) : ]
-            file_contents = keep_left + keep_right
-    return file_contents
+    """Replaces all of the comments in a string with a space, in a single
+    scan, so that a comment separates tokens as whitespace does.
+    Comment markers inside string literals are left alone.
+    """
+    pattern = comment_pattern(
+        tuple((opener, closer) for opener, closer in comment_breaks)
+    )
+    return pattern.sub(_keep_string, file_contents)
+
+@functools.lru_cache(maxsize=None)
+def comment_pattern(comment_breaks):
+    """Compiles one regex matching string literals or any of the comments.
+    Longer openers go first so that '/**' wins over '/*'.
+    An unterminated comment runs to the end of the input.
+    """
+    alternatives = [STRING_LITERAL]
+    for opener, closer in sorted(comment_breaks, key=lambda x: -len(x[0])):
+        alternatives.append(
+            re.escape(opener) + r".*?(?:" + re.escape(closer) + r"|\Z)"
+        )
+    return re.compile("|".join(alternatives), re.DOTALL)
+
+def _keep_string(match):
+    """Replacement for comment_pattern matches: strings stay, comments
+    become a space
+    """
+    return match.group(1) or " "
 
 def print_yellow(lne):
     """Prints the given string in yellow"""
@@ -65,8 +85,8 @@ def print_green(lne):
 
 def build_terminal(tok):
     """Builds a terminal statement for xml output"""
-    terminal = "<" + tok["type"] + ">" + " " + \
-        str(tok["value"]) + " " + "</" + tok["type"] + ">\n"
+    toktype = tok.type
+    terminal = "<" + toktype + "> " + tok.value + " </" + toktype + ">\n"
     return terminal
 
 def qte(lne):
@@ -0,0 +1,611 @@
+"""Headless emulator for VM code that counts what a program executes.
+
+The whole program is decoded once into a flat list of (handler, argument)
+pairs: labels are resolved to indices, segments to handlers and statics
+to addresses, so running it is a loop of table lookups. Labels take no
+step of their own. Memory is the Hack RAM, with the stack from 256,
+statics from 16 and the heap from 2048, and values are signed 16 bit.
+
+The OS classes are Python stubs, used for the functions the program does
+not define itself. A call to a stub counts as one instruction. Output
+text is collected, Screen calls are logged instead of drawn and the
+keyboard reads from scripted keys and inputs.
+"""
+
+import json
+from collections import Counter
+
+from . import vmir
+from .callgraph import DEFAULT_ROOTS
+
+RAM_SIZE = 32768
+FIRST_STATIC = 16
+STACK_BASE = 256
+HEAP_BASE = 2048
+HEAP_END = 16384
+
+# Return address the program starts with; returning to it ends the run
+HALT = -1
+
+# Instructions run() executes by default before giving up
+MAX_STEPS = 10**7
+
+# Error codes of the Jack OS
+ARRAY_SIZE = 2
+DIVIDE_BY_ZERO = 3
+SQRT_NEGATIVE = 4
+ALLOC_SIZE = 5
+HEAP_OVERFLOW = 6
+STRING_LENGTH = 14
+CHAR_AT_INDEX = 15
+SET_CHAR_AT_INDEX = 16
+STRING_FULL = 17
+STRING_EMPTY = 18
+SET_INT_FULL = 19
+
+NEWLINE = 128
+BACKSPACE = 129
+DOUBLE_QUOTE = 34
+
+POINTER = {"local": 1, "argument": 2, "this": 3, "that": 4}
+
+class Halt(Exception):
+    """Raised to end the program, by Sys.halt, Sys.error or returning
+    from the function it started at
+    """
+
+def wrap(value):
+    """Returns value as a signed 16 bit number"""
+    return (value + 0x8000 & 0xFFFF) - 0x8000
+
+def read_program(paths):
+    """Returns the functions in .vm files"""
+    functions = []
+    for path in paths:
+        with open(path) as vmfile:
+            functions.extend(
+                vmir.split_functions(vmir.parse_vm(vmfile.read()))
+            )
+    return functions
+
+# OS stubs, called with the emulator and the arguments of the call
+
+def _fail(emu, code):
+    emu.error = code
+    raise Halt()
+
+def _multiply(emu, x, y):
+    return wrap(x * y)
+
+def _divide(emu, x, y):
+    if y == 0:
+        _fail(emu, DIVIDE_BY_ZERO)
+    quotient = abs(x) // abs(y)
+    return wrap(quotient if (x < 0) == (y < 0) else -quotient)
+
+def _sqrt(emu, x):
+    if x < 0:
+        _fail(emu, SQRT_NEGATIVE)
+    root = int(x ** 0.5)
+    while root * root > x:
+        root -= 1
+    return root
+
+def _alloc(emu, size):
+    if size <= 0:
+        _fail(emu, ALLOC_SIZE)
+    free = emu.free_blocks.get(size)
+    if free:
+        return free.pop()
+    block = emu.heap_top + 1
+    if block + size > HEAP_END:
+        _fail(emu, HEAP_OVERFLOW)
+    emu.ram[block - 1] = size
+    emu.heap_top = block + size
+    return block
+
+def _de_alloc(emu, block):
+    emu.free_blocks.setdefault(emu.ram[block - 1], []).append(block)
+    return 0
+
+def _poke(emu, address, value):
+    emu.ram[address] = value
+    return 0
+
+def _array_new(emu, size):
+    if size <= 0:
+        _fail(emu, ARRAY_SIZE)
+    return _alloc(emu, size)
+
+# Strings are [max length, length, characters...] in the heap
+
+def _string_new(emu, max_length):
+    if max_length < 0:
+        _fail(emu, STRING_LENGTH)
+    string = _alloc(emu, max_length + 2)
+    emu.ram[string] = max_length
+    emu.ram[string + 1] = 0
+    return string
+
+def _char_at(emu, string, index):
+    if not 0 <= index < emu.ram[string + 1]:
+        _fail(emu, CHAR_AT_INDEX)
+    return emu.ram[string + 2 + index]
+
+def _set_char_at(emu, string, index, char):
+    if not 0 <= index < emu.ram[string + 1]:
+        _fail(emu, SET_CHAR_AT_INDEX)
+    emu.ram[string + 2 + index] = char
+    return 0
+
+def _append_char(emu, string, char):
+    length = emu.ram[string + 1]
+    if length == emu.ram[string]:
+        _fail(emu, STRING_FULL)
+    emu.ram[string + 2 + length] = char
+    emu.ram[string + 1] = length + 1
+    return string
+
+def _erase_last_char(emu, string):
+    if emu.ram[string + 1] == 0:
+        _fail(emu, STRING_EMPTY)
+    emu.ram[string + 1] -= 1
+    return 0
+
+def _int_value(emu, string):
+    text = emu.string_at(string)
+    sign = -1 if text.startswith("-") else 1
+    digits = ""
+    for char in text[1:] if sign < 0 else text:
+        if not char.isdigit():
+            break
+        digits += char
+    return wrap(sign * int(digits or "0"))
+
+def _set_int(emu, string, value):
+    text = str(value)
+    if len(text) > emu.ram[string]:
+        _fail(emu, SET_INT_FULL)
+    emu.ram[string + 1] = len(text)
+    emu.ram[string + 2:string + 2 + len(text)] = [ord(c) for c in text]
+    return 0
+
+def _print_char(emu, char):
+    emu.write_char(char)
+    return 0
+
+def _print_string(emu, string):
+    for char in emu.ram[string + 2:string + 2 + emu.ram[string + 1]]:
+        emu.write_char(char)
+    return 0
+
+def _print_int(emu, value):
+    emu.output.append(str(value))
+    return 0
+
+def _next_key(emu):
+    return emu.keys.pop(0) if emu.keys else 0
+
+def _read_char(emu):
+    char = _next_key(emu)
+    emu.write_char(char)
+    return char
+
+def _read_line(emu, message):
+    _print_string(emu, message)
+    text = str(emu.inputs.pop(0)) if emu.inputs else ""
+    emu.output.append(text + "\n")
+    return emu.new_string(text)
+
+def _read_int(emu, message):
+    _print_string(emu, message)
+    value = wrap(int(emu.inputs.pop(0))) if emu.inputs else 0
+    emu.output.append(str(value) + "\n")
+    return value
+
+def _logged(name):
+    """Returns a stub that only logs its calls to emu.screen"""
+    def stub(emu, *args):
+        emu.screen.append((name,) + args)
+        return 0
+    return stub
+
+def _halt(emu):
+    raise Halt()
+
+def _returns(value):
+    """Returns a stub that does nothing but return value"""
+    return lambda emu, *args: value
+
+OS_STUBS = {
+    "Math.init": _returns(0),
+    "Math.abs": lambda emu, x: wrap(abs(x)),
+    "Math.multiply": _multiply,
+    "Math.divide": _divide,
+    "Math.min": lambda emu, x, y: min(x, y),
+    "Math.max": lambda emu, x, y: max(x, y),
+    "Math.sqrt": _sqrt,
+    "Memory.init": _returns(0),
+    "Memory.peek": lambda emu, address: emu.ram[address],
+    "Memory.poke": _poke,
+    "Memory.alloc": _alloc,
+    "Memory.deAlloc": _de_alloc,
+    "Array.new": _array_new,
+    "Array.dispose": _de_alloc,
+    "String.new": _string_new,
+    "String.dispose": _de_alloc,
+    "String.length": lambda emu, string: emu.ram[string + 1],
+    "String.charAt": _char_at,
+    "String.setCharAt": _set_char_at,
+    "String.appendChar": _append_char,
+    "String.eraseLastChar": _erase_last_char,
+    "String.intValue": _int_value,
+    "String.setInt": _set_int,
+    "String.newLine": _returns(NEWLINE),
+    "String.backSpace": _returns(BACKSPACE),
+    "String.doubleQuote": _returns(DOUBLE_QUOTE),
+    "Output.init": _returns(0),
+    "Output.moveCursor": _logged("Output.moveCursor"),
+    "Output.printChar": _print_char,
+    "Output.printString": _print_string,
+    "Output.printInt": _print_int,
+    "Output.println": lambda emu: _print_char(emu, NEWLINE),
+    "Output.backSpace": lambda emu: _print_char(emu, BACKSPACE),
+    "Screen.init": _returns(0),
+    "Screen.clearScreen": _logged("Screen.clearScreen"),
+    "Screen.setColor": _logged("Screen.setColor"),
+    "Screen.drawPixel": _logged("Screen.drawPixel"),
+    "Screen.drawLine": _logged("Screen.drawLine"),
+    "Screen.drawRectangle": _logged("Screen.drawRectangle"),
+    "Screen.drawCircle": _logged("Screen.drawCircle"),
+    "Keyboard.init": _returns(0),
+    "Keyboard.keyPressed": _next_key,
+    "Keyboard.readChar": _read_char,
+    "Keyboard.readLine": _read_line,
+    "Keyboard.readInt": _read_int,
+    "Sys.halt": _halt,
+    "Sys.error": _fail,
+    "Sys.wait": _returns(0)
+}
+
+class VMEmulator:
+    """Runs one program given as VM functions.
+
+    Arguments:
+        functions -- every function of the program, as lists of
+            instructions
+        keys -- what Keyboard.keyPressed and Keyboard.readChar return,
+            one per call, then 0
+        inputs -- what Keyboard.readInt and Keyboard.readLine read, one
+            per call, then 0 or an empty line
+    The program starts at Sys.init, or Main.main if there is none, and
+    ends when that returns or at Sys.halt or Sys.error. self.output holds
+    the text printed, self.screen the Screen calls and self.error the
+    code given to Sys.error, if any.
+    """
+    def __init__(self, functions, keys=(), inputs=()):
+        self.ram = [0] * RAM_SIZE
+        self.keys = list(keys)
+        self.inputs = list(inputs)
+        self.output = []
+        self.screen = []
+        self.error = None
+        self.finished = False
+        self.heap_top = HEAP_BASE - 1
+        self.free_blocks = {}
+        self.os_calls = Counter()
+        self._peak = [0]
+        self._ranges = []
+        self._code = []
+        self._decode(functions)
+        self.counts = [0] * len(self._code)
+        self._pc = self._start(functions)
+
+    def write_char(self, char):
+        """Adds a character to the output, as Output.printChar would"""
+        if char == NEWLINE:
+            self.output.append("\n")
+        elif char == BACKSPACE:
+            self.output.append("\b")
+        else:
+            self.output.append(chr(char))
+
+    def get_output(self):
+        """Returns the text printed so far, with backspaces applied"""
+        text = []
+        for char in "".join(self.output):
+            if char != "\b":
+                text.append(char)
+            elif text and text[-1] != "\n":
+                text.pop()
+        return "".join(text)
+
+    def string_at(self, string):
+        """Returns the characters of a String object"""
+        length = self.ram[string + 1]
+        return "".join(map(chr, self.ram[string + 2:string + 2 + length]))
+
+    def new_string(self, text):
+        """Returns a new String object holding text"""
+        string = _string_new(self, len(text))
+        for char in text:
+            _append_char(self, string, ord(char))
+        return string
+
+    def run(self, max_steps=MAX_STEPS):
+        """Runs the program for at most max_steps instructions. Returns
+        whether it has ended.
+        """
+        if self.finished:
+            return True
+        code = self._code
+        counts = self.counts
+        pc = self._pc
+        try:
+            for _ in range(max_steps):
+                counts[pc] += 1
+                handler, arg = code[pc]
+                pc = handler(arg, pc)
+        except Halt:
+            self.finished = True
+        self._pc = pc
+        return self.finished
+
+    def get_report(self):
+        """Returns the instructions executed, in all and per function
+        called, the calls to each function and to each OS stub and the
+        deepest the stack went, in words
+        """
+        functions = {}
+        for name, start, end in self._ranges:
+            if self.counts[start]:
+                functions[name] = {
+                    "calls": self.counts[start],
+                    "instructions": sum(self.counts[start:end])
+                }
+        return {
+            "finished": self.finished,
+            "error": self.error,
+            "instructions": sum(self.counts),
+            "peak_stack_depth": self._peak[0] - STACK_BASE,
+            "functions": functions,
+            "os_calls": dict(self.os_calls)
+        }
+
+    def get_json(self):
+        """Returns get_report() as JSON"""
+        return json.dumps(self.get_report(), indent=2, sort_keys=True)
+
+    def _start(self, functions):
+        """Sets up the stack as if the root had been called. Returns the
+        index of the root.
+        """
+        entries = {name: start for name, start, _ in self._ranges}
+        roots = [name for name in DEFAULT_ROOTS if name in entries]
+        if not roots:
+            raise ValueError("the program has no Sys.init or Main.main")
+        ram = self.ram
+        ram[STACK_BASE] = HALT
+        ram[1] = ram[0] = STACK_BASE + 5
+        ram[2] = STACK_BASE
+        self._peak[0] = ram[0]
+        return entries[roots[0]]
+
+    def _decode(self, functions):
+        """Fills self._code and self._ranges"""
+        handlers = self._handlers()
+        entries = {}
+        statics = {}
+        index = 0
+        for func in functions:
+            entries[func[0].arg] = index
+            index += sum(instr.op != "label" for instr in func)
+        for func in functions:
+            name = func[0].arg
+            start = len(self._code)
+            labels = {}
+            for instr in func:
+                if instr.op == "label":
+                    labels[instr.arg] = start
+                else:
+                    start += 1
+            cls = name.split(".", 1)[0]
+            for instr in func:
+                if instr.op == "label":
+                    continue
+                if instr.op in ("push", "pop"):
+                    if instr.arg in POINTER or instr.arg == "constant":
+                        entry = (handlers[instr.op, instr.arg], instr.num)
+                    else:
+                        entry = (handlers[instr.op, "address"],
+                                 self._address(instr, cls, statics))
+                elif instr.op in ("goto", "if-goto"):
+                    entry = (handlers[instr.op], labels[instr.arg])
+                elif instr.op == "call" and instr.arg in entries:
+                    entry = (handlers["call"],
+                             (entries[instr.arg], instr.num))
+                elif instr.op == "call":
+                    entry = (handlers["stub"],
+                             (OS_STUBS.get(instr.arg), instr.num, instr.arg))
+                else:
+                    entry = (handlers[instr.op], instr.num)
+                self._code.append(entry)
+            self._ranges.append((name, entries[name], len(self._code)))
+
+    @staticmethod
+    def _address(instr, cls, statics):
+        """Returns the RAM address of a temp, pointer or static"""
+        if instr.arg == "temp":
+            return 5 + instr.num
+        if instr.arg == "pointer":
+            return 3 + instr.num
+        key = (cls, instr.num)
+        if key not in statics:
+            statics[key] = FIRST_STATIC + len(statics)
+            if statics[key] >= STACK_BASE:
+                raise ValueError("more statics than fit below the stack")
+        return statics[key]
+
+    def _handlers(self):
+        """Returns the handlers by (op, segment) for push and pop and by
+        op otherwise. A handler takes the decoded argument and the index
+        of its instruction and returns the index to run next.
+        """
+        #pylint: disable=too-many-locals,too-many-statements
+        ram = self.ram
+        peak = self._peak
+        os_calls = self.os_calls
+
+        def push_constant(value, pc):
+            sp = ram[0]
+            ram[sp] = value
+            ram[0] = sp = sp + 1
+            if sp > peak[0]:
+                peak[0] = sp
+            return pc + 1
+
+        def push_address(address, pc):
+            sp = ram[0]
+            ram[sp] = ram[address]
+            ram[0] = sp = sp + 1
+            if sp > peak[0]:
+                peak[0] = sp
+            return pc + 1
+
+        def pop_address(address, pc):
+            ram[0] = sp = ram[0] - 1
+            ram[address] = ram[sp]
+            return pc + 1
+
+        def pointed(base):
+            def push(offset, pc):
+                sp = ram[0]
+                ram[sp] = ram[ram[base] + offset]
+                ram[0] = sp = sp + 1
+                if sp > peak[0]:
+                    peak[0] = sp
+                return pc + 1
+            def pop(offset, pc):
+                ram[0] = sp = ram[0] - 1
+                ram[ram[base] + offset] = ram[sp]
+                return pc + 1
+            return push, pop
+
+        def add(_, pc):
+            ram[0] = sp = ram[0] - 1
+            value = ram[sp - 1] + ram[sp]
+            if value > 32767:
+                value -= 65536
+            elif value < -32768:
+                value += 65536
+            ram[sp - 1] = value
+            return pc + 1
+
+        def sub(_, pc):
+            ram[0] = sp = ram[0] - 1
+            value = ram[sp - 1] - ram[sp]
+            if value > 32767:
+                value -= 65536
+            elif value < -32768:
+                value += 65536
+            ram[sp - 1] = value
+            return pc + 1
+
+        def neg(_, pc):
+            sp = ram[0] - 1
+            value = ram[sp]
+            ram[sp] = value if value == -32768 else -value
+            return pc + 1
+
+        def not_(_, pc):
+            sp = ram[0] - 1
+            ram[sp] = ~ram[sp]
+            return pc + 1
+
+        def and_(_, pc):
+            ram[0] = sp = ram[0] - 1
+            ram[sp - 1] &= ram[sp]
+            return pc + 1
+
+        def or_(_, pc):
+            ram[0] = sp = ram[0] - 1
+            ram[sp - 1] |= ram[sp]
+            return pc + 1
+
+        def eq(_, pc):
+            ram[0] = sp = ram[0] - 1
+            ram[sp - 1] = -1 if ram[sp - 1] == ram[sp] else 0
+            return pc + 1
+
+        def gt(_, pc):
+            ram[0] = sp = ram[0] - 1
+            ram[sp - 1] = -1 if ram[sp - 1] > ram[sp] else 0
+            return pc + 1
+
+        def lt(_, pc):
+            ram[0] = sp = ram[0] - 1
+            ram[sp - 1] = -1 if ram[sp - 1] < ram[sp] else 0
+            return pc + 1
+
+        def goto(target, _):
+            return target
+
+        def if_goto(target, pc):
+            ram[0] = sp = ram[0] - 1
+            return target if ram[sp] else pc + 1
+
+        def function(n_locals, pc):
+            sp = ram[0]
+            ram[sp:sp + n_locals] = [0] * n_locals
+            ram[0] = sp = sp + n_locals
+            if sp > peak[0]:
+                peak[0] = sp
+            return pc + 1
+
+        def call(arg, pc):
+            entry, n_args = arg
+            sp = ram[0]
+            ram[sp:sp + 5] = [pc + 1, ram[1], ram[2], ram[3], ram[4]]
+            ram[2] = sp - n_args
+            ram[1] = ram[0] = sp = sp + 5
+            if sp > peak[0]:
+                peak[0] = sp
+            return entry
+
+        def return_(_, pc):
+            frame = ram[1]
+            address = ram[frame - 5]
+            arg = ram[2]
+            ram[arg] = ram[ram[0] - 1]
+            ram[0] = arg + 1
+            ram[1:5] = ram[frame - 4:frame]
+            if address == HALT:
+                raise Halt()
+            return address
+
+        def stub(arg, pc):
+            routine, n_args, name = arg
+            if routine is None:
+                raise ValueError("call to undefined function " + name)
+            os_calls[name] += 1
+            sp = ram[0] - n_args
+            value = routine(self, *ram[sp:sp + n_args])
+            ram[sp] = wrap(value)
+            ram[0] = sp = sp + 1
+            if sp > peak[0]:
+                peak[0] = sp
+            return pc + 1
+
+        handlers = {
+            ("push", "constant"): push_constant,
+            ("push", "address"): push_address,
+            ("pop", "address"): pop_address,
+            "add": add, "sub": sub, "neg": neg, "not": not_, "and": and_,
+            "or": or_, "eq": eq, "gt": gt, "lt": lt, "goto": goto,
+            "if-goto": if_goto, "function": function, "call": call,
+            "return": return_, "stub": stub
+        }
+        for segment, base in POINTER.items():
+            handlers["push", segment], handlers["pop", segment] = \
+                pointed(base)
+        return handlers
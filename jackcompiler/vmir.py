@@ -0,0 +1,120 @@
+"""In-memory representation of VM code.
+
+A function is a list of Instr records starting with its "function"
+instruction. print_vm turns instructions back into .vm text and
+parse_vm reads .vm text into instructions.
+"""
+
+from collections import namedtuple
+
+ARITHMETIC = frozenset(
+    ["add", "sub", "neg", "eq", "gt", "lt", "and", "or", "not"]
+)
+BINARY = frozenset(["add", "sub", "eq", "gt", "lt", "and", "or"])
+UNARY = frozenset(["neg", "not"])
+COMPARISONS = frozenset(["eq", "gt", "lt"])
+JUMPS = frozenset(["goto", "if-goto"])
+
+class Instr(namedtuple("Instr", ["op", "arg", "num"])):
+    """One VM instruction.
+
+    op: the command, eg. "push", "add", "label", "call"
+    arg: segment for push/pop, label for label/goto/if-goto,
+        function name for function/call, otherwise None
+    num: index for push/pop, local count for function,
+        argument count for call, otherwise None
+    """
+    __slots__ = ()
+
+    @property
+    def seg(self):
+        """Segment of a push or pop"""
+        return self.arg
+
+    @property
+    def index(self):
+        """Index of a push or pop"""
+        return self.num
+
+    @property
+    def label(self):
+        """Label of a label, goto or if-goto"""
+        return self.arg
+
+    @property
+    def target(self):
+        """Function named by a function or call"""
+        return self.arg
+
+    @property
+    def argc(self):
+        """Argument count of a call"""
+        return self.num
+
+    def __str__(self):
+        if self.num is not None:
+            return self.op + " " + self.arg + " " + str(self.num)
+        if self.arg is not None:
+            return self.op + " " + self.arg
+        return self.op
+
+def push(seg, ind):
+    """push seg ind"""
+    return Instr("push", seg, ind)
+
+def pop(seg, ind):
+    """pop seg ind"""
+    return Instr("pop", seg, ind)
+
+def arith(oper):
+    """An arithmetic/logical command"""
+    return Instr(oper, None, None)
+
+def label(lbl):
+    """label lbl"""
+    return Instr("label", lbl, None)
+
+def goto(lbl):
+    """goto lbl"""
+    return Instr("goto", lbl, None)
+
+def if_goto(lbl):
+    """if-goto lbl"""
+    return Instr("if-goto", lbl, None)
+
+def function(name, n_locals):
+    """function name n_locals"""
+    return Instr("function", name, n_locals)
+
+def call(name, argc):
+    """call name argc"""
+    return Instr("call", name, argc)
+
+RETURN = Instr("return", None, None)
+
+def print_vm(instrs):
+    """Returns the .vm text of a sequence of instructions"""
+    if not instrs:
+        return ""
+    return "\n".join(map(str, instrs)) + "\n"
+
+def parse_vm(text):
+    """Returns the instructions in .vm text (comments allowed)"""
+    instrs = []
+    for line in text.splitlines():
+        parts = line.split("//", 1)[0].split()
+        if not parts:
+            continue
+        arg = parts[1] if len(parts) > 1 else None
+        num = int(parts[2]) if len(parts) > 2 else None
+        instrs.append(Instr(parts[0], arg, num))
+    return instrs
+
+def split_functions(instrs):
+    """Splits a class's instructions into one list per function"""
+    functions = []
+    for instr in instrs:
+        if instr.op == "function" or not functions:
+            functions.append([])
+        functions[-1].append(instr)
+    return functions
@@ -0,0 +1,38 @@
+"""Test programs and helpers to compile them as whole programs"""
+
+import os
+
+from jackcompiler.tokeniser import Tokeniser
+from jackcompiler.compilationengine import CompilationEngine
+from jackcompiler.utilities import list_files_with_ext
+
+THIS_DIR = os.path.dirname(os.path.realpath(__file__))
+ASMCODE = os.path.join(THIS_DIR, "asmcode")
+VMCODE = os.path.join(THIS_DIR, "vmcode")
+
+# What tests/asmcode/Main.jack stores from address 8000 on
+EXPECTED = [144, 285, -2, 1100, 142, -142, 21, 17, 42, 44, -2, -56, 41, 240]
+
+def compile_sources(sources, optlevel):
+    """Returns the functions of the program made of the .jack sources,
+    after the program passes, and the pass manager that ran them
+    """
+    tok = Tokeniser()
+    engine = CompilationEngine()
+    engine.build_tree = False
+    engine.pass_manager.optlevel = optlevel
+    functions = []
+    for source in sources:
+        tok.contents = source
+        engine.tokens = tok.get_tokens()
+        functions.extend(engine.get_ir())
+    manager = engine.pass_manager
+    return manager.run_program(functions), manager
+
+def compile_program(directory, optlevel):
+    """Returns the functions of the program in a directory"""
+    sources = []
+    for path in sorted(list_files_with_ext(directory, ext=".jack")):
+        with open(path) as jackfile:
+            sources.append(jackfile.read())
+    return compile_sources(sources, optlevel)[0]
@@ -0,0 +1,93 @@
+#pylint: disable=missing-docstring
+
+import shutil
+import pytest
+
+from jackcompiler.asmtranslator import lower, rom_size, HALT
+from jackcompiler.compiler import JackCompiler
+from jackcompiler.hackcpu import HackCPU, assemble, decode, wrap
+from jackcompiler.utilities import list_files_with_ext
+from jackcompiler.vmir import parse_vm
+from programs import ASMCODE, EXPECTED, compile_program
+
+def run(lines):
+    program, symbols = assemble(lines)
+    cpu = HackCPU(program)
+    cpu.run(symbols[HALT])
+    return cpu
+
+def lowered(text):
+    return lower([parse_vm(text)])
+
+@pytest.mark.parametrize("optlevel", range(4))
+def test_programs_run(optlevel):
+    functions = compile_program(ASMCODE, optlevel)
+    naive_lines = lower(functions, bootstrap=True, naive=True)
+    lines = lower(functions, bootstrap=True)
+    naive = run(naive_lines)
+    cpu = run(lines)
+    assert naive.ram[8000:8000 + len(EXPECTED)] == EXPECTED
+    assert cpu.ram[8000:8000 + len(EXPECTED)] == EXPECTED
+    assert rom_size(lines) < rom_size(naive_lines) / 2
+    assert cpu.cycles < naive.cycles * 2 / 3
+
+def test_stack_top_in_d():
+    lines = lowered("function A.f 1\npush local 0\npush constant 1\nadd\n"
+                    "pop local 0\npush argument 1\npush constant 2\n"
+                    "push constant 0\nreturn")
+    assert lines[:8] == [
+        "(A.f)", "@SP", "A=M", "M=0", "D=A+1", "@SP", "M=D", "@LCL"
+    ]
+    assert lines[8:14] == ["A=M", "D=M", "D=D+1", "@LCL", "A=M", "M=D"]
+    # Pushing flushes D to memory; the return value goes back in D
+    assert lines[14:30] == [
+        "@ARG", "A=M+1", "D=M", "@SP", "AM=M+1", "A=A-1", "M=D", "@2", "D=A",
+        "@SP", "AM=M+1", "A=A-1", "M=D", "D=0", "@$RETURN", "0;JMP"
+    ]
+
+def test_compare_and_jump():
+    lines = lowered("function A.f 0\npush argument 0\npush argument 1\nlt\n"
+                    "not\nif-goto L\npush constant 0\nreturn\nlabel L\n"
+                    "push constant 1\nreturn")
+    assert lines[1:8] == [
+        "@ARG", "A=M", "D=M", "@ARG", "A=M+1", "D=D-M", "@A.f$L"
+    ]
+    assert lines[8] == "D;JGE"
+
+def test_calls_share_routines():
+    text = "function A.f 0\n" + "push constant 3\ncall B.g 1\npop temp 0\n" \
+        * 3 + "push constant 0\nreturn"
+    lines = lowered(text)
+    assert lines.count("($CALL)") == 1 and lines.count("($RETURN)") == 1
+    assert lines.count("@$CALL") == 3
+    assert "@R5" in lines
+
+def test_asm_files(tmp_path):
+    for path in list_files_with_ext(ASMCODE, ext=".jack"):
+        shutil.copy(path, str(tmp_path))
+    comp = JackCompiler()
+    comp.outasm = True
+    comp.jackpath = str(tmp_path / "Point.jack")
+    comp.run()
+    assert "(Point.getX)" in (tmp_path / "Point.asm").read_text()
+    comp.optlevel = 3
+    comp.run_program(sorted(list_files_with_ext(str(tmp_path),
+                                                ext=".jack")))
+    lines = (tmp_path / (tmp_path.name + ".asm")).read_text().splitlines()
+    assert run(lines).ram[8000:8000 + len(EXPECTED)] == EXPECTED
+    report = comp.get_pass_report()["asm"]
+    assert report["ROM"] < report["naive ROM"]
+    comp.stream = True
+    with pytest.raises(ValueError):
+        comp.run()
+
+def test_hack_cpu():
+    with pytest.raises(ValueError):
+        decode("D=D+D")
+    program, symbols = assemble(["@x", "M=1", "@y", "D=M+1", "@x",
+                                 "MD=D+M", "(END)", "@END", "0;JMP"])
+    assert symbols["x"] == 16 and symbols["y"] == 17
+    cpu = HackCPU(program)
+    assert cpu.run(symbols["END"]) == 6
+    assert cpu.ram[16] == 2 and cpu.d == 2
+    assert wrap(32767 + 1) == -32768
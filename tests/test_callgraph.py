@@ -0,0 +1,61 @@
+#pylint: disable=missing-docstring
+
+import os
+import shutil
+
+from jackcompiler.vmir import parse_vm, split_functions
+from jackcompiler.callgraph import Reachability, build_call_graph
+from jackcompiler.compiler import JackCompiler
+from jackcompiler.utilities import list_files_with_ext
+
+PROGRAM = split_functions(parse_vm("""
+function Main.main 0
+call Util.used 0
+call Output.printInt 1
+return
+function Util.used 0
+call Util.used 0
+return
+function Util.unused 0
+call Util.used 0
+return
+function Util.callback 0
+return
+function Math.helper 0
+return
+"""))
+
+def test_call_graph():
+    assert build_call_graph(PROGRAM)["Main.main"] == \
+        ["Util.used", "Output.printInt"]
+    reach = Reachability(PROGRAM)
+    assert reach.roots == ["Main.main", "Math.helper"]
+    assert [func[0].arg for func in reach.prune(PROGRAM)] == \
+        ["Main.main", "Util.used", "Math.helper"]
+    reach = Reachability(PROGRAM, ["Util.callback", "Util.missing"])
+    assert reach.is_live("Util.callback")
+    assert not reach.is_live("Util.unused")
+    report = reach.get_report()
+    assert "Util.used <- Main.main" in report
+    assert "Entry points not defined: Util.missing" in report
+    assert "Called outside the program: Output.printInt" in report
+    # No roots: a library keeps everything
+    assert Reachability(PROGRAM[1:3]).prune(PROGRAM[1:3]) == PROGRAM[1:3]
+
+def test_run_program(tmp_path):
+    this_dir = os.path.dirname(os.path.realpath(__file__))
+    pong = os.path.join(this_dir, "vmcode", "Pong")
+    for path in list_files_with_ext(pong, ext=".jack"):
+        shutil.copy(path, str(tmp_path))
+    with open(str(tmp_path / "Unused.jack"), "w") as jackfile:
+        jackfile.write("class Unused {\n function void f() { return; }\n}\n")
+    comp = JackCompiler()
+    reach = comp.run_program(
+        sorted(list_files_with_ext(str(tmp_path), ext=".jack"))
+    )
+    assert not reach.is_live("Unused.f")
+    assert (tmp_path / "Unused.vm").read_text() == ""
+    with open(os.path.join(pong, "BallCompare.vm")) as vmfile:
+        assert (tmp_path / "Ball.vm").read_text() == vmfile.read()
+    assert "Removed 1 functions\n  Unused.f\n" in \
+        (tmp_path / "reachability.txt").read_text()
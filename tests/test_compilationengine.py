@@ -0,0 +1,135 @@
+#pylint: disable=missing-docstring
+
+import os
+import pytest
+
+from jackcompiler.tokeniser import Tokeniser
+from jackcompiler.compilationengine import CompilationEngine
+from jackcompiler.utilities import list_files_with_ext
+
+def corpus_tokens():
+    """Yields (path, tokens) for every class in tests/vmcode"""
+    this_dir = os.path.dirname(os.path.realpath(__file__))
+    tok = Tokeniser()
+    for jackpath in list_files_with_ext(
+            os.path.join(this_dir, "vmcode"), ext=".jack"):
+        with open(jackpath) as jackfile:
+            tok.contents = jackfile.read()
+        yield jackpath, tok.get_tokens()
+
+def test_no_tree():
+    """Tests that skipping the xml tree leaves the VM code unchanged"""
+    with_tree = CompilationEngine()
+    without_tree = CompilationEngine()
+    without_tree.build_tree = False
+    for _, tokens in corpus_tokens():
+        with_tree.tokens = tokens
+        without_tree.tokens = tokens
+        assert with_tree.get_vmcode() == without_tree.get_vmcode()
+        with pytest.raises(ValueError):
+            without_tree.get_xml_tree()
+
+def compile_source(source, build_tree=False, optlevel=0):
+    """Returns the VM code for a class given as a string"""
+    tok = Tokeniser()
+    tok.contents = source
+    engine = CompilationEngine()
+    engine.build_tree = build_tree
+    engine.pass_manager.optlevel = optlevel
+    engine.tokens = tok.get_tokens()
+    return engine.get_vmcode()
+
+def nested_function(body):
+    """Wraps a statement in a class with one function"""
+    return (
+        "class Deep {\n function int f(int x) {\n var int y;\n" + body +
+        "\n return y;\n }\n}\n"
+    )
+
+def test_deep_expressions():
+    """Tests that deep nesting does not hit the recursion limit"""
+    depth = 100000
+    parens = compile_source(
+        nested_function("let y = " + "(" * depth + "x" + ")" * depth + ";")
+    )
+    assert "push argument 0\npop local 0\n" in parens
+    unary = compile_source(nested_function("let y = " + "-" * depth + "x;"))
+    assert unary.count("neg\n") == depth
+    calls = compile_source(
+        nested_function("let y = " + "Deep.f(" * depth + "x" + ")" * depth +
+                        ";")
+    )
+    assert calls.count("call Deep.f 1\n") == depth
+
+def branch_code(body):
+    """Returns the O1 code of a function body without its first line"""
+    return compile_source(nested_function(body), optlevel=1).splitlines()[1:]
+
+def test_direct_branches():
+    assert branch_code(
+        "if (x = 0) { return 1; } else { return 2; }"
+    )[:8] == [
+        "push argument 0", "push constant 0", "sub", "if-goto IF_FALSE0",
+        "push constant 1", "return", "label IF_FALSE0", "push constant 2"
+    ]
+    assert branch_code("while (~(x = 0)) { let x = x - 1; }")[:5] == [
+        "label WHILE_EXP0", "push argument 0", "push constant 0", "eq",
+        "if-goto WHILE_END0"
+    ]
+    assert branch_code("while (x < 5) { let x = x + 1; }")[:5] == [
+        "label WHILE_EXP0", "push argument 0", "push constant 5", "lt",
+        "not"
+    ]
+    # Not known to be 0 or -1, so compared with false
+    assert branch_code("if (x) { let y = 1; }")[:4] == [
+        "push argument 0", "push constant 0", "eq", "if-goto IF_FALSE0"
+    ]
+    # A loop only goes on while the condition is -1, as at -O0
+    assert branch_code("while (x) { let x = x + 1; }")[:4] == [
+        "label WHILE_EXP0", "push argument 0", "not", "if-goto WHILE_END0"
+    ]
+    code = branch_code("if (x > 1) { let y = 1; } else { let y = 2; }")
+    assert code.count("goto IF_END0") == 1
+    assert "label IF_END0" in code
+    for branches in [branch_code("if (x) {} else {}"),
+                     branch_code("while (true) {}")]:
+        assert sum(line.startswith("if-goto") for line in branches) <= 1
+
+def test_array_stores():
+    assert branch_code("let y[x] = y + 1;")[:8] == [
+        "push argument 0", "push local 0", "add", "pop pointer 1",
+        "push local 0", "push constant 1", "add", "pop that 0"
+    ]
+    # The entry being stored to is already in pointer 1
+    assert branch_code("let y[x] = y[x] + 1;")[:8] == [
+        "push argument 0", "push local 0", "add", "pop pointer 1",
+        "push that 0", "push constant 1", "add", "pop that 0"
+    ]
+    assert branch_code("let y[x] = Deep.f(x);")[3:7] == [
+        "pop pointer 1", "push argument 0", "call Deep.f 1", "pop that 0"
+    ]
+    # Reads another entry, so the value goes through temp 0
+    assert "pop temp 0" in branch_code("let y[x] = y[x + 1];")
+
+def test_string_pool():
+    tok = Tokeniser()
+    tok.contents = (
+        "class S {\n static int a, b;\n function void f() {\n"
+        " do Output.printString(\"hi\");\n do Output.printString(\"yo\");\n"
+        " do Output.printString(\"hi\");\n return;\n }\n}\n"
+    )
+    engine = CompilationEngine()
+    engine.build_tree = False
+    engine.pass_manager.options.add("string-pool")
+    engine.tokens = tok.get_tokens()
+    code = engine.get_vmcode().splitlines()
+    assert code[1:10] == [
+        "push static 2", "if-goto STRING_READY0", "push constant 2",
+        "call String.new 1", "push constant 104",
+        "call String.appendChar 2", "push constant 105",
+        "call String.appendChar 2", "pop static 2"
+    ]
+    assert code.count("pop static 2") == 2
+    assert code.count("pop static 3") == 1
+    assert engine.pass_manager.report["string-pool"] == \
+        {"literals": 2, "uses": 3}
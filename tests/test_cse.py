@@ -0,0 +1,67 @@
+#pylint: disable=missing-docstring
+
+from collections import Counter
+
+from jackcompiler.vmir import parse_vm, print_vm
+from jackcompiler.cse import eliminate_common_subexpressions
+
+SQUARE = "push argument 0\npush argument 0\ncall Math.multiply 2\n"
+SUM = "push local 0\npush this 1\nadd\n"
+
+def share(text, n_locals=1):
+    report = Counter()
+    instrs = eliminate_common_subexpressions(
+        parse_vm("function A.f " + str(n_locals) + "\n" + text), report
+    )
+    return print_vm(instrs).splitlines(), report
+
+def unchanged(text):
+    code, report = share(text)
+    return code == ["function A.f 1"] + text.splitlines() and not report
+
+def test_repeated_call_shared():
+    code, report = share(SQUARE + SQUARE + "add\nreturn")
+    assert code == [
+        "function A.f 2", "push argument 0", "push argument 0",
+        "call Math.multiply 2", "pop local 1", "push local 1",
+        "push local 1", "add", "return"
+    ]
+    assert report == Counter({"A.f": 399})
+
+def test_cheap_expressions_need_three_uses():
+    assert unchanged(SUM + SUM + "add\nreturn")
+    code, report = share(SUM + SUM + "add\n" + SUM + "add\nreturn")
+    assert code.count("push this 1") == 1
+    assert code.count("push local 1") == 3
+    assert report == Counter({"A.f": 2})
+
+def test_changed_operands():
+    assert unchanged(SQUARE + "pop temp 0\npush constant 1\n"
+                     "pop argument 0\n" + SQUARE + "return")
+    for change in ("pop static 0", "pop that 0", "pop pointer 0",
+                   "call A.g 1"):
+        text = SUM * 3 + "pop temp 0\npush constant 1\n" + change + "\n"
+        assert share(text + "pop temp 0\npop temp 0\nreturn")[1]
+        assert unchanged(SUM + "pop temp 0\npush constant 1\n" + change +
+                         "\n" + SUM + "pop temp 0\n" + SUM + "return")
+
+def test_calls_keep_locals():
+    code, _ = share(SQUARE + "pop temp 0\ncall A.g 0\npop temp 0\n" +
+                    SQUARE + "return")
+    assert code.count("call Math.multiply 2") == 1
+
+def test_array_reads_after_stores():
+    read = "push that 0\npush that 0\ncall Math.multiply 2\n"
+    assert not share(read + "pop temp 0\npush argument 0\npop pointer 1\n" +
+                     read + "return")[1]
+    assert not share(read + "pop temp 0\npush argument 0\npop that 1\n" +
+                     read + "return")[1]
+    assert share(read + "pop temp 0\n" + read + "return")[1]
+
+def test_blocks_kept_apart():
+    assert unchanged(SQUARE + "pop temp 0\nlabel L\n" + SQUARE + "return")
+    assert unchanged(SQUARE + "if-goto L\n" + SQUARE + "label L\nreturn")
+
+def test_temp_not_shared():
+    square = "push temp 0\npush temp 0\ncall Math.multiply 2\n"
+    assert unchanged(square + square + "add\nreturn")
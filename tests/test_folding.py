@@ -0,0 +1,54 @@
+#pylint: disable=missing-docstring
+
+from collections import Counter
+
+from jackcompiler.vmir import parse_vm
+from jackcompiler.folding import fold_constants, wrap, push_constant
+from test_compilationengine import compile_source, nested_function
+
+def folded(expression):
+    """Returns the O1 code that computes `let y = expression;`"""
+    vmcode = compile_source(
+        nested_function("let y = " + expression + ";"), optlevel=1
+    )
+    body = vmcode.splitlines()[1:]
+    return body[:body.index("pop local 0")]
+
+def test_wrap():
+    assert wrap(32767 + 1) == -32768
+    assert wrap(-32768 - 1) == 32767
+    assert wrap(300 * 300) == 24464
+    for value in [0, 1, -1, 5, -5, 32767, -32768]:
+        report = Counter()
+        assert fold_constants(push_constant(value) + [parse_vm("neg")[0]],
+                              report) == push_constant(wrap(-value))
+
+def test_fold_expressions():
+    assert folded("(4 * 16) + 3") == ["push constant 67"]
+    # No precedence: evaluated left to right
+    assert folded("2 + 3 * 4") == ["push constant 20"]
+    assert folded("-5 - 3") == ["push constant 8", "neg"]
+    assert folded("~0") == ["push constant 0", "not"]
+    assert folded("-(-7)") == ["push constant 7"]
+    assert folded("32767 + 1") == ["push constant 32767", "not"]
+    assert folded("(-7) / 2") == ["push constant 3", "neg"]
+    assert folded("(1 < 2) & (3 = 3)") == ["push constant 0", "not"]
+    assert folded("5 > 6") == ["push constant 0"]
+    assert folded("x + (1 + 2)") == [
+        "push argument 0", "push constant 3", "add"
+    ]
+    # Left to right, so x + 1 + 2 has no constant subexpression
+    assert folded("x + 1 + 2") == [
+        "push argument 0", "push constant 1", "add", "push constant 2", "add"
+    ]
+    assert folded("7 / 0") == [
+        "push constant 7", "push constant 0", "call Math.divide 2"
+    ]
+
+def test_fold_report():
+    report = Counter()
+    fold_constants(parse_vm(
+        "push constant 4\npush constant 16\ncall Math.multiply 2\n"
+        "push constant 3\nadd\n"
+    ), report)
+    assert report == Counter({"Math.multiply": 2, "add": 2})
@@ -0,0 +1,103 @@
+#pylint: disable=missing-docstring
+
+from collections import Counter
+
+from jackcompiler.vmir import parse_vm, split_functions, print_vm
+from jackcompiler.passmanager import PassManager
+from jackcompiler.inliner import inline_calls
+
+PROGRAM = """
+function Main.main 1
+push local 0
+call Point.getX 1
+push constant 3
+call Util.twice 1
+add
+call Util.fact 1
+push constant 7
+call Util.counter 1
+add
+pop local 0
+push local 0
+push constant 1
+call Util.abs 1
+pop that 0
+push constant 0
+return
+function Point.getX 0
+push argument 0
+pop pointer 0
+push this 0
+return
+function Util.twice 0
+push argument 0
+push argument 0
+add
+return
+function Util.abs 0
+push argument 0
+push constant 0
+lt
+if-goto NEG
+push argument 0
+return
+label NEG
+push argument 0
+neg
+return
+function Util.fact 0
+push argument 0
+push constant 1
+sub
+call Util.fact 1
+return
+function Util.counter 0
+push static 0
+return
+"""
+
+def inline(text, size=16):
+    report = Counter()
+    functions = inline_calls(split_functions(parse_vm(text)), report,
+                             PassManager(inline_size=size))
+    return functions, report
+
+def test_inline():
+    functions, report = inline(PROGRAM)
+    assert report == {"Point.getX": 1, "Util.twice": 1, "Util.abs": 1}
+    main = print_vm(functions[0]).splitlines()
+    assert "call Util.fact 1" in main
+    assert "call Util.counter 1" in main
+    # Three arguments and a saved pointer 1 added to main's frame
+    assert main[0] == "function Main.main 5"
+    # pop that 0 below needs the pointer 1 from before the call
+    assert main[1:10] == [
+        "push local 0", "push pointer 1", "pop local 2", "pop local 1",
+        "push local 1", "pop pointer 1", "push that 0", "push local 2",
+        "pop pointer 1"
+    ]
+    assert "if-goto Util.abs.2.NEG" in main
+    assert "goto Util.abs.2.END" in main
+    assert "label Util.abs.2.END" in main
+
+def test_inline_size():
+    _, report = inline(PROGRAM, size=4)
+    assert report == {"Point.getX": 1, "Util.twice": 1}
+    _, report = inline(PROGRAM, size=0)
+    assert not report
+
+def test_inline_rounds():
+    functions, report = inline("""
+function Main.main 0
+call A.f 0
+return
+function A.f 0
+call A.g 0
+return
+function A.g 0
+push constant 1
+return
+""")
+    assert report == {"A.g": 1, "A.f": 1}
+    assert print_vm(functions[0]) == \
+        "function Main.main 0\npush constant 1\nreturn\n"
@@ -0,0 +1,90 @@
+#pylint: disable=missing-docstring
+
+from collections import Counter
+
+from jackcompiler.vmir import parse_vm, print_vm
+from jackcompiler.licm import find_loops, hoist_invariants
+
+def hoist(text, n_locals=1):
+    report = Counter()
+    instrs = hoist_invariants(
+        parse_vm("function A.f " + str(n_locals) + "\n" + text), report
+    )
+    return print_vm(instrs).splitlines(), report
+
+def loop(body, condition="push local 0\npush argument 0\nlt\n"):
+    """A while loop over local 0 with body before the increment"""
+    return (
+        "label L\n" + condition + "not\nif-goto E\n" + body +
+        "push local 0\npush constant 1\nadd\npop local 0\ngoto L\n"
+        "label E\npush local 0\nreturn"
+    )
+
+def test_condition_hoisted():
+    code, report = hoist(loop("", "push local 0\npush argument 0\n"
+                                  "push argument 1\ncall Math.multiply 2\n"
+                                  "lt\n"))
+    assert code[:6] == [
+        "function A.f 2", "push argument 0", "push argument 1",
+        "call Math.multiply 2", "pop local 1", "label L"
+    ]
+    assert code[6:9] == ["push local 0", "push local 1", "lt"]
+    assert report == Counter({"A.f": 2})
+
+def test_repeated_expression_shares_temporary():
+    body = "push argument 0\nneg\npop static 0\n" * 2
+    code, report = hoist(loop(body))
+    assert code[0] == "function A.f 2"
+    assert code[1:4] == ["push argument 0", "neg", "pop local 1"]
+    assert code.count("push local 1") == 2
+    assert report == Counter({"A.f": 2})
+
+def test_written_locals_stay():
+    text = loop("push local 0\npush constant 2\nadd\npop static 0\n")
+    code, report = hoist(text)
+    assert code == ["function A.f 1"] + text.splitlines()
+    assert not report
+
+def test_calls_and_pointer_writes_change_fields():
+    body = "push this 0\npush this 1\nadd\npop static 0\n"
+    code, _ = hoist(loop(body))
+    assert code[1:5] == ["push this 0", "push this 1", "add", "pop local 1"]
+    for effect in ("call A.g 0\npop temp 0\n", "push local 0\npop pointer 0\n",
+                   "push local 0\npop that 0\n"):
+        text = loop(body + effect)
+        code, report = hoist(text)
+        assert code == ["function A.f 1"] + text.splitlines()
+        assert not report
+
+def test_impure_expressions_stay():
+    for body in ("push argument 0\npush constant 1\nadd\npop pointer 1\n"
+                 "push that 0\npush constant 1\nadd\npop static 0\n",
+                 "push argument 0\npush argument 1\ncall Math.divide 2\n"
+                 "pop static 0\n",
+                 "push argument 0\npush constant 0\ncall Math.divide 2\n"
+                 "pop static 0\n"):
+        code, _ = hoist(loop(body))
+        preheader = code[:code.index("label L")]
+        assert "push that 0" not in preheader
+        assert "call Math.divide 2" not in preheader
+
+def test_entered_loops_skipped():
+    text = "goto L\n" + loop("push argument 0\nneg\npop static 0\n")
+    assert find_loops(parse_vm("function A.f 1\n" + text)) == []
+    code, _ = hoist(text)
+    assert code == ["function A.f 1"] + text.splitlines()
+
+def test_nested_loops():
+    inner = (
+        "label M\npush local 1\npush argument 0\nlt\nnot\nif-goto F\n"
+        "push argument 0\npush argument 1\nadd\npop static 0\n"
+        "push local 1\npush constant 1\nadd\npop local 1\ngoto M\nlabel F\n"
+    )
+    code, report = hoist(loop("push constant 0\npop local 1\n" + inner), 2)
+    # Hoisted out of the inner loop, then out of the outer one
+    assert code[:5] == [
+        "function A.f 4", "push argument 0", "push argument 1", "add",
+        "pop local 3"
+    ]
+    assert "push local 3" in code[code.index("label L"):]
+    assert report == Counter({"A.f": 4})
@@ -0,0 +1,58 @@
+#pylint: disable=missing-docstring
+
+from collections import Counter
+
+from jackcompiler.vmir import parse_vm, print_vm
+from jackcompiler.liveness import live_locals, eliminate_dead_stores
+
+def dse(text):
+    report = Counter()
+    instrs = eliminate_dead_stores(parse_vm("function A.f 3\n" + text),
+                                   report)
+    return print_vm(instrs[1:]).splitlines(), report
+
+def test_live_locals():
+    instrs = parse_vm("""
+function A.f 2
+push constant 0
+pop local 0
+label LOOP
+push local 0
+push local 1
+add
+pop local 0
+push local 0
+if-goto LOOP
+push local 0
+return
+""")
+    live_in, live_out = live_locals(instrs)
+    # local 1 is read before it is set: it relies on the VM zeroing it
+    assert live_in[0] == 0b10
+    assert live_in[2] == 0b10
+    assert live_in[3] == 0b11
+    assert live_out[-1] == 0
+
+def test_dead_stores():
+    assert dse(
+        "push constant 1\npop local 0\npush argument 0\npop local 0\n"
+        "push local 0\nreturn"
+    ) == (["push argument 0", "return"],
+          Counter({"A.f local 0": 2}))
+    # The call has to happen even if its value is not used
+    assert dse(
+        "push argument 0\npush constant 2\nadd\ncall B.g 1\npop local 1\n"
+        "push constant 0\nreturn"
+    )[0] == [
+        "push argument 0", "push constant 2", "add", "call B.g 1",
+        "pop temp 7", "push constant 0", "return"
+    ]
+    # Removing a store can make the one it copies from dead
+    assert dse(
+        "push argument 0\npush argument 1\nadd\npop local 0\n"
+        "push local 0\npop local 1\npush constant 0\nreturn"
+    )[0] == ["push constant 0", "return"]
+    # Live on the way around a loop
+    loop = "label L\npush local 0\npush constant 1\nadd\npop local 0\n" \
+        "push local 0\nif-goto L\npush constant 0\nreturn"
+    assert dse(loop)[0] == loop.splitlines()
@@ -0,0 +1,58 @@
+#pylint: disable=missing-docstring
+
+from collections import Counter
+
+from jackcompiler.vmir import parse_vm, split_functions
+from jackcompiler.peephole import optimise, jump_targets
+from jackcompiler.compilationengine import CompilationEngine
+from test_compilationengine import corpus_tokens
+
+def peep(text):
+    """Returns the optimised text of a function and the report"""
+    report = Counter()
+    instrs = optimise(parse_vm("function A.f 0\n" + text), report)
+    return [str(instr) for instr in instrs[1:]], report
+
+def test_rules():
+    """Tests each rule on a small snippet"""
+    assert peep("push local 0\npop local 0\nreturn") == \
+        (["return"], Counter({"push-pop": 2}))
+    assert peep("push local 0\nnot\nnot\nneg\nneg\nreturn")[0] == \
+        ["push local 0", "return"]
+    assert peep("label L\npush constant 0\nnot\nnot\nif-goto L\nreturn")[0] \
+        == ["return"]
+    assert peep("label L\npush constant 0\nnot\nif-goto L\nreturn")[0] == \
+        ["label L", "goto L"]
+    assert peep(
+        "push local 0\npush local 1\nlt\nif-goto T\ngoto F\nlabel T\n"
+        "push constant 1\nreturn\nlabel F\npush constant 2\nreturn"
+    )[0] == [
+        "push local 0", "push local 1", "lt", "not", "if-goto F",
+        "push constant 1", "return", "label F", "push constant 2", "return"
+    ]
+    assert peep(
+        "push local 0\npush constant 1\nadd\npush argument 1\n"
+        "pop temp 0\npop pointer 1\npush temp 0\npop that 0\nreturn"
+    ) == ([
+        "push local 0", "push constant 1", "add", "pop pointer 1",
+        "push argument 1", "pop that 0", "return"
+    ], Counter({"array-store": 2}))
+    # The value may depend on that/pointer/temp, so it has to stay saved
+    unsafe = "push that 0\npop temp 0\npop pointer 1\npush temp 0\n" \
+        "pop that 0\nreturn"
+    assert peep(unsafe)[0] == unsafe.splitlines()
+
+def test_corpus():
+    """Tests that peephole code is never longer and its jumps all land"""
+    engine = CompilationEngine()
+    engine.build_tree = False
+    report = Counter()
+    for _, tokens in corpus_tokens():
+        engine.tokens = tokens
+        for func in split_functions(parse_vm(engine.get_vmcode())):
+            new = optimise(func, report)
+            assert new[0] == func[0]
+            assert len(new) <= len(func)
+            labels = {instr.arg for instr in new if instr.op == "label"}
+            assert jump_targets(new) <= labels
+    assert sum(report.values()) > 0
@@ -0,0 +1,40 @@
+#pylint: disable=missing-docstring
+
+from collections import Counter
+
+from jackcompiler.vmir import parse_vm, print_vm
+from jackcompiler.slots import colour_locals, interference
+
+def colour(text, n_locals):
+    report = Counter()
+    instrs = colour_locals(
+        parse_vm("function A.f " + str(n_locals) + "\n" + text), report
+    )
+    return print_vm(instrs).splitlines(), report
+
+def test_disjoint_locals_share():
+    code, report = colour(
+        "push argument 0\npop local 1\npush local 1\npop local 3\n"
+        "push local 3\nreturn", 4
+    )
+    assert code == [
+        "function A.f 1", "push argument 0", "pop local 0", "push local 0",
+        "pop local 0", "push local 0", "return"
+    ]
+    assert report == Counter({"A.f": 3})
+
+def test_overlapping_locals():
+    text = "push argument 0\npop local 0\npush argument 1\npop local 1\n" \
+        "push local 0\npush local 1\nadd\nreturn"
+    code, report = colour(text, 2)
+    assert code == ["function A.f 2"] + text.splitlines()
+    assert not report
+
+def test_zeroed_locals_keep_their_own_slot():
+    # local 1 is read before being set, so it must still be 0 when local
+    # 0 is set
+    graph = interference(parse_vm(
+        "function A.f 2\npush argument 0\npop local 0\npush local 1\n"
+        "push local 0\nadd\nreturn"
+    ))
+    assert graph[0] & 0b10 and graph[1] & 0b01
@@ -0,0 +1,106 @@
+#pylint: disable=missing-docstring
+
+from collections import Counter
+
+from jackcompiler.vmir import parse_vm, split_functions, print_vm
+from jackcompiler.passmanager import PassManager
+from jackcompiler.statics import propagate_statics
+from programs import compile_sources
+
+GAME = """
+class Game {
+    static int width, height, score;
+    function void init() {
+        let width = 32;
+        let height = -3;
+        return;
+    }
+    function int area() {
+        var int i, total;
+        while (i < 4) {
+            let total = total + (width * height);
+            let i = i + 1;
+        }
+        let score = score + 1;
+        return total;
+    }
+}
+"""
+
+MAIN = """
+class Main {
+    function void main() {
+        do Game.init();
+        do Output.printInt(Game.area());
+        return;
+    }
+}
+"""
+
+def propagate(text, statics):
+    manager = PassManager()
+    manager.statics = statics
+    report = Counter()
+    functions = propagate_statics(split_functions(parse_vm(text)), report,
+                                  manager)
+    return print_vm([instr for func in functions for instr in func]), report
+
+def test_statics_become_constants():
+    functions, manager = compile_sources([GAME, MAIN], 3)
+    report = manager.report
+    code = print_vm([instr for func in functions for instr in func])
+    assert report["statics"] == Counter({"Game.width": 1,
+                                         "Game.height": 1})
+    assert "pop static 0" not in code and "pop static 1" not in code
+    # 32 * -3 is folded in the loop
+    assert "push constant 96\nneg\n" in code
+    assert "call Math.multiply" not in code
+    # score is stored twice
+    assert "push static 2" in code
+
+def test_read_before_store():
+    text = (
+        "function Main.main 0\npush static 0\ncall Main.init 0\n"
+        "pop temp 0\npop temp 0\npush constant 0\nreturn\n"
+        "function Main.init 0\npush constant 5\npop static 0\n"
+        "push constant 0\nreturn\n"
+    )
+    code, report = propagate(text, {"Main": ["size"]})
+    assert code == text and not report
+    # The read after the store is replaced
+    swapped = text.replace("push static 0\ncall Main.init 0\npop temp 0\n",
+                           "call Main.init 0\npop temp 0\npush static 0\n")
+    code, report = propagate(swapped, {"Main": ["size"]})
+    assert "push static 0" not in code and "pop static 0" not in code
+    assert report == Counter({"Main.size": 1})
+
+def test_store_after_branch():
+    text = (
+        "function Main.main 0\npush argument 0\nif-goto L\n"
+        "push constant 5\npop static 0\nlabel L\npush static 0\nreturn\n"
+    )
+    code, report = propagate(text, {"Main": ["size"]})
+    assert code == text and not report
+
+def test_reads_in_loops_after_store():
+    text = (
+        "function Main.main 0\ncall Main.init 0\npop temp 0\n"
+        "label L\ncall Main.get 0\nif-goto L\npush constant 0\nreturn\n"
+        "function Main.init 0\npush constant 1\nneg\npop static 0\n"
+        "push constant 0\nreturn\n"
+        "function Main.get 0\npush static 0\nreturn\n"
+    )
+    code, report = propagate(text, {"Main": ["flag"]})
+    assert "function Main.get 0\npush constant 0\nnot\nreturn\n" in code
+    assert "function Main.init 0\npush constant 0\nreturn\n" in code
+    assert report == Counter({"Main.flag": 1})
+
+def test_undeclared_and_library_statics_kept():
+    text = (
+        "function Main.main 0\npush constant 5\npop static 0\n"
+        "push static 0\nreturn\n"
+    )
+    # A hidden static, like a pooled string, is not in the symbol table
+    assert propagate(text, {"Main": []})[0] == text
+    library = text.replace("Main.main", "Lib.f")
+    assert propagate(library, {"Lib": ["x"]})[0] == library
@@ -0,0 +1,81 @@
+#pylint: disable=missing-docstring
+
+import os
+import sys
+import subprocess
+
+from jackcompiler.compiler import JackCompiler
+from jackcompiler.utilities import list_files_with_ext
+
+def read_lines(path):
+    with open(path) as opened:
+        return [line.strip() for line in opened]
+
+def test_stream_matches_fixtures():
+    """Tests that streaming mode writes the same tokens, tree and vm"""
+    this_dir = os.path.dirname(os.path.realpath(__file__))
+    comp = JackCompiler()
+    comp.stream = True
+    for sub in ["syntax", "vmcode"]:
+        jackpaths = list_files_with_ext(
+            os.path.join(this_dir, sub), ext=".jack"
+        )
+        comp.outvm = sub == "vmcode"
+        comp.outtree = sub == "syntax"
+        comp.outtokens = sub == "syntax"
+        for jackpath in jackpaths:
+            comp.jackpath = jackpath
+            comp.run()
+            segs = ["tokens", "tree"] if sub == "syntax" else ["vm"]
+            for seg in segs:
+                got = comp.get_outdic()[seg]
+                root, ext = os.path.splitext(got)
+                expected = root + "Compare" + ext
+                assert read_lines(got) == read_lines(expected)
+
+def synthetic_class(path, n_statements):
+    """Writes a class with one very long subroutine"""
+    with open(path, "w") as jackfile:
+        jackfile.write("class Big {\n  function int run(int x) {\n")
+        jackfile.write("    var int y;\n")
+        for i in range(n_statements):
+            jackfile.write(
+                "    let y = (y + x) * %d; // step %d %s\n" %
+                (i % 100, i, "padding " * 8)
+            )
+        jackfile.write("    return y;\n  }\n}\n")
+
+# Run in a fresh interpreter so that what the rest of the suite allocated,
+# or left for the interpreter to resize, does not count towards the peak
+MEASURE = """
+import sys
+import tracemalloc
+from jackcompiler.compiler import JackCompiler
+comp = JackCompiler()
+comp.stream = True
+comp.outtree = True
+comp.jackpath = sys.argv[1]
+tracemalloc.start()
+comp.run()
+print(tracemalloc.get_traced_memory()[1])
+"""
+
+def peak_memory(path):
+    root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+    out = subprocess.run(
+        [sys.executable, "-c", MEASURE, path], cwd=root, check=True,
+        stdout=subprocess.PIPE, universal_newlines=True
+    ).stdout
+    return int(out.split()[-1])
+
+def test_stream_memory_is_flat(tmp_path):
+    """Tests that peak memory does not grow with a multi-megabyte input"""
+    small = str(tmp_path / "Small.jack")
+    large = str(tmp_path / "Big.jack")
+    synthetic_class(small, 1000)
+    synthetic_class(large, 25000)
+    assert os.path.getsize(large) > 2 * 10**6
+    peak_small = peak_memory(small)
+    peak_large = peak_memory(large)
+    assert peak_large < 2 * peak_small + 100 * 1024
+    assert peak_large < os.path.getsize(large) / 10
@@ -0,0 +1,67 @@
+#pylint: disable=missing-docstring
+
+from collections import Counter
+
+from jackcompiler.vmir import parse_vm, push, call
+from jackcompiler.folding import push_constant, UNARY, BINARY
+from jackcompiler.strength import reduce_strength, MAX_SEQUENCE
+from test_compilationengine import compile_source, nested_function
+
+def run(instrs, local):
+    """Evaluates straight line code with local 0 set, returns the stack"""
+    stack, temp = [], {}
+    for instr in instrs:
+        if instr.op == "push":
+            stack.append({"constant": instr.num, "local": local}.get(
+                instr.arg, temp.get(instr.num)
+            ))
+        elif instr.op == "pop":
+            temp[instr.num] = stack.pop()
+        elif instr.op in UNARY:
+            stack.append(UNARY[instr.op](stack.pop()))
+        elif instr.op == "call":
+            second = stack.pop()
+            stack.append(BINARY[instr.arg](stack.pop(), second))
+        else:
+            second = stack.pop()
+            stack.append(BINARY[instr.op](stack.pop(), second))
+    return stack
+
+def test_sequences_match_calls():
+    for const in [0, 1, -1, 2, 3, 10, 16, 25, -50, 255, 1024, 32767]:
+        for target in ["Math.multiply", "Math.divide"]:
+            for commuted in [False, True]:
+                operands = [push("local", 0)] + push_constant(const)
+                if commuted:
+                    operands = push_constant(const) + [push("local", 0)]
+                original = operands + [call(target, 2)]
+                report = Counter()
+                reduced = reduce_strength(original, report)
+                if reduced != original:
+                    assert len(reduced) <= MAX_SEQUENCE + len(operands)
+                    assert "call" not in [instr.op for instr in reduced]
+                for local in [0, 1, -1, 7, -300, 12345, 32767, -32768]:
+                    if target == "Math.divide" and \
+                            (const == 0 or -32768 in (local, const)):
+                        continue
+                    assert run(reduced, local) == run(original, local)
+
+def test_reduce_in_program():
+    vmcode = compile_source(
+        nested_function("let y = (x * 8) + (y * 10) + (x / 1);"), optlevel=2
+    )
+    assert "call Math" not in vmcode
+    vmcode = compile_source(
+        nested_function("let y = x * 12345;"), optlevel=2
+    )
+    assert "call Math.multiply 2" in vmcode
+
+def test_report():
+    report = Counter()
+    reduce_strength(parse_vm(
+        "push local 0\npush constant 4\ncall Math.multiply 2\n"
+        "push local 1\npush constant 4\ncall Math.divide 2\n"
+    ), report)
+    assert report["Math.multiply"] == 1
+    assert report["Math.divide"] == 0
+    assert report["instructions saved"] > 0
@@ -27,3 +27,25 @@ def test_symbol_table():
     assert symt.kind_of("var1v") == "var"
     assert symt.type_of("var1v") == "int"
     assert symt.index_of("var1v") == 0
+
+def test_symbol_table_scopes():
+    """Tests shadowing, method argument indices and resolution"""
+    symt = SymbolTable()
+    symt.define("x", "int", "field")
+    symt.define("game", "SquareGame", "static")
+    symt.subroutine_type = "method"
+    symt.define("x", "boolean", "arg")
+    symt.define("y", "int", "arg")
+    assert symt.kind_of("x") == "arg"
+    assert symt.type_of("x") == "boolean"
+    assert symt.index_of("x") == 1
+    assert symt.index_of("y") == 2
+    assert symt.var_count("arg") == 2
+    assert symt.names_of("arg") == ["x", "y"]
+    assert symt.names_of("static") == ["game"]
+    assert symt.kind_of("undefined") == "NONE"
+    assert symt.resolve_symbol("game") == "SquareGame"
+    assert symt.resolve_symbol("Output") == "Output"
+    symt.subroutine_type = "function"
+    assert symt.kind_of("x") == "field"
+    assert symt.var_count("arg") == 0
@@ -0,0 +1,55 @@
+#pylint: disable=missing-docstring
+
+import os
+
+from jackcompiler.tokeniser import Tokeniser, lex_bytes
+from jackcompiler.utilities import list_files_with_ext
+
+def test_engines_agree():
+    """Tests that the regex lexer reproduces the character-wise one"""
+    this_dir = os.path.dirname(os.path.realpath(__file__))
+    jackpaths = list_files_with_ext(this_dir, ext=".jack")
+    fast = Tokeniser()
+    slow = Tokeniser(engine="charwise")
+    for jackpath in jackpaths:
+        with open(jackpath) as jackfile:
+            contents = jackfile.read()
+        fast.contents = contents
+        slow.contents = contents
+        assert fast.get_tokens() == slow.get_tokens()
+
+def test_stream_lexer_agrees():
+    """Tests that lexing raw bytes gives the tokens of the default mode,
+    comments included
+    """
+    this_dir = os.path.dirname(os.path.realpath(__file__))
+    sources = ['let a/*c*/b = x//y\n+1; do f("a/*b*/c")/** d */;\n']
+    for jackpath in list_files_with_ext(this_dir, ext=".jack"):
+        with open(jackpath) as jackfile:
+            sources.append(jackfile.read())
+    tok = Tokeniser()
+    for source in sources:
+        tok.contents = source
+        assert tok.get_tokens() == list(lex_bytes(source.encode()))
+    tok.contents = sources[0]
+    assert [t.value for t in tok.get_tokens()][:4] == ["let", "a", "b", "="]
+
+def test_lex_token_types():
+    """Tests token classification"""
+    tok = Tokeniser()
+    tok.contents = 'let s = "a b;c" + 12 < x3;\n'
+    got = [(t.type, t.value) for t in tok.get_tokens()]
+    assert got == [
+        ("keyword", "let"), ("identifier", "s"), ("symbol", "="),
+        ("stringConstant", "a b;c"), ("symbol", "+"),
+        ("integerConstant", "12"), ("symbol", "&lt;"),
+        ("identifier", "x3"), ("symbol", ";")
+    ]
+
+def test_tokens_are_shared():
+    """Tests that repeated words map to one slotted token object"""
+    tok = Tokeniser()
+    tok.contents = "let x = x;"
+    toks = tok.get_tokens()
+    assert toks[1] is toks[3]
+    assert not hasattr(toks[1], "__dict__")
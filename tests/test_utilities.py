@@ -27,8 +27,22 @@ def generic_remove_comment(orig, rem, breaks):
 def test_remove_comments():
     """Tests comment removal"""
     short_comment = "// Short comment\nnot a comment"
-    generic_remove_comment(short_comment, "not a comment", [["//", "\n"]])
+    generic_remove_comment(short_comment, " not a comment", [["//", "\n"]])
     long_comment = "/* long\ncomment\nhere */\nnot a comment"
-    generic_remove_comment(long_comment, "not a comment", [["/*", "*/\n"]])
+    generic_remove_comment(long_comment, " not a comment", [["/*", "*/\n"]])
     long_comment_2 = "/** long\ncomment\nhere */\nnot a comment"
-    generic_remove_comment(long_comment_2, "not a comment", [["/**", "*/\n"]])
+    generic_remove_comment(long_comment_2, " not a comment", [["/**", "*/\n"]])
+
+def test_remove_comments_single_scan():
+    """Tests comment removal around strings and mixed markers"""
+    breaks = [["//", "\n"], ["/*", "*/"]]
+    in_string = 'let s = "a // b /* c */";\n'
+    generic_remove_comment(in_string, in_string, breaks)
+    nested_marker = "/* see http://x */x\n"
+    generic_remove_comment(nested_marker, " x\n", breaks)
+    many = "a/**/" * 1000
+    generic_remove_comment(many, "a " * 1000, breaks)
+    unterminated = "x // no newline"
+    generic_remove_comment(unterminated, "x  ", breaks)
+    between_words = "a/*c*/b"
+    generic_remove_comment(between_words, "a b", breaks)
@@ -0,0 +1,163 @@
+#pylint: disable=missing-docstring
+
+import os
+import json
+import shutil
+import pytest
+
+from jackcompiler.compiler import JackCompiler
+from jackcompiler.utilities import list_files_with_ext
+from jackcompiler.vmemulator import VMEmulator, read_program
+from jackcompiler.vmir import parse_vm, split_functions
+from programs import ASMCODE, EXPECTED, VMCODE, compile_program, \
+    compile_sources
+
+# Keyboard input for the programs in tests/vmcode
+SCRIPTS = {
+    "Average": {"inputs": [3, 10, 20, 30]},
+    "Square": {"keys": [0] * 20 + [132] * 5 + [0] * 5 + [81]}
+}
+
+def emulate(text, **kwargs):
+    emulator = VMEmulator(split_functions(parse_vm(text)), **kwargs)
+    assert emulator.run()
+    return emulator
+
+@pytest.mark.parametrize("name", sorted(os.listdir(VMCODE)))
+def test_levels_agree(name):
+    runs = []
+    for level in range(4):
+        emulator = VMEmulator(
+            compile_program(os.path.join(VMCODE, name), level),
+            **SCRIPTS.get(name, {})
+        )
+        emulator.ram[8000] = 37
+        assert emulator.run()
+        assert emulator.error is None
+        runs.append((emulator.get_output(), emulator.screen,
+                     emulator.ram[8001:8017]))
+    assert all(run == runs[0] for run in runs)
+
+def test_conditions_agree():
+    """Tests that a condition which is neither true nor false goes the
+    same way at every level: taken by an if, ending a while
+    """
+    main = """
+    class Main {
+        function void main() {
+            var int x, n;
+            let x = 3;
+            let n = 0;
+            while (x & 1) {
+                let n = n + 1;
+                let x = x + 2;
+                if (n > 5) { let x = 2; }
+            }
+            if (x & 1) { let n = n + 10; }
+            do Memory.poke(8000, n);
+            return;
+        }
+    }
+    """
+    for level in range(4):
+        emulator = VMEmulator(compile_sources([main], level)[0])
+        assert emulator.run()
+        assert emulator.ram[8000] == 10
+
+def test_expected_output():
+    output = VMEmulator(
+        compile_program(os.path.join(VMCODE, "Average"), 0),
+        inputs=[3, 10, 20, 30]
+    )
+    output.run()
+    assert output.get_output().endswith("The average is 20")
+    output = VMEmulator(compile_program(os.path.join(VMCODE, "Pong"), 2))
+    output.run()
+    assert output.get_output() == "Score: 01Game Over"
+    assert ("Screen.drawRectangle", 230, 229, 280, 236) in output.screen
+
+def test_own_os():
+    totals = []
+    for level in range(4):
+        emulator = VMEmulator(
+            compile_program(ASMCODE, level)
+        )
+        assert emulator.run()
+        assert emulator.ram[8000:8000 + len(EXPECTED)] == EXPECTED
+        report = emulator.get_report()
+        assert report["os_calls"] == {}
+        assert report["functions"]["Sys.init"]["calls"] == 1
+        totals.append(report["instructions"])
+    assert totals == sorted(totals, reverse=True)
+
+def test_report():
+    emulator = emulate(
+        "function Main.main 1\npush constant 3\ncall Main.fib 1\npop local 0\n"
+        "push local 0\npush constant 7\ncall Math.multiply 2\nreturn\n"
+        "function Main.fib 0\npush argument 0\npush constant 2\nlt\n"
+        "if-goto BASE\npush argument 0\npush constant 1\nsub\n"
+        "call Main.fib 1\npush argument 0\npush constant 2\nsub\n"
+        "call Main.fib 1\nadd\nreturn\nlabel BASE\npush argument 0\nreturn"
+    )
+    report = json.loads(emulator.get_json())
+    assert report["functions"] == {
+        "Main.main": {"calls": 1, "instructions": 8},
+        "Main.fib": {"calls": 5, "instructions": 2 * 15 + 3 * 7}
+    }
+    assert report["instructions"] == 8 + 51
+    assert report["os_calls"] == {"Math.multiply": 1}
+    # Bootstrap frame and a local, then three frames of fib with their
+    # argument, a result waiting for the second call and two operands
+    assert report["peak_stack_depth"] == 5 + 1 + 3 * 6 + 1 + 2
+    assert report["finished"] and report["error"] is None
+    assert emulator.ram[256] == 14
+
+def test_sixteen_bits():
+    emulator = emulate(
+        "function Sys.init 0\npush constant 32767\npush constant 1\nadd\n"
+        "pop static 0\npush constant 0\npush constant 32767\nsub\n"
+        "push constant 2\nsub\npop static 1\npush static 1\nneg\n"
+        "pop static 2\npush static 0\npush constant 1\ngt\npop static 3\n"
+        "push constant 300\npush constant 300\ncall Math.multiply 2\n"
+        "pop static 4\npush constant 7\nneg\npush constant 2\n"
+        "call Math.divide 2\npop static 5\ncall Sys.halt 0\n"
+        "push constant 0\nreturn"
+    )
+    assert emulator.ram[16:22] == [-32768, 32767, -32767, 0, 24464, -3]
+
+def test_strings_and_errors():
+    emulator = emulate(
+        "function Main.main 0\npush constant 2\ncall String.new 1\n"
+        "push constant 45\ncall String.appendChar 2\npush constant 52\n"
+        "call String.appendChar 2\ncall String.intValue 1\n"
+        "call Output.printInt 1\npop temp 0\npush constant 1\n"
+        "push constant 0\ncall Math.divide 2\npush constant 0\nreturn"
+    )
+    assert emulator.get_output() == "-4"
+    assert emulator.error == 3
+    emulator = VMEmulator(split_functions(parse_vm(
+        "function Main.main 0\nlabel L\ngoto L"
+    )))
+    assert not emulator.run(max_steps=100)
+    assert emulator.get_report()["instructions"] == 100
+    with pytest.raises(ValueError):
+        emulate("function Main.main 0\ncall Main.missing 0\nreturn")
+
+def test_profile_file(tmp_path):
+    for path in list_files_with_ext(os.path.join(VMCODE, "Pong"),
+                                    ext=".jack"):
+        shutil.copy(path, str(tmp_path))
+    comp = JackCompiler()
+    comp.profile = True
+    comp.run_program(sorted(list_files_with_ext(str(tmp_path), ext=".jack")))
+    report = json.loads((tmp_path / "profile.json").read_text())
+    assert report["finished"]
+    assert report["functions"]["Main.main"]["calls"] == 1
+    assert report["os_calls"]["Screen.drawRectangle"] > 0
+    functions = read_program(sorted(list_files_with_ext(str(tmp_path),
+                                                        ext=".vm")))
+    emulator = VMEmulator(functions)
+    emulator.run()
+    assert emulator.get_report() == report
+    with pytest.raises(ValueError):
+        comp.profile = "yes"
@@ -0,0 +1,42 @@
+#pylint: disable=missing-docstring
+
+import os
+
+from jackcompiler.vmir import parse_vm, print_vm, split_functions, push
+from jackcompiler.passmanager import PassManager, PASSES, OPT_LEVELS
+from jackcompiler.utilities import list_files_with_ext
+
+def compare_files():
+    """Yields the contents of the golden .vm files"""
+    this_dir = os.path.dirname(os.path.realpath(__file__))
+    for path in list_files_with_ext(
+            os.path.join(this_dir, "vmcode"), ext="Compare.vm"):
+        with open(path) as vmfile:
+            yield vmfile.read()
+
+def test_print_parse_roundtrip():
+    """Tests that printing parsed VM code gives back the same lines"""
+    for text in compare_files():
+        instrs = parse_vm(text)
+        expected = [line.strip() for line in text.splitlines() if line.strip()]
+        assert print_vm(instrs).splitlines() == expected
+        functions = split_functions(instrs)
+        assert all(func[0].op == "function" for func in functions)
+        assert sum(len(func) for func in functions) == len(instrs)
+
+def test_pass_manager(monkeypatch):
+    """Tests that passes of the chosen level run and report"""
+    def drop_first_push(instrs, report):
+        for i, instr in enumerate(instrs):
+            if instr.op == "push":
+                report["dropped"] += 1
+                return instrs[:i] + instrs[i + 1:]
+        return instrs
+    monkeypatch.setitem(PASSES, "drop", drop_first_push)
+    monkeypatch.setitem(OPT_LEVELS, 1, ["drop"])
+    func = parse_vm("function A.f 0\npush constant 1\npush constant 2\n")
+    manager = PassManager()
+    assert manager.run(func) == func
+    manager.optlevel = 1
+    assert manager.run(func) == func[:1] + [push("constant", 2)]
+    assert manager.report["drop"]["dropped"] == 1